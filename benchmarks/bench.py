@@ -0,0 +1,471 @@
+"""bigchaindb-wallet benchmarks.
+
+Times command startup, key derivation, keystore lookups and unlock, signing,
+serialization, phrase recovery, the transaction cache, coin selection, ledger
+dump scans and pipelined node requests against a local stand-in node.  Runs
+offline and writes results as json, run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench.py --output bench.json
+    PYTHONPATH=. python benchmarks/bench.py --compare bench.json \
+        --tolerance 1.25
+
+With ``--compare`` the exit status is 1 if any benchmark median is slower
+than ``--tolerance`` times the one of the given results.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from base58 import b58encode
+from bigchaindb_driver.common.utils import serialize
+from bigchaindb_driver.offchain import (fulfill_transaction,
+                                        prepare_transaction)
+
+import bigchaindb_wallet.coinselect as coinselect
+import bigchaindb_wallet.discovery as discovery
+import bigchaindb_wallet.keymanagement as km
+import bigchaindb_wallet.keystore as ks
+import bigchaindb_wallet.network as network
+import bigchaindb_wallet.recovery as recovery
+import bigchaindb_wallet.signing as signing
+import bigchaindb_wallet.txcache as txcache
+
+GROUPS = ('startup', 'derive', 'keystore', 'unlock', 'sign', 'serialize',
+          'recover', 'cache', 'coinselect', 'dump', 'network')
+CACHE_SIZES = (10 ** 3, 10 ** 4, 10 ** 5)
+FULL_CACHE_SIZES = CACHE_SIZES + (10 ** 6,)
+SIGN_INPUTS = (1, 10, 100)
+KEYSTORE_WALLETS = 10 ** 4
+# Interpreter runs timed by the startup group, each in a fresh process
+STARTUP_COMMANDS = {
+    'interpreter': ['-c', 'pass'],
+    'import': ['-c', 'import bigchaindb_wallet._cli'],
+    'help': ['-c', 'from bigchaindb_wallet._cli import cli; cli()', '--help'],
+}
+
+
+class Bench:
+    """Collects timings.  Every benchmark is run ``repeat`` times and each
+    run calls the benchmarked function ``number`` times.
+    """
+
+    def __init__(self, quick=False):
+        self.quick = quick
+        self.results = []
+
+    def measure(self, name, fn, *, number=1, repeat=5, **params):
+        if self.quick:
+            number, repeat = max(number // 10, 1), min(repeat, 2)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            times.append((time.perf_counter() - start) / number)
+        result = {
+            'name': name,
+            'params': params,
+            'number': number,
+            'repeat': repeat,
+            'min': min(times),
+            'median': statistics.median(times),
+        }
+        self.results.append(result)
+        print('{:<40} {:>12.6f}s {}'.format(name, result['median'], params),
+              file=sys.stderr)
+        return result
+
+    def record(self, name, seconds, **params):
+        """Record a single timing of an operation too slow to repeat."""
+        result = {'name': name, 'params': params, 'number': 1, 'repeat': 1,
+                  'min': seconds, 'median': seconds}
+        self.results.append(result)
+        print('{:<40} {:>12.6f}s {}'.format(name, seconds, params),
+              file=sys.stderr)
+        return result
+
+
+def bench_startup(bench):
+    for name, args in STARTUP_COMMANDS.items():
+        command = [sys.executable] + args
+        bench.measure(
+            'startup.' + name,
+            lambda: subprocess.run(command, stdout=subprocess.DEVNULL,
+                                   check=True),
+            number=10)
+
+
+def _master_key():
+    return km.seed_to_extended_key(hashlib.sha512(b'bdbw bench').digest())
+
+
+def bench_derive(bench):
+    xkey = _master_key()
+    for depth in range(1, 6):
+        tree_index = ks.bdbw_tree_index(1, 1)[:depth]
+        bench.measure('derive.depth', lambda: km.derive_key(xkey, tree_index),
+                      number=2000, depth=depth)
+    for size in (1, 100, 1000):
+        bench.measure(
+            'derive.batch',
+            lambda: list(ks.bdbw_derive_many(xkey, [0], range(size))),
+            number=max(1000 // size, 1), batch=size)
+    cache = km.DerivationCache()
+    tree_index = ks.bdbw_tree_index(2, 2)
+    cache.derive(xkey, tree_index)
+    bench.measure('derive.cache_hit', lambda: cache.derive(xkey, tree_index),
+                  number=10000)
+    privkey = km.derive_key(xkey, tree_index).privkey
+    bench.measure('derive.privkey_to_pubkey',
+                  lambda: km.privkey_to_pubkey(privkey), number=2000)
+
+
+def bench_keystore(bench):
+    wallet = ks.make_wallet_dict(_master_key(), 'bench',
+                                 kdf=km.kdf_params(level='interactive'))
+    wallet = wallet['default']
+    with tempfile.TemporaryDirectory() as tmp:
+        location = os.path.join(tmp, ks.DEFAULT_KEYSTORE_DB_FILENAME)
+        with ks.Keystore(location) as keystore:
+            keystore.put({'wallet{}'.format(i): wallet
+                          for i in range(KEYSTORE_WALLETS)})
+            name = 'wallet{}'.format(KEYSTORE_WALLETS // 2)
+            bench.measure('keystore.get', lambda: keystore.get(name),
+                          number=1000, wallets=KEYSTORE_WALLETS)
+            bench.measure('keystore.put', lambda: keystore.put({name: wallet}),
+                          number=100, wallets=KEYSTORE_WALLETS)
+
+
+def bench_unlock(bench):
+    password = 'bench'
+    wallet_dict = ks.make_wallet_dict(_master_key(), password)
+    bench.measure(
+        'unlock',
+        lambda: ks.get_master_xprivkey(wallet_dict, 'default', password),
+        repeat=3)
+
+
+def _keypairs(count):
+    xkey = _master_key()
+    return [(b58encode(dxk.privkey).decode(), b58encode(pubkey[1:]).decode())
+            for _, dxk, pubkey in ks.bdbw_derive_many(xkey, [0],
+                                                      range(count))]
+
+
+def _sweep(keypairs):
+    """A TRANSFER spending one output of every key pair."""
+    create = fulfill_transaction(
+        prepare_transaction(
+            operation='CREATE', signers=keypairs[0][1],
+            recipients=[([pubkey], 1) for _, pubkey in keypairs],
+            asset={'data': {'bench': len(keypairs)}}),
+        private_keys=keypairs[0][0])
+    inputs = [{
+        'fulfillment': output['condition']['details'],
+        'fulfills': {'output_index': i, 'transaction_id': create['id']},
+        'owners_before': output['public_keys'],
+    } for i, output in enumerate(create['outputs'])]
+    return prepare_transaction(
+        operation='TRANSFER', inputs=inputs,
+        recipients=[([keypairs[0][1]], len(keypairs))],
+        asset={'id': create['id']})
+
+
+def bench_sign(bench):
+    for inputs in SIGN_INPUTS:
+        keypairs = _keypairs(inputs)
+        tx = _sweep(keypairs)
+        private_keys = [privkey for privkey, _ in keypairs]
+        number = max(100 // inputs, 1)
+        bench.measure('sign.native',
+                      lambda: signing.fulfill(tx, private_keys, workers=1),
+                      number=number, inputs=inputs)
+        bench.measure('sign.native_threads',
+                      lambda: signing.fulfill(tx, private_keys),
+                      number=number, inputs=inputs)
+        bench.measure(
+            'sign.driver',
+            lambda: fulfill_transaction(tx, private_keys=private_keys),
+            number=number, inputs=inputs)
+
+
+def bench_serialize(bench):
+    keypairs = _keypairs(100)
+    tx = signing.fulfill(_sweep(keypairs),
+                         [privkey for privkey, _ in keypairs])
+    body = json.dumps(tx)
+    bench.measure('serialize.canonical', lambda: serialize(tx), number=200,
+                  inputs=100)
+    bench.measure('serialize.json_dumps', lambda: json.dumps(tx), number=200,
+                  inputs=100)
+    bench.measure('serialize.json_loads', lambda: json.loads(body),
+                  number=200, inputs=100)
+
+
+def bench_recover(bench):
+    seed = hashlib.sha256(b'bdbw bench').digest()
+    for words in (12, 24):
+        phrase = km.make_mnemonic_phrase(with_entropy=seed[:words * 4 // 3])
+        master_pubkey = km.privkey_to_pubkey(km.seed_to_extended_key(
+            km.mnemonic_to_seed(phrase)).privkey).hex()
+        damaged = phrase.split()
+        damaged[0] = recovery.UNKNOWN_WORD
+        search = recovery.phrase_search(damaged, master_pubkey=master_pubkey)
+        bench.measure(
+            'recover.checksum_filter',
+            lambda: sum(1 for _ in search.checksum_valid(0, len(search))),
+            number=10, words=words, candidates=len(search))
+        bench.measure('recover.one_unknown',
+                      lambda: recovery.recover(search), repeat=3,
+                      words=words)
+    bench.measure('recover.matches', lambda: search.matches(phrase),
+                  number=20, words=24)
+
+
+def synthetic_tx(i):
+    """Cache test transaction.  Odd ones spend the output of the previous
+    one, public keys repeat every 1000 transactions.
+    """
+    pubkey = 'pubkey{}'.format(i % 1000)
+    fulfills = None
+    if i % 2:
+        fulfills = {'transaction_id': synthetic_txid(i - 1),
+                    'output_index': 0}
+    return {
+        'id': synthetic_txid(i),
+        'operation': 'TRANSFER' if fulfills else 'CREATE',
+        'asset': ({'id': synthetic_txid(i - 1)} if fulfills
+                  else {'data': {'n': i}}),
+        'inputs': [{'owners_before': [pubkey], 'fulfills': fulfills,
+                    'fulfillment': 'pGSA'}],
+        'outputs': [{'public_keys': [pubkey], 'amount': '1',
+                     'condition': {'uri': 'ni:///sha-256;x'}}],
+        'metadata': None,
+        'version': '2.0',
+    }
+
+
+def synthetic_txid(i):
+    return hashlib.sha3_256(str(i).encode()).hexdigest()
+
+
+def bench_cache(bench, sizes):
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            location = os.path.join(tmp, txcache.DEFAULT_CACHE_FILENAME)
+            with txcache.TxCache(location) as cache:
+                start = time.perf_counter()
+                for offset in range(0, size, 10000):
+                    cache.add_many(synthetic_tx(i) for i in range(
+                        offset, min(offset + 10000, size)))
+                bench.record('cache.write', time.perf_counter() - start,
+                             entries=size)
+                txids = [synthetic_txid(random.randrange(size))
+                         for _ in range(1000)]
+                bench.measure('cache.get',
+                              lambda: [cache.get(txid) for txid in txids],
+                              entries=size, lookups=1000)
+                pubkeys = ['pubkey{}'.format(random.randrange(1000))
+                           for _ in range(100)]
+                bench.measure(
+                    'cache.outputs_unspent',
+                    lambda: [list(cache.outputs(pubkey, spent=False))
+                             for pubkey in pubkeys],
+                    entries=size, lookups=100)
+                bench.measure('cache.balance',
+                              lambda: cache.balance(pubkeys),
+                              entries=size, addresses=100)
+                bench.measure('cache.history',
+                              lambda: cache.history(pubkeys),
+                              entries=size, addresses=100)
+
+
+def bench_coinselect(bench, sizes):
+    """Transfers funded from unspent outputs of one asset spread over 100
+    wallet addresses."""
+    pubkeys = ['pubkey{}'.format(i) for i in range(100)]
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            location = os.path.join(tmp, txcache.DEFAULT_CACHE_FILENAME)
+            with txcache.TxCache(location) as cache:
+                cache.add_many(
+                    {'id': synthetic_txid(i), 'operation': 'TRANSFER',
+                     'asset': {'id': 'asset'}, 'inputs': [],
+                     'outputs': [{'public_keys': [pubkeys[i % 100]],
+                                  'amount': str(random.randint(1, 100))}]}
+                    for i in range(size))
+                for amount in (50, 1000):
+                    bench.measure(
+                        'coinselect.fund_transfer',
+                        lambda: coinselect.fund_transfer(
+                            cache, 'asset', pubkeys, [('recipient', amount)],
+                            pubkeys[0]),
+                        number=100, outputs=size, amount=amount)
+
+
+def bench_dump(bench, sizes):
+    """Ledger dumps where every 100th transaction pays the wallet."""
+    xkey = _master_key()
+    owned = [b58encode(pubkey[1:]).decode() for _, _, pubkey in
+             ks.bdbw_derive_many(xkey, [0], range(100))]
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            location = os.path.join(tmp, 'ledger.ndjson')
+            with open(location, 'w') as f:
+                for i in range(size):
+                    tx = synthetic_tx(i)
+                    if not i % 100:
+                        tx['outputs'][0]['public_keys'] = [
+                            owned[i // 100 % len(owned)]]
+                    f.write(json.dumps(tx) + '\n')
+            stored = []
+            start = time.perf_counter()
+            discovery.scan_ledger_dump(xkey, lambda: open(location),
+                                       stored.extend)
+            bench.record('dump.scan', time.perf_counter() - start,
+                         transactions=size, matched=len(stored))
+
+
+def bench_network(bench):
+    from pytest_httpserver import HTTPServer
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = HTTPServer()
+    server.start()
+    try:
+        server.expect_request('/api/v1/transactions/', method='POST') \
+            .respond_with_handler(
+                lambda request: _echo(request.get_data()))
+        server.expect_request('/api/v1/outputs/').respond_with_json([])
+        pool = network.NodePool([server.url_for('')])
+        txs = [synthetic_tx(2 * i) for i in range(200)]
+        for window in (1, 16):
+            bench.measure(
+                'network.submit_many',
+                lambda: list(network.submit_many(txs, pool, window=window)),
+                repeat=3, transactions=len(txs), window=window)
+        bench.measure(
+            'network.outputs',
+            lambda: pool.call(lambda bdb: bdb.outputs.get('pubkey')),
+            number=100)
+    finally:
+        server.clear()
+        if server.is_running():
+            server.stop()
+
+
+def _echo(body):
+    from werkzeug.wrappers import Response
+    return Response(body, content_type='application/json')
+
+
+def _meta():
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        ).stdout.decode().strip() or None
+    except OSError:
+        revision = None
+    return {
+        'revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+
+def _key(result):
+    return result['name'], json.dumps(result['params'], sort_keys=True)
+
+
+def compare(results, baseline, tolerance):
+    """Print the slowdown of every benchmark found in both result lists and
+    return the regressed ones.
+    """
+    baseline = {_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = baseline.get(_key(result))
+        if old is None or not old['median']:
+            continue
+        ratio = result['median'] / old['median']
+        print('{:<40} {:>8.2f}x {}'.format(result['name'], ratio,
+                                           result['params']),
+              file=sys.stderr)
+        if ratio > tolerance:
+            regressions.append(dict(result, ratio=ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--only', default=','.join(GROUPS),
+                        help='Comma separated benchmark groups to run')
+    parser.add_argument('--quick', action='store_true',
+                        help='Fewer iterations and smaller caches')
+    parser.add_argument('--full', action='store_true',
+                        help='Include the 10^6 entries cache')
+    parser.add_argument('--output', help='Results file, stdout by default')
+    parser.add_argument('--compare', help='Results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help='Allowed slowdown ratio with --compare')
+    args = parser.parse_args(argv)
+
+    groups = args.only.split(',')
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error('unknown groups {}'.format(', '.join(sorted(unknown))))
+    bench = Bench(quick=args.quick)
+    sizes = (FULL_CACHE_SIZES if args.full
+             else CACHE_SIZES[:2] if args.quick else CACHE_SIZES)
+    runners = {
+        'startup': bench_startup,
+        'derive': bench_derive,
+        'keystore': bench_keystore,
+        'unlock': bench_unlock,
+        'sign': bench_sign,
+        'serialize': bench_serialize,
+        'recover': bench_recover,
+        'cache': lambda b: bench_cache(b, sizes),
+        'coinselect': lambda b: bench_coinselect(b, sizes),
+        'dump': lambda b: bench_dump(b, sizes),
+        'network': bench_network,
+    }
+    random.seed(0)
+    for group in groups:
+        runners[group](bench)
+
+    report = json.dumps({'meta': _meta(), 'results': bench.results},
+                        indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(bench.results, baseline, args.tolerance)
+        for result in regressions:
+            print('REGRESSION {name} {params}: {ratio:.2f}x'.format(**result),
+                  file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,32 @@
 # TODO Disallow empty passwords
+import contextlib
+import functools
 import json
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import click
-import pickledb
 from base58 import b58encode
-from bigchaindb_driver import BigchainDB
-from bigchaindb_driver.offchain import fulfill_transaction
 
+import bigchaindb_wallet.agent as agent
+import bigchaindb_wallet.coinselect as coinselect
+import bigchaindb_wallet.discovery as discovery
 import bigchaindb_wallet.keymanagement as km
 import bigchaindb_wallet.keystore as ks
+import bigchaindb_wallet.network as network
+import bigchaindb_wallet.pubindex as pubindex
+import bigchaindb_wallet.recovery as recovery
+import bigchaindb_wallet.signing as signing
+import bigchaindb_wallet.timings as timings
+import bigchaindb_wallet.transactions as transactions
+import bigchaindb_wallet.txcache as txcache
+import bigchaindb_wallet.watch as watch
+
+DEFAULT_WORKERS = 8
+DEFAULT_CHUNK_SIZE = 1000
+DERIVE_FORMATS = ('ndjson', 'csv')
+DERIVE_FIELDS = ('path', 'pubkey', 'privkey')
 
 # Decoratoers
 _wallet = click.option(
@@ -42,15 +59,58 @@ _password = click.option(
 
 _location = click.option(
     '-L', '--location',
-    help=('Keystore file location'),
+    help=('Keystore directory'),
     default=ks.get_home_path_and_warn
 )
 
 _transaction = click.option(
     '-t', '--transaction',
-    help='Transaction json string',
+    help='Transaction json string, required unless --batch',
+    type=str
+)
+
+_batch = click.option(
+    '-b', '--batch',
+    help='Process newline delimited json records read from --input',
+    type=bool,
+    is_flag=True
+)
+
+_input = click.option(
+    '--input', 'input_',
+    help='Batch input file, stdin by default',
+    type=click.File('r'),
+    default='-'
+)
+
+_workers = click.option(
+    '--workers',
+    help='Number of batch worker processes',
+    type=int,
+    default=1
+)
+
+_urls = click.option(
+    '-u', '--url', 'urls',
+    help=('BigchainDB node url, repeat for several nodes. Defaults to '
+          'BDBW_NODES or "nodes" of ~/.bdbw_config'),
     type=str,
-    required=True
+    multiple=True
+)
+
+_timeout = click.option(
+    '--timeout',
+    help='Request timeout in seconds. Default is {}'.format(
+        network.DEFAULT_TIMEOUT),
+    type=int,
+    default=network.DEFAULT_TIMEOUT
+)
+
+_stats = click.option(
+    '--stats',
+    help='Print per node request statistics to stderr',
+    type=bool,
+    is_flag=True
 )
 
 _indent = click.option(
@@ -61,6 +121,97 @@ _indent = click.option(
 )
 
 
+def _enable_timings(ctx, param, value):
+    """Click callback collecting timings until the command returns."""
+    if not value or value == '0':
+        return
+    timings.reset()
+    timings.enable('json' if value == 'json' else 'text')
+
+    def report():
+        timings.report()
+        timings.disable()
+    ctx.call_on_close(report)
+
+
+_timings = click.option(
+    '--timings',
+    help=('Print time spent per phase to stderr when done, as text or '
+          'json. Defaults to BDBW_TIMINGS'),
+    type=str,
+    is_flag=False,
+    flag_value='text',
+    default=lambda: os.environ.get('BDBW_TIMINGS'),
+    expose_value=False,
+    callback=_enable_timings
+)
+
+
+def _kdf_options(command):
+    """KDF algorithm and cost options, passed as ``kdf``, ``kdf_level``,
+    ``opslimit`` and ``memlimit``, ``None`` when not given."""
+    options = [
+        click.option('--kdf', type=click.Choice(km.KDF_ALGORITHMS),
+                     help=('Key derivation function. Default is scrypt, or '
+                           'the current one of a rekeyed wallet')),
+        click.option('--kdf-level', type=click.Choice(km.KDF_LEVELS),
+                     help=('KDF cost, trading unlock time for brute force '
+                           'resistance. Default is sensitive, or the '
+                           'current cost of a rekeyed wallet')),
+        click.option('--opslimit', type=int,
+                     help='KDF operations limit, overrides --kdf-level'),
+        click.option('--memlimit', type=int,
+                     help='KDF memory limit in bytes, overrides --kdf-level'),
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+
+def _kdf_params(kdf, kdf_level, opslimit, memlimit, current=None):
+    """KDF parameters of the options.  Parameters of ``current`` that the
+    options do not override are kept, scrypt at sensitive cost otherwise.
+    """
+    try:
+        if (current is not None and kdf in (None, current.algorithm)
+                and kdf_level is None):
+            return km.kdf_params(current.algorithm,
+                                 opslimit=opslimit or current.opslimit,
+                                 memlimit=memlimit or current.memlimit)
+        return km.kdf_params(kdf or 'scrypt', kdf_level or 'sensitive',
+                             opslimit=opslimit, memlimit=memlimit)
+    except ValueError as error:
+        raise ks.WalletError(error)
+
+
+def _parse_range(ctx, param, value):
+    """Click callback turning ``N`` or inclusive ``N-M`` into a range."""
+    if value is None:
+        return None
+    try:
+        start, _, stop = value.partition('-')
+        start = int(start)
+        stop = int(stop) if stop else start
+    except ValueError:
+        raise click.BadParameter('expected N or N-M')
+    if not 0 <= start <= stop < km.HARDENED_INDEX:
+        raise click.BadParameter('expected 0 <= N <= M < 2^31')
+    return range(start, stop + 1)
+
+
+def _parse_recipients(ctx, param, value):
+    """Click callback turning ``PUBKEY`` or ``PUBKEY:AMOUNT`` values into
+    ``(pubkey, amount)`` pairs."""
+    recipients = []
+    for recipient in value:
+        public_key, _, amount = recipient.partition(':')
+        try:
+            recipients.append((public_key, int(amount or 1)))
+        except ValueError:
+            raise click.BadParameter('expected PUBKEY or PUBKEY:AMOUNT')
+    return recipients
+
+
 # CLI
 @click.group()
 def cli():
@@ -68,6 +219,7 @@ def cli():
 
 
 @cli.command()
+@_timings
 @_password
 @_location
 @_wallet
@@ -84,8 +236,9 @@ def cli():
               help=('Do not create keystore file. Ouput result to stdout'))
 @click.option('-q', '--quiet', type=bool, is_flag=True,
               help=('Only ouput the resulting mnemonic seed'))
+@_kdf_options
 def init(wallet, strength, entropy, mnemonic_language, no_keystore, location,
-         password, quiet):
+         password, quiet, kdf, kdf_level, opslimit, memlimit):
     # TODO make OS checks
     # TODO no-keystore and quiet should be mutually exclusive?
     # TODO Sensible errors on bad input
@@ -96,20 +249,25 @@ def init(wallet, strength, entropy, mnemonic_language, no_keystore, location,
             strength,
             mnemonic_language,
             bytes.fromhex(entropy) if entropy else None)
+        master_key = km.seed_to_extended_key(
+            km.mnemonic_to_seed(mnemonic_phrase))
         wallet_dict = ks.make_wallet_dict(
-            km.seed_to_extended_key(km.mnemonic_to_seed(mnemonic_phrase)),
-            password,
-            name=wallet)
+            master_key, password, name=wallet,
+            kdf=_kdf_params(kdf, kdf_level, opslimit, memlimit))
 
-        keystore_location = '{}/{}'.format(location,
-                                           ks.DEFAULT_KEYSTORE_FILENAME)
         if no_keystore:
             click.echo(ks.wallet_dumps(wallet_dict))
             return
-        elif not confirm_file_rewrite(keystore_location, 'Keystore'):
-            return
-
-        ks.wallet_dump(wallet_dict, keystore_location)
+        with ks.open_keystore(location) as keystore:
+            if (keystore.get(wallet) is not None
+                    and not confirm_rewrite('Wallet {}'.format(wallet))):
+                return
+            keystore.put(wallet_dict)
+        keystore_location = ks.get_keystore_location(location)
+        with pubindex.open_index(location) as pubkey_index:
+            pubkey_index.extend(wallet, master_key,
+                                range(pubindex.DEFAULT_ACCOUNTS),
+                                range(pubindex.DEFAULT_INDEXES))
 
         if quiet:
             click.echo(mnemonic_phrase)
@@ -125,30 +283,71 @@ def init(wallet, strength, entropy, mnemonic_language, no_keystore, location,
 
 
 @cli.command()
+@_timings
 @_wallet
 @_address
 @_index
 @_password
 @_indent
-@click.option('-o', '--operation',
-              type=str, help='Operation CREATE/TRANSFER', required=True)
-@click.option('-A', '--asset', type=str, help='Asset', required=True)
+@_batch
+@_input
+@click.option('-o', '--operation', type=str,
+              help='Operation CREATE/TRANSFER, required unless --batch')
+@click.option('-A', '--asset', type=str,
+              help='Asset, required unless --batch')
 @click.option('-M', '--metadata', type=str, help='Metadata', default='{}')
-def prepare(wallet, address, index, password, asset, metadata, indent, operation):
+@click.option('-R', '--recipient', 'recipients', type=str, multiple=True,
+              callback=_parse_recipients,
+              help=('TRANSFER recipient PUBKEY or PUBKEY:AMOUNT, repeat for '
+                    'several'))
+def prepare(wallet, address, index, password, asset, metadata, indent,
+            operation, batch, input_, recipients):
+    """With --batch every input line is a json record with "asset" and
+    optional "metadata", "operation", "account", "index" and "recipients"
+    keys.  Missing keys default to the corresponding options.
+
+    TRANSFER asset is {"id": ASSET_ID}.  Inputs are picked from unspent
+    outputs of the wallet in the transaction cache and change is paid back
+    to the --address and --index address."""
     try:
-        if not operation.upper() in ['CREATE', 'TRANSFER']:
-            raise ks.WalletError('Operation should be either CREATE or TRANSFER')
-        key = ks.get_private_key_drv(wallet, address, index, password)
-        bdb = BigchainDB()
-        prepared_creation_tx = bdb.transactions.prepare(
-            operation=operation.upper(),
-            signers=b58encode(km.privkey_to_pubkey(key.privkey)[1:]).decode(),
-            asset=json.loads(asset),
-            metadata=json.loads(metadata),
-        )
-        click.echo(
-            json.dumps(prepared_creation_tx, indent=4 if indent else None)
-        )
+        if batch:
+            records = (_json_loads(line) for line in input_ if line.strip())
+        elif operation is None or asset is None:
+            raise ks.WalletError(
+                'Missing option "-o" / "--operation" or "-A" / "--asset"')
+        else:
+            records = [{'asset': json.loads(asset)}]
+        with pubindex.open_index() as pubkey_index, \
+                txcache.open_cache() as cache:
+            get_pubkey = _pubkey_getter(wallet, password, pubkey_index)
+            get_owners = _owners_getter(wallet, pubkey_index)
+            for record in records:
+                record_operation = record.get('operation', operation) or ''
+                if not record_operation.upper() in ['CREATE', 'TRANSFER']:
+                    raise ks.WalletError(
+                        'Operation should be either CREATE or TRANSFER')
+                signers = get_pubkey(record.get('account', address),
+                                     record.get('index', index))
+                inputs = record_recipients = None
+                if record_operation.upper() == 'TRANSFER':
+                    inputs, record_recipients = coinselect.fund_transfer(
+                        cache, _transfer_asset_id(record['asset']),
+                        get_owners(signers),
+                        [tuple(recipient) for recipient
+                         in record.get('recipients', recipients)],
+                        signers)
+                with timings.span('prepare'):
+                    prepared_tx = transactions.prepare(
+                        operation=record_operation.upper(),
+                        signers=signers,
+                        recipients=record_recipients,
+                        asset=record['asset'],
+                        metadata=record.get('metadata', json.loads(metadata)),
+                        inputs=inputs,
+                    )
+                click.echo(
+                    _json_dumps(prepared_tx, indent=4 if indent else None)
+                )
         # TODO ks.WalletError decorator
     except ks.WalletError as error:
         click.echo(error)
@@ -159,19 +358,46 @@ def prepare(wallet, address, index, password, asset, metadata, indent, operation
 
 
 @cli.command()
+@_timings
 @_wallet
-@_address
-@_index
+@click.option('-a', '--address', type=int,
+              default=lambda: os.environ.get('BDBW_ACCOUNT_IDX'),
+              help='Address to sign with, found from the inputs by default')
+@click.option('-i', '--index', type=int,
+              default=lambda: os.environ.get('BDBW_ADDRESS_IDX'),
+              help='Address index to sign with, found from the inputs by '
+                   'default')
 @_password
+@_batch
+@_input
+@_workers
 @_transaction
-def fulfill(wallet, password, address, index, transaction):
+def fulfill(wallet, password, address, index, transaction, batch, input_,
+            workers):
+    """Without --address and --index the signing keys are the wallet
+    addresses the public key index finds among the inputs' owners."""
     try:
-        key = ks.get_private_key_drv(wallet, address, index, password)
-        tx = fulfill_transaction(
-            json.loads(transaction),
-            private_keys=[b58encode(key.privkey).decode()]
-        )
-        click.echo(json.dumps(tx))
+        if batch:
+            lines = (line for line in input_ if line.strip())
+        elif transaction is None:
+            raise ks.WalletError('Missing option "-t" / "--transaction"')
+        else:
+            lines = [transaction]
+        with pubindex.open_index() as pubkey_index:
+            get_paths = _signing_paths_getter(wallet, pubkey_index,
+                                              address, index)
+            txs = (_json_loads(line) for line in lines)
+            if agent.serves(wallet):
+                jobs = ((tx, get_paths(tx)) for tx in txs)
+                sign = functools.partial(_agent_fulfill_job, wallet=wallet)
+                workers = 1
+            else:
+                get_key = _private_key_getter(wallet, password)
+                jobs = ((tx, [get_key(*i) for i in get_paths(tx)])
+                        for tx in txs)
+                sign = _fulfill_job
+            for tx in imap_ordered(sign, jobs, workers=workers):
+                click.echo(tx)
     # TODO ks.WalletError decorator
     except ks.WalletError as error:
         click.echo(error)
@@ -182,54 +408,100 @@ def fulfill(wallet, password, address, index, transaction):
 
 
 @cli.command()
+@_timings
 @_transaction
 @_indent
-@click.option(
-    '-u', '--url',
-    help='BigchaiDB url',
-    type=str,
-    required=True)
-def commit(transaction, url, indent):
+@_batch
+@_input
+@_urls
+@_timeout
+@_stats
+@click.option('-m', '--mode', type=click.Choice(network.SEND_MODES),
+              default='commit',
+              help=('Wait for the transaction to be validated (sync) or '
+                    'committed (commit), or not at all (async). '
+                    'Default is commit'))
+@click.option('--window', type=int, default=network.DEFAULT_WINDOW,
+              help=('Number of batch transactions in flight. '
+                    'Default is {}'.format(network.DEFAULT_WINDOW)))
+@click.option('--retries', type=int, default=network.DEFAULT_RETRIES,
+              help=('Retries of timed out or unavailable node requests. '
+                    'Default is {}'.format(network.DEFAULT_RETRIES)))
+def commit(transaction, urls, indent, batch, input_, mode, window, retries,
+           timeout, stats):
+    """With --batch transactions are read from --input as newline delimited
+    json and a result record is written for each of them."""
     try:
-        bdb = BigchainDB(url)
-        tx = bdb.transactions.send_commit(json.loads(transaction))
-        click.echo(
-            json.dumps(tx, indent=4 if indent else None)
-        )
-        cache_location = '{}/{}'.format(ks.get_home_path_and_warn(),
-                                        '.bdbw_cache')
-        db = pickledb.load(cache_location, False)
-        db.set(tx['id'], tx)
-        db.dump()
+        if not batch and transaction is None:
+            raise ks.WalletError('Missing option "-t" / "--transaction"')
+        pool = network.NodePool(network.get_nodes(urls), timeout=timeout)
+        if batch:
+            _commit_batch(input_, pool, mode=mode, window=window,
+                          retries=retries)
+        else:
+            tx, _ = network.call_with_retries(
+                lambda: pool.call(lambda bdb: network.send(
+                    bdb, json.loads(transaction), mode)),
+                retries=retries
+            )
+            click.echo(
+                json.dumps(tx, indent=4 if indent else None)
+            )
+            with txcache.open_cache() as cache:
+                cache.add(tx)
+        if stats:
+            click.echo(json.dumps(pool.stats()), err=True)
+    except ks.WalletError as error:
+        click.echo(error)
     except Exception:
         click.echo('Operation aborted: unrecoverable error')
 
 
 @cli.command(name='import')
+@_timings
 @_wallet
 @_password
 @_location
 @click.argument('type', type=str, required=True)
 @click.argument('value', type=(str, str),
                 required=True)
-@click.option('-u', '--url', type=str,
-              help='Import existing transactions from url')
+@_urls
+@_timeout
+@_stats
 @click.option('--force', is_flag=True,
               help='Skip confirmations')
-def import_(wallet, type, value, password, location, url, force):
+@click.option('--workers', type=int, default=DEFAULT_WORKERS,
+              help=('Number of concurrent requests during import. '
+                    'Default is {}'.format(DEFAULT_WORKERS)))
+@click.option('--gap-limit', type=int, default=discovery.GAP_LIMIT,
+              help=('Consecutive unused addresses ending an account scan. '
+                    'Default is {}'.format(discovery.GAP_LIMIT)))
+@click.option('--account-gap-limit', type=int,
+              default=discovery.ACCOUNT_GAP_LIMIT,
+              help=('Consecutive unused accounts ending the scan. '
+                    'Default is {}'.format(discovery.ACCOUNT_GAP_LIMIT)))
+@click.option('--rescan', is_flag=True,
+              help='Ignore scan checkpoint and scan from the first address')
+@click.option('--ledger-dump', type=click.Path(exists=True, dir_okay=False),
+              help=('Ndjson file of ledger transactions, optionally gzip '
+                    'compressed, to import from instead of the nodes'))
+@_kdf_options
+def import_(wallet, type, value, password, location, urls, force, workers,
+            timeout, stats, gap_limit, account_gap_limit, rescan, ledger_dump,
+            kdf, kdf_level, opslimit, memlimit):
     """TYPE is either key or seed\n
-    VALUE is a hex encoded seed or space separated master key and chaincode"""
+    VALUE is a hex encoded seed or space separated master key and chaincode\n
+    Existing transactions are imported from --ledger-dump or, when node urls
+    are known, from the nodes"""
     try:
         if type.lower() not in ['seed', 'key']:
             click.echo('TYPE must be either either "key" or "seed"')
             return
 
-        keystore_location = '{}/{}'.format(location,
-                                           ks.DEFAULT_KEYSTORE_FILENAME)
-
-        if (not force
-           and not confirm_file_rewrite(keystore_location, 'Keystore')):
-            return
+        with ks.open_keystore(location) as keystore:
+            if (not force and keystore.get(wallet) is not None
+                    and not confirm_rewrite('Wallet {}'.format(wallet))):
+                return
 
         if type == 'key':
             master_key = km.ExtendedKey(*[bytes.fromhex(i) for i in value])
@@ -238,15 +510,41 @@ def import_(wallet, type, value, password, location, url, force):
             raise ks.WalletError('Not yet implemented\n'
                                  'Use the "key" import')
 
-        wallet_dict = ks.make_wallet_dict(master_key, password, name=wallet)
+        wallet_dict = ks.make_wallet_dict(
+            master_key, password, name=wallet,
+            kdf=_kdf_params(kdf, kdf_level, opslimit, memlimit))
 
-        ks.wallet_dump(wallet_dict, keystore_location)
+        ks.store_wallets(wallet_dict, location)
+        keystore_location = ks.get_keystore_location(location)
 
-        cache_location = '{}/{}'.format(ks.get_home_path_and_warn(),
-                                        '.bdbw_cache')
-        populate_tx_cache(xkey=master_key,
-                          location=cache_location,
-                          url=url)
+        nodes = network.get_nodes(urls)
+        checkpoint = {}
+        if ledger_dump:
+            checkpoint = populate_tx_cache_from_dump(
+                xkey=master_key,
+                location=txcache.get_cache_location(),
+                dump=ledger_dump,
+                gap_limit=gap_limit,
+                account_gap_limit=account_gap_limit)
+        elif nodes:
+            pool = network.NodePool(nodes, timeout=timeout)
+            checkpoint = populate_tx_cache(
+                xkey=master_key,
+                location=txcache.get_cache_location(),
+                pool=pool,
+                workers=workers,
+                gap_limit=gap_limit,
+                account_gap_limit=account_gap_limit,
+                rescan=rescan)
+            if stats:
+                click.echo(json.dumps(pool.stats()), err=True)
+        with pubindex.open_index(location) as pubkey_index:
+            pubkey_index.extend(wallet, master_key,
+                                range(pubindex.DEFAULT_ACCOUNTS),
+                                range(pubindex.DEFAULT_INDEXES))
+            for account, last_used in checkpoint.items():
+                pubkey_index.extend(wallet, master_key, [account],
+                                    range(last_used + gap_limit + 1))
 
         click.echo('Keystore initialized in:\n{}'.format(keystore_location))
     except ks.WalletError as error:
@@ -255,41 +553,691 @@ def import_(wallet, type, value, password, location, url, force):
         click.echo('Operation aborted: unrecoverable error')
 
 
+_accounts = click.option(
+    '-a', '--accounts', type=str, callback=_parse_range,
+    help='Account or inclusive account range N-M. Default is every account')
+
+
+@cli.command()
+@_timings
+@_wallet
+@_location
+@_accounts
+@click.option('-A', '--asset-id', type=str, help='Only this asset')
+@_indent
+def balance(wallet, location, accounts, asset_id, indent):
+    """Unspent amounts held by the indexed wallet addresses by asset id,
+    from the transaction cache.  Needs no password"""
+    try:
+        with pubindex.open_index(location) as pubkey_index, \
+                txcache.open_cache() as cache:
+            click.echo(_json_dumps(
+                cache.balance(_wallet_pubkeys(wallet, pubkey_index,
+                                              accounts), asset_id),
+                indent=4 if indent else None))
+    except ks.WalletError as error:
+        click.echo(error)
+    except Exception:
+        click.echo('Operation aborted: unrecoverable error')
+
+
+@cli.command()
+@_timings
+@_wallet
+@_location
+@_accounts
+@click.option('-A', '--asset-id', type=str, help='Only this asset')
+@click.option('-n', '--limit', type=int, default=txcache.HISTORY_PAGE_SIZE,
+              help=('Entries per page. '
+                    'Default is {}'.format(txcache.HISTORY_PAGE_SIZE)))
+@click.option('--before', type=int,
+              help='Page after the entry of this seq, the last one shown')
+def history(wallet, location, accounts, asset_id, limit, before):
+    """Transactions of the indexed wallet addresses, latest cached first,
+    as json lines with the amounts the wallet received and sent.  Needs no
+    password"""
+    try:
+        with pubindex.open_index(location) as pubkey_index, \
+                txcache.open_cache() as cache:
+            for entry in cache.history(
+                    _wallet_pubkeys(wallet, pubkey_index, accounts),
+                    asset_id=asset_id, before=before, limit=limit):
+                click.echo(json.dumps(entry))
+    except ks.WalletError as error:
+        click.echo(error)
+    except Exception:
+        click.echo('Operation aborted: unrecoverable error')
+
+
+@cli.command(name='watch')
+@_timings
+@_wallet
+@_password
+@_location
+@_urls
+@_timeout
+@click.option('-s', '--stream-url', type=str,
+              help=('Valid transactions WebSocket stream url. Default is '
+                    'the one the node advertises'))
+@click.option('--workers', type=int, default=DEFAULT_WORKERS,
+              help=('Number of concurrent block requests. '
+                    'Default is {}'.format(DEFAULT_WORKERS)))
+@click.option('--gap-limit', type=int, default=discovery.GAP_LIMIT,
+              help=('Unused addresses watched past the last used one. '
+                    'Default is {}'.format(discovery.GAP_LIMIT)))
+@click.option('--account-gap-limit', type=int,
+              default=discovery.ACCOUNT_GAP_LIMIT,
+              help=('Unused accounts watched past the last used one. '
+                    'Default is {}'.format(discovery.ACCOUNT_GAP_LIMIT)))
+@click.option('--max-events', type=int,
+              help='Exit after this many events. Default is to run forever')
+def watch_(wallet, password, location, urls, timeout, stream_url, workers,
+           gap_limit, account_gap_limit, max_events):
+    """Keep the transaction cache current from the node event stream.
+    Transactions of indexed wallet addresses are cached and printed as json
+    lines.  The first run looks the addresses up before following the
+    stream.  With --password more addresses are indexed as they get used"""
+    try:
+        from bigchaindb_driver.exceptions import NotFoundError
+
+        pool = network.NodePool(network.get_nodes(urls), timeout=timeout)
+        if not stream_url:
+            stream_url = network.call_with_retries(lambda: pool.call(
+                lambda bdb: bdb.api_info()))[0]['streams']
+        cache_location = txcache.get_cache_location()
+        checkpoint_location = os.path.join(
+            os.path.dirname(cache_location),
+            discovery.DEFAULT_CHECKPOINT_FILENAME)
+
+        def get_block(height):
+            try:
+                return network.call_with_retries(lambda: pool.call(
+                    lambda bdb: bdb.blocks.retrieve(str(height))))[0]
+            except NotFoundError:
+                return None
+
+        def get_outputs(public_key):
+            return network.call_with_retries(lambda: pool.call(
+                lambda bdb: bdb.outputs.get(public_key)))[0]
+
+        def get_spent_outputs(public_key):
+            return network.call_with_retries(lambda: pool.call(
+                lambda bdb: bdb.outputs.get(public_key, spent=True)))[0]
+
+        def get_transaction(txid):
+            return network.call_with_retries(lambda: pool.call(
+                lambda bdb: bdb.transactions.retrieve(txid)))[0]
+
+        def get_transfers(asset_id):
+            return network.call_with_retries(lambda: pool.call(
+                lambda bdb: bdb.transactions.get(asset_id=asset_id,
+                                                 operation='TRANSFER')))[0]
+
+        with pubindex.open_index(location) as pubkey_index, \
+                txcache.open_cache(cache_location) as cache, \
+                ThreadPoolExecutor(max_workers=workers) as executor:
+            if not pubkey_index.is_current(wallet):
+                raise ks.WalletError('Public key index of wallet {} is '
+                                     'missing'.format(wallet))
+            fingerprint = pubkey_index.master_pubkey(wallet)
+            master = []
+
+            def derive(account, indexes):
+                if not master:
+                    master.append(ks.get_master_xprivkey(
+                        ks.get_wallet_content(wallet), wallet, password))
+                pubkey_index.extend(wallet, master[0], [account], indexes)
+                return [(index, pubkey_index.get(wallet, account, index))
+                        for index in indexes]
+
+            def scan(public_keys):
+                txids = {output['transaction_id'] for outputs
+                         in executor.map(get_outputs, public_keys)
+                         for output in outputs}
+                txs = list(executor.map(get_transaction, sorted(
+                    txid for txid in txids if txid not in cache)))
+                cache.add_many(txs)
+                return txs + _fetch_spenders(cache, executor, public_keys,
+                                             get_spent_outputs, get_transfers)
+
+            watcher = watch.Watcher(
+                {pubkey: (account, index) for account, index, pubkey
+                 in pubkey_index.addresses(wallet)},
+                lambda heights: executor.map(get_block, heights),
+                cache.add_many,
+                height=discovery.load_height(checkpoint_location,
+                                             fingerprint),
+                scan=scan,
+                derive=derive if password else None,
+                gap_limit=gap_limit,
+                account_gap_limit=account_gap_limit)
+            with contextlib.closing(watch.stream_events(stream_url)) as events:
+                for count, event in enumerate(events, 1):
+                    height = watcher.height
+                    for tx in watcher.handle(event):
+                        click.echo(json.dumps({
+                            'id': tx['id'],
+                            'operation': tx['operation'],
+                            'asset_id': txcache.tx_asset_id(tx)}))
+                    if watcher.height != height:
+                        discovery.save_height(checkpoint_location,
+                                              fingerprint, watcher.height)
+                    if max_events and count >= max_events:
+                        break
+    except ks.WalletError as error:
+        click.echo(error)
+    except Exception:
+        click.echo('Operation aborted: unrecoverable error')
+
+
+@cli.command()
+@_timings
+@_wallet
+@_password
+@click.option('-n', '--new-password', type=str,
+              default=lambda: os.environ.get('BDBW_NEW_PASSWORD'),
+              help='New wallet password. Default is to keep the password')
+@_kdf_options
+def rekey(wallet, password, new_password, kdf, kdf_level, opslimit,
+          memlimit):
+    """Encrypt the wallet master key again with new KDF parameters or
+    password.  Other wallets of the keystore are kept as they are."""
+    try:
+        wallet_dict = ks.get_wallet_content(wallet)
+        current = (ks.get_kdf_params(wallet_dict[wallet]['master_privkey'])
+                   if wallet in wallet_dict else None)
+        wallet_dict = ks.rekey_wallet(
+            wallet_dict, wallet, password, new_password,
+            _kdf_params(kdf, kdf_level, opslimit, memlimit, current))
+        ks.store_wallets(wallet_dict)
+        params = ks.get_kdf_params(wallet_dict[wallet]['master_privkey'])
+        click.echo('Wallet {} encrypted with {} opslimit {} memlimit {}'
+                   .format(wallet, *params))
+    except ks.WalletError as error:
+        click.echo(error)
+    except Exception:
+        click.echo('Operation aborted: unrecoverable error')
+
+
+@cli.command(name='export-keystore')
+@_timings
+@click.option('-w', '--wallet', 'wallets', type=str, multiple=True,
+              help='Wallet to export, repeat for several.  Default is all')
+@click.option('-O', '--output', type=str,
+              help='Json keystore file to write, stdout by default')
+def export_keystore(wallets, output):
+    """Export wallets as a json keystore file.  Master keys stay
+    encrypted."""
+    try:
+        if not ks.keystore_exists():
+            raise ks.WalletError('Wallet not found')
+        with ks.open_keystore() as keystore:
+            wallet_dict = keystore.export(wallets or None)
+        if output is None:
+            click.echo(ks.wallet_dumps(wallet_dict))
+        else:
+            ks.wallet_dump(wallet_dict, output)
+    except ks.WalletError as error:
+        click.echo(error)
+    except Exception:
+        click.echo('Operation aborted: unrecoverable error')
+
+
+@cli.command(name='import-keystore')
+@_timings
+@click.argument('file_', metavar='FILE', type=str)
+@click.option('-f', '--force', is_flag=True,
+              help='Replace wallets of the same name')
+@_location
+def import_keystore(file_, force, location):
+    """Import the wallets of a json keystore FILE, as written by
+    export-keystore and older versions.  Wallets of the same name are kept
+    unless --force."""
+    try:
+        wallet_dict = ks.load_keystore_file(file_)
+        imported = ks.store_wallets(wallet_dict, location, replace=force)
+        click.echo('{} of {} wallets imported into:\n{}'.format(
+            imported, len(wallet_dict), ks.get_keystore_location(location)))
+    except OSError:
+        click.echo('Keystore file {} not found'.format(file_))
+    except ks.WalletError as error:
+        click.echo(error)
+    except Exception:
+        click.echo('Operation aborted: unrecoverable error')
+
+
+@cli.command(name='agent')
+@_timings
+@_wallet
+@_password
+@click.option('-s', '--socket', 'socket_path', type=str,
+              default=agent.get_agent_socket_path,
+              help='Agent socket location')
+@click.option('--ttl', type=int, default=agent.DEFAULT_AGENT_TTL,
+              help=('Seconds to keep the wallet unlocked, 0 for no limit. '
+                    'Default is {}'.format(agent.DEFAULT_AGENT_TTL)))
+@click.option('--max-uses', type=int, default=None,
+              help='Number of key operations to serve before exiting')
+@click.option('--stop', is_flag=True, help='Stop running agent')
+def agent_(wallet, password, socket_path, ttl, max_uses, stop):
+    """Unlock wallet once and serve prepare and fulfill key operations over a
+    unix socket.  Runs in foreground until TTL or max uses are exhausted."""
+    try:
+        if stop:
+            agent.call({'op': 'stop'}, socket_path)
+            return
+        xkey = ks.get_master_xprivkey(ks.get_wallet_content(wallet), wallet,
+                                      password)
+        server = agent.KeyAgentServer(xkey, wallet, socket_path,
+                                      ttl=ttl, max_uses=max_uses)
+        click.echo('Agent listening on:\n{}'.format(socket_path))
+        server.serve_until_expired()
+    except ks.WalletError as error:
+        click.echo(error)
+    except Exception:
+        click.echo('Operation aborted: unrecoverable error')
+
+
+@cli.command()
+@_timings
+@_wallet
+@_password
+@click.option('-a', '--accounts', type=str, default='0',
+              callback=_parse_range,
+              help='Account or inclusive account range N-M. Default is 0')
+@click.option('-r', '--range', 'indexes', type=str, required=True,
+              callback=_parse_range,
+              help='Address index or inclusive index range N-M')
+@click.option('-f', '--format', 'format_', type=click.Choice(DERIVE_FORMATS),
+              default='ndjson', help='Output format. Default is ndjson')
+@click.option('--private', is_flag=True,
+              help='Output private keys too')
+@click.option('--workers', type=int, default=os.cpu_count,
+              help='Number of derivation processes. Default is cpu count')
+@click.option('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+              help=('Addresses derived per job. '
+                    'Default is {}'.format(DEFAULT_CHUNK_SIZE)))
+def derive(wallet, password, accounts, indexes, format_, private, workers,
+           chunk_size):
+    """Stream path and public key, and with --private the private key, of
+    every address of the account and index ranges."""
+    try:
+        xkey = ks.get_master_xprivkey(ks.get_wallet_content(wallet), wallet,
+                                      password)
+        fields = DERIVE_FIELDS if private else DERIVE_FIELDS[:2]
+        if format_ == 'csv':
+            click.echo(','.join(fields))
+        jobs = (
+            (km.derive_key(xkey, ks.bdbw_tree_index(account)[:-1]), account,
+             range(start, min(start + chunk_size, indexes.stop)),
+             format_, private)
+            for account in accounts
+            for start in range(indexes.start, indexes.stop, chunk_size)
+        )
+        for lines in imap_ordered(_derive_job, jobs, workers=workers):
+            click.echo(lines, nl=False)
+    except ks.WalletError as error:
+        click.echo(error)
+    except Exception:
+        click.echo('Operation aborted: unrecoverable error')
+
+
+@cli.command(name='recover')
+@_timings
+@_wallet
+@click.argument('phrase', nargs=-1, required=True)
+@click.option('-l', '--mnemonic-language', type=str, default='english',
+              help='Mnemonic language. Default is english')
+@click.option('-m', '--master-pubkey', type=str,
+              help=('Hex master public key to match, as recorded in the '
+                    'keystore.  Default is the one of the wallet'))
+@click.option('-k', '--pubkey', 'pubkeys', type=str, multiple=True,
+              help='Base58 address public key to match, repeat for several')
+@click.option('-a', '--accounts', type=str, default='0',
+              callback=_parse_range,
+              help='Accounts searched for --pubkey, N or N-M. Default is 0')
+@click.option('-r', '--range', 'indexes', type=str, default='0-19',
+              callback=_parse_range,
+              help='Address indexes searched for --pubkey. Default is 0-19')
+@click.option('--workers', type=int, default=os.cpu_count,
+              help='Number of search processes. Default is cpu count')
+def recover(wallet, phrase, mnemonic_language, master_pubkey, pubkeys,
+            accounts, indexes, workers):
+    """Recover a mnemonic PHRASE with unknown words, given as "?", or
+    misspelled ones.  Phrases are matched against the master public key or
+    address public keys, progress is reported to stderr."""
+    try:
+        if not master_pubkey and not pubkeys:
+            keystore_wallet = ks.get_wallet_content(wallet).get(wallet)
+            if keystore_wallet is None:
+                raise ks.WalletError('Pass --master-pubkey or --pubkey, '
+                                     'wallet {} is not found'.format(wallet))
+            master_pubkey = keystore_wallet['master_pubkey']
+        search = recovery.phrase_search(
+            ' '.join(phrase).lower().split(), language=mnemonic_language,
+            master_pubkey=master_pubkey, pubkeys=pubkeys, accounts=accounts,
+            indexes=indexes)
+
+        def progress(checked, valid):
+            click.echo('Checked {} of {} phrases, {} with a valid checksum'
+                       .format(checked, len(search), valid), err=True)
+
+        found = recovery.recover(search, workers=workers, progress=progress)
+        click.echo(found or 'No matching phrase found')
+    except ks.WalletError as error:
+        click.echo(error)
+    except Exception:
+        click.echo('Operation aborted: unrecoverable error')
+
+
 # Utils
-GAP_LIMIT = 20
-
-
-def populate_tx_cache(*, xkey, location, url):
-    db = pickledb.load(location, False)
-    bdb = BigchainDB(url)
-    for account in range(GAP_LIMIT):
-        for index in range(GAP_LIMIT):
-            dxk = ks.bdbw_derive_account(
-                xkey,
-                account=account,
-                index=index
-            )
-            outputs = bdb.outputs.get(
-                b58encode(km.privkey_to_pubkey(dxk.privkey)[1:]).decode()
-            )
-            if not outputs:
-                break
-            for output in outputs:
-                txid = output['transaction_id']
-                db.set(txid, bdb.transactions.get(asset_id=txid)[0])
-    db.dump()
+def _json_loads(text):
+    with timings.span('json.decode'):
+        return json.loads(text)
+
+
+def _json_dumps(obj, indent=None):
+    with timings.span('json.encode'):
+        return json.dumps(obj, indent=indent)
+
+
+def imap_ordered(fn, iterable, *, workers=1, window=None):
+    """Lazily map ``fn`` over ``iterable`` keeping input order.  With more than
+    one worker ``fn`` runs in a process pool with at most ``window`` items in
+    flight, so memory use does not depend on the input size.
+    """
+    if workers <= 1:
+        yield from map(fn, iterable)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+
+    window = window or workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in iterable:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+CACHE_BATCH_SIZE = 500
+
+
+def _commit_batch(input_, pool, *, mode, window, retries):
+    txs = (_json_loads(line) for line in input_ if line.strip())
+    committed = []
+    with txcache.open_cache() as cache:
+        try:
+            for tx, record in network.submit_many(
+                    txs, pool,
+                    mode=mode, window=window, retries=retries):
+                click.echo(json.dumps(record))
+                if record['status'] == 'ok':
+                    committed.append(tx)
+                if len(committed) >= CACHE_BATCH_SIZE:
+                    cache.add_many(committed)
+                    committed.clear()
+        finally:
+            # Transactions the node committed before a failure are cached
+            cache.add_many(committed)
+
+
+def _pubkey_getter(wallet, password, pubkey_index):
+    """Returns a function mapping account and index to a base58 public key.
+    Keys are read from the watch-only index when possible.  Others come from
+    the agent when it serves the wallet, otherwise the wallet is unlocked
+    once, on first use, and the index is extended with the derived keys.
+    """
+    indexed = pubkey_index.is_current(wallet)
+    use_agent = agent.serves(wallet)
+    master = []
+
+    def get_pubkey(account, index):
+        pubkey = indexed and pubkey_index.get(wallet, account, index)
+        if pubkey:
+            return pubkey
+        if use_agent:
+            pubkey = agent.get_pubkey(wallet, account, index)
+            if pubkey is None:
+                raise ks.WalletError('Agent stopped serving the wallet')
+            return pubkey
+        if not master:
+            master.append(ks.get_master_xprivkey(
+                ks.get_wallet_content(wallet), wallet, password))
+        pubkey_index.extend(wallet, master[0], [account], [index])
+        return pubkey_index.get(wallet, account, index)
+    return get_pubkey
+
+
+def _wallet_pubkeys(wallet, pubkey_index, accounts=None):
+    """Indexed public keys of ``wallet``, of ``accounts`` only if given."""
+    if not pubkey_index.is_current(wallet):
+        raise ks.WalletError('Public key index of wallet {} is '
+                             'missing'.format(wallet))
+    return [pubkey for account, _, pubkey in pubkey_index.addresses(wallet)
+            if accounts is None or account in accounts]
+
+
+def _transfer_asset_id(asset):
+    asset_id = asset.get('id') if isinstance(asset, dict) else None
+    if not isinstance(asset_id, str):
+        raise ks.WalletError('TRANSFER asset should be {"id": ASSET_ID}')
+    return asset_id
+
+
+def _owners_getter(wallet, pubkey_index):
+    """Returns a function mapping the signer public key to the public keys
+    whose outputs fund a TRANSFER.  Those are every indexed wallet address,
+    or only the signer if the index is not current.
+    """
+    indexed = []
+
+    def get_owners(signer):
+        if not indexed:
+            indexed.append(pubkey_index.pubkeys(wallet)
+                           if pubkey_index.is_current(wallet) else set())
+        return indexed[0] | {signer}
+    return get_owners
+
+
+def _signing_paths_getter(wallet, pubkey_index, address=None, index=None):
+    """Returns a function mapping a transaction to the ``(account, index)``
+    pairs to sign it with.  That is the given address, or without one, the
+    indexed wallet addresses owning the transaction inputs.  Wallets without
+    a public key index sign with the first address.
+    """
+    if (address is not None or index is not None
+            or not pubkey_index.is_current(wallet)):
+        paths = [(address or 0, index or 0)]
+        return lambda tx: paths
 
+    def get_paths(tx):
+        owners = {owner for input_ in tx['inputs']
+                  for owner in input_['owners_before']}
+        located = (pubkey_index.locate(owner, wallet) for owner in owners)
+        paths = sorted({i[1:] for i in located if i is not None})
+        if not paths:
+            raise ks.WalletError('No address of wallet {} owns the '
+                                 'transaction inputs'.format(wallet))
+        return paths
+    return get_paths
 
-def confirm_file_rewrite(
-        file_,
+
+def _private_key_getter(wallet, password):
+    """Returns a function mapping account and index to a base58 private key.
+    The wallet is unlocked once, on first use.
+    """
+    master = []
+
+    def get_key(account, index):
+        if not master:
+            master.append(ks.get_master_xprivkey(
+                ks.get_wallet_content(wallet), wallet, password))
+        return b58encode(ks.DERIVATION_CACHE.derive(
+            master[0], ks.bdbw_tree_index(account, index)).privkey).decode()
+    return get_key
+
+
+def _fulfill_job(job):
+    tx, private_keys = job
+    return _json_dumps(signing.fulfill(tx, private_keys))
+
+
+def _derive_job(job):
+    """Output lines of a chunk of addresses, derived from the key of
+    their account, ``m/44/822'/{account}'/0``.
+    """
+    account_key, account, indexes, format_, private = job
+    lines = []
+    for index in indexes:
+        xkey = km.derive_key(account_key, (index + km.HARDENED_INDEX,))
+        row = [ks.BDBW_PATH_TEMPLATE.format(account=account,
+                                            address_index=index),
+               b58encode(km.privkey_to_pubkey(xkey.privkey)[1:]).decode()]
+        if private:
+            row.append(b58encode(xkey.privkey).decode())
+        if format_ == 'csv':
+            lines.append(','.join(row))
+        else:
+            lines.append(json.dumps(dict(zip(DERIVE_FIELDS, row))))
+    return ''.join(line + '\n' for line in lines)
+
+
+def _agent_fulfill_job(job, *, wallet):
+    tx, paths = job
+    with timings.span('agent'):
+        tx = agent.fulfill(tx, wallet, paths)
+    if tx is None:
+        raise ks.WalletError('Agent stopped serving the wallet')
+    return _json_dumps(tx)
+
+
+def populate_tx_cache(*, xkey, location, pool, workers=DEFAULT_WORKERS,
+                      gap_limit=discovery.GAP_LIMIT,
+                      account_gap_limit=discovery.ACCOUNT_GAP_LIMIT,
+                      rescan=False):
+    """Discover the wallet's used addresses and store their transactions in
+    the cache.  Output lookups and transaction fetches run concurrently in a
+    pool of ``workers`` threads and are spread over the nodes of ``pool``.
+    Scan progress is checkpointed next to the cache after every account so
+    later scans only probe the frontier.  Transactions spending outputs of
+    used addresses are stored too, so those outputs are known as spent.
+    Returns the checkpoint, last used address index by account.
+    """
+    checkpoint_location = os.path.join(os.path.dirname(location),
+                                       discovery.DEFAULT_CHECKPOINT_FILENAME)
+    checkpoint = ({} if rescan
+                  else discovery.load_checkpoint(checkpoint_location, xkey))
+
+    def get_outputs(pubkey):
+        return network.call_with_retries(lambda: pool.call(
+            lambda bdb: bdb.outputs.get(b58encode(pubkey[1:]).decode())
+        ))[0]
+
+    def get_spent_outputs(public_key):
+        return network.call_with_retries(lambda: pool.call(
+            lambda bdb: bdb.outputs.get(public_key, spent=True)
+        ))[0]
+
+    def get_transaction(txid):
+        return network.call_with_retries(lambda: pool.call(
+            lambda bdb: bdb.transactions.retrieve(txid)
+        ))[0]
+
+    def get_transfers(asset_id):
+        return network.call_with_retries(lambda: pool.call(
+            lambda bdb: bdb.transactions.get(asset_id=asset_id,
+                                             operation='TRANSFER')
+        ))[0]
+
+    with txcache.open_cache(location) as cache, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        for _, used_addresses in discovery.discover(
+                xkey, get_outputs, executor,
+                checkpoint=checkpoint,
+                gap_limit=gap_limit,
+                account_gap_limit=account_gap_limit):
+            fetches = {}
+            for _, _, outputs in used_addresses:
+                for output in outputs:
+                    txid = output['transaction_id']
+                    if txid not in fetches and txid not in cache:
+                        fetches[txid] = executor.submit(get_transaction,
+                                                        txid)
+            if not used_addresses:
+                continue
+            cache.add_many([fetch.result() for fetch in fetches.values()])
+            cache.add_many(_fetch_spenders(
+                cache, executor,
+                [b58encode(pubkey[1:]).decode()
+                 for _, pubkey, _ in used_addresses],
+                get_spent_outputs, get_transfers))
+            discovery.save_checkpoint(checkpoint_location, xkey, checkpoint)
+    return checkpoint
+
+
+def _fetch_spenders(cache, executor, public_keys, get_spent_outputs,
+                    get_transfers):
+    """Transactions spending outputs of ``public_keys`` that ``cache``
+    has as unspent.  Nodes list spent outputs by owner but not their
+    spenders, so the transfers of their assets are searched, one request
+    per asset.
+    """
+    unmarked = {}  # (transaction id, output index) -> asset id
+    for public_key, spent_outputs in zip(
+            public_keys, executor.map(get_spent_outputs, public_keys)):
+        spent = {(output['transaction_id'], output['output_index'])
+                 for output in spent_outputs}
+        for output in cache.outputs(public_key, spent=False):
+            link = output['transaction_id'], output['output_index']
+            if link in spent:
+                unmarked[link] = output['asset_id']
+    spenders = {}
+    for transfers in executor.map(get_transfers, set(unmarked.values())):
+        for tx in transfers:
+            if any((input_['fulfills']['transaction_id'],
+                    input_['fulfills']['output_index']) in unmarked
+                   for input_ in tx['inputs'] if input_.get('fulfills')):
+                spenders[tx['id']] = tx
+    return list(spenders.values())
+
+
+def populate_tx_cache_from_dump(*, xkey, location, dump,
+                                gap_limit=discovery.GAP_LIMIT,
+                                account_gap_limit=discovery.ACCOUNT_GAP_LIMIT):
+    """Store the wallet's transactions found in the ndjson ledger ``dump``
+    file, gzip compressed if its name ends with ``.gz``, in the cache.  The
+    dump is streamed and matched against the wallet's derived addresses.
+    Returns the scan checkpoint, updated as by :func:`populate_tx_cache`.
+    """
+    checkpoint_location = os.path.join(os.path.dirname(location),
+                                       discovery.DEFAULT_CHECKPOINT_FILENAME)
+    checkpoint = discovery.load_checkpoint(checkpoint_location, xkey)
+
+    def open_dump():
+        if dump.endswith('.gz'):
+            import gzip
+            return gzip.open(dump, 'rt')
+        return open(dump)
+
+    with txcache.open_cache(location) as cache:
+        discovery.scan_ledger_dump(xkey, open_dump, cache.add_many,
+                                   checkpoint=checkpoint,
+                                   gap_limit=gap_limit,
+                                   account_gap_limit=account_gap_limit)
+    discovery.save_checkpoint(checkpoint_location, xkey, checkpoint)
+    return checkpoint
+
+
+def confirm_rewrite(
         refered_as,
         *,
         doublecheck=True,
         doublecheck_msg='Are you sure?',
         cancel_msg='Operation aborted!'
 ):
-    if not os.path.isfile(file_):
-        return True
     if click.confirm('{} exists! Rewrite?'.format(refered_as)):
         if doublecheck:
             if click.confirm(doublecheck_msg):
@@ -0,0 +1,173 @@
+"""This module provides a local key agent.  The agent holds a decrypted master
+key in memory behind a unix domain socket so that the keystore KDF runs once
+per session rather than once per command.
+
+Protocol is one JSON request line and one JSON response line per connection.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import time
+
+from base58 import b58encode
+
+import bigchaindb_wallet.keystore as ks
+import bigchaindb_wallet.signing as signing
+
+DEFAULT_AGENT_SOCKET_FILENAME = '.bdbw_agent.sock'
+DEFAULT_AGENT_TTL = 900
+# Reply code telling the client to fall back to the keystore
+UNAVAILABLE = 'unavailable'
+
+
+def get_agent_socket_path():
+    return os.environ.get(
+        'BDBW_AGENT_SOCK',
+        '{}/{}'.format(ks.get_home_path_and_warn(),
+                       DEFAULT_AGENT_SOCKET_FILENAME)
+    )
+
+
+class _AgentHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            message = json.loads(self.rfile.readline().decode())
+            response = self.server.dispatch(message)
+        except ks.WalletError as error:
+            response = {'error': str(error)}
+        except Exception as error:
+            response = {'error': 'Agent error: {}'.format(error)}
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class KeyAgentServer(socketserver.UnixStreamServer):
+    """Serves key operations for one unlocked wallet until ``ttl`` seconds
+    pass or ``max_uses`` key operations are served.
+    """
+
+    def __init__(self, xkey, wallet, socket_path, *, ttl=DEFAULT_AGENT_TTL,
+                 max_uses=None):
+        self.xkey = xkey
+        self.wallet = wallet
+        self.socket_path = socket_path
+        self.deadline = time.monotonic() + ttl if ttl else None
+        self.uses_left = max_uses
+        self.stopped = False
+        if os.path.exists(socket_path):
+            if is_running(socket_path):
+                raise ks.WalletError(
+                    'Agent is already running on {}'.format(socket_path))
+            os.unlink(socket_path)
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, _AgentHandler)
+        finally:
+            os.umask(old_umask)
+
+    @property
+    def expired(self):
+        return (self.stopped
+                or self.uses_left is not None and self.uses_left <= 0
+                or self.deadline is not None
+                and time.monotonic() >= self.deadline)
+
+    def _derive(self, message):
+        if message.get('wallet') != self.wallet:
+            return None
+        if self.uses_left is not None:
+            self.uses_left -= 1
+        return [
+            ks.DERIVATION_CACHE.derive(
+                self.xkey, ks.bdbw_tree_index(int(account), int(index)))
+            for account, index in message['paths']
+        ]
+
+    def dispatch(self, message):
+        op = message.get('op')
+        if op == 'stop':
+            self.stopped = True
+            return {}
+        if op not in ('ping', 'pubkey', 'fulfill'):
+            raise ks.WalletError('Unknown agent operation {}'.format(op))
+        if self.expired:
+            return {'error': UNAVAILABLE}
+        if op == 'ping':
+            return {'wallet': self.wallet}
+        dxks = self._derive(message)
+        if dxks is None:
+            return {'error': UNAVAILABLE}
+        if op == 'pubkey':
+            return {'pubkey': b58encode(
+                ks.DERIVATION_CACHE.pubkey(dxks[0])[1:]).decode()}
+        return {'transaction': signing.fulfill(
+            message['transaction'],
+            [b58encode(dxk.privkey).decode() for dxk in dxks]
+        )}
+
+    def serve_until_expired(self):
+        try:
+            while not self.expired:
+                if self.deadline is not None:
+                    self.timeout = max(self.deadline - time.monotonic(), 0)
+                self.handle_request()
+        finally:
+            self.server_close()
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def call(message, socket_path=None, timeout=30):
+    """Send ``message`` to the running agent.  Returns ``None`` when no agent
+    is available for the request so callers can fall back to the keystore.
+    """
+    socket_path = socket_path or get_agent_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(message).encode() + b'\n')
+            with sock.makefile('rb') as f:
+                response = json.loads(f.readline().decode())
+    except (OSError, ValueError):
+        return None
+    error = response.get('error')
+    if error == UNAVAILABLE:
+        return None
+    elif error:
+        raise ks.WalletError(error)
+    return response
+
+
+def is_running(socket_path=None):
+    return call({'op': 'ping'}, socket_path, timeout=1) is not None
+
+
+def serves(wallet, socket_path=None):
+    """Whether a running agent holds ``wallet``, without using up a key
+    operation.
+    """
+    response = call({'op': 'ping'}, socket_path, timeout=1)
+    return response is not None and response['wallet'] == wallet
+
+
+def get_pubkey(wallet, account, index, socket_path=None):
+    response = call({'op': 'pubkey', 'wallet': wallet,
+                     'paths': [[account, index]]}, socket_path)
+    return response and response['pubkey']
+
+
+def fulfill(transaction, wallet, paths, socket_path=None):
+    """Sign ``transaction`` with the keys of ``paths``, a list of
+    ``(account, index)`` pairs.
+    """
+    response = call({'op': 'fulfill', 'wallet': wallet, 'paths': paths,
+                     'transaction': transaction}, socket_path)
+    return response and response['transaction']
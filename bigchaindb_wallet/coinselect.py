@@ -0,0 +1,63 @@
+"""This module selects unspent outputs to fund ``TRANSFER`` transactions.
+Outputs are looked up in the amount index of the transaction cache, so inputs
+and change are worked out locally, without node requests, and only the
+outputs considered are read.
+"""
+
+import bigchaindb_wallet.keystore as ks
+import bigchaindb_wallet.transactions as transactions
+from bigchaindb_wallet import timings
+
+
+def select_outputs(cache, asset_id, public_keys, amount):
+    """Pick unspent outputs of ``asset_id`` owned by ``public_keys`` worth at
+    least ``amount``.  The smallest output covering the amount is taken,
+    which is an exact match when there is one.  Otherwise the largest
+    outputs are taken until the smallest one left covers the remainder.
+    Returns ``(selected, change)``.
+    """
+    if amount < 1:
+        raise ks.WalletError('Amount should be positive')
+    public_keys = list(public_keys)
+    with timings.span('coinselect'):
+        covering = cache.smallest_unspent(asset_id, public_keys, amount)
+        if covering is not None:
+            return [covering], covering['amount'] - amount
+        selected, remaining = [], amount
+        for output in cache.unspent(asset_id, public_keys, descending=True):
+            # No output left covers the remainder, take the largest
+            selected.append(output)
+            remaining -= output['amount']
+            covering = cache.smallest_unspent(
+                asset_id, public_keys, remaining,
+                max_amount=output['amount'], exclude=selected)
+            if covering is not None:
+                selected.append(covering)
+                return selected, covering['amount'] - remaining
+    raise ks.WalletError('Insufficient funds: {} available, {} needed'
+                         .format(amount - remaining, amount))
+
+
+def fund_transfer(cache, asset_id, public_keys, recipients,
+                  change_public_key):
+    """Inputs and recipients of a transfer of ``asset_id`` paying
+    ``recipients``, ``(public key, amount)`` pairs, from unspent outputs of
+    ``public_keys`` in ``cache``.  Change is paid to ``change_public_key``.
+    Returns ``(inputs, recipients)`` as ``transactions.prepare`` takes them.
+    """
+    if not recipients:
+        raise ks.WalletError('TRANSFER needs at least one recipient')
+    selected, change = select_outputs(
+        cache, asset_id, public_keys,
+        sum(amount for _, amount in recipients))
+    inputs = [
+        transactions.ed25519_input(output['public_key'], {
+            'transaction_id': output['transaction_id'],
+            'output_index': output['output_index'],
+        })
+        for output in selected
+    ]
+    outputs = [([public_key], amount) for public_key, amount in recipients]
+    if change:
+        outputs.append(([change_public_key], change))
+    return inputs, outputs
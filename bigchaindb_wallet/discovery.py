@@ -0,0 +1,208 @@
+"""This module implements BIP44 style account and address discovery with
+resumable scan checkpoints.  It does not talk to the network itself, callers
+provide an output lookup function or a ledger dump.
+"""
+
+import json
+import os
+import re
+
+from base58 import b58encode
+
+import bigchaindb_wallet.keystore as ks
+from bigchaindb_wallet import timings
+from bigchaindb_wallet.keymanagement import ExtendedKey, privkey_to_pubkey
+
+GAP_LIMIT = 20
+ACCOUNT_GAP_LIMIT = 1
+DEFAULT_CHECKPOINT_FILENAME = '.bdbw_scan'
+# Addresses derived before a ledger dump is read, more are derived and the
+# dump read again when used ones come within the gap limits of the last
+DUMP_ACCOUNTS = 5
+DUMP_INDEXES = 1000
+# Matching transactions stored at once
+DUMP_BATCH_SIZE = 10000
+# Quoted base58 strings of public key length, dump lines quoting none of the
+# wallet's keys are skipped unparsed
+_QUOTED_PUBKEY_RE = re.compile(r'"([1-9A-HJ-NP-Za-km-z]{32,44})"')
+
+
+def master_fingerprint(xkey: ExtendedKey):
+    """Checkpoint key of a wallet, same as its keystore ``master_pubkey``."""
+    return privkey_to_pubkey(xkey.privkey).hex()
+
+
+def load_checkpoint(location, xkey: ExtendedKey):
+    """Returns ``{account: last used address index}`` of a wallet."""
+    try:
+        with open(location) as f:
+            wallets = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    accounts = wallets.get(master_fingerprint(xkey), {}).get('accounts', {})
+    return {int(account): index for account, index in accounts.items()}
+
+
+def save_checkpoint(location, xkey: ExtendedKey, checkpoint):
+    try:
+        with open(location) as f:
+            wallets = json.load(f)
+    except (OSError, ValueError):
+        wallets = {}
+    wallets.setdefault(master_fingerprint(xkey), {})['accounts'] = {
+        str(account): index for account, index in sorted(checkpoint.items())
+    }
+    _write_checkpoints(location, wallets)
+
+
+def load_height(location, fingerprint):
+    """Last block height watched for the wallet with the hex master public
+    key ``fingerprint``, ``None`` if it was never watched.
+    """
+    try:
+        with open(location) as f:
+            return json.load(f).get(fingerprint, {}).get('height')
+    except (OSError, ValueError):
+        return None
+
+
+def save_height(location, fingerprint, height):
+    try:
+        with open(location) as f:
+            wallets = json.load(f)
+    except (OSError, ValueError):
+        wallets = {}
+    wallets.setdefault(fingerprint, {})['height'] = height
+    _write_checkpoints(location, wallets)
+
+
+def _write_checkpoints(location, wallets):
+    tmp_location = '{}.tmp'.format(location)
+    with open(tmp_location, 'w') as f:
+        json.dump(wallets, f, sort_keys=True, indent=4)
+    os.replace(tmp_location, location)
+
+
+def scan_account(xkey: ExtendedKey, account, lookup, executor, *,
+                 last_used=-1, gap_limit=GAP_LIMIT):
+    """Probe addresses of ``account`` after ``last_used`` until ``gap_limit``
+    consecutive addresses have no outputs.  Each window of lookups runs
+    concurrently in ``executor``.  Yields ``(index, pubkey, outputs)`` of used
+    addresses in index order.
+    """
+    next_index = last_used + 1
+    while next_index - last_used - 1 < gap_limit:
+        window = range(next_index, last_used + 1 + gap_limit)
+        lookups = [
+            (index, pubkey, executor.submit(lookup, pubkey))
+            for index, (_, _, pubkey) in zip(
+                window, ks.bdbw_derive_many(xkey, [account], window))
+        ]
+        for index, pubkey, future in lookups:
+            outputs = future.result()
+            if outputs:
+                last_used = index
+                yield index, pubkey, outputs
+        next_index = window.stop
+
+
+def discover(xkey: ExtendedKey, lookup, executor, *, checkpoint=None,
+             gap_limit=GAP_LIMIT, account_gap_limit=ACCOUNT_GAP_LIMIT):
+    """Scan accounts until ``account_gap_limit`` consecutive accounts are
+    unused.  ``checkpoint`` maps accounts to their last used index, scanning
+    resumes from there and it is updated in place.
+
+    Yields ``(account, used_addresses)`` once each account is scanned, where
+    ``used_addresses`` is a list of :func:`scan_account` results.
+    """
+    checkpoint = {} if checkpoint is None else checkpoint
+    account, unused_accounts = 0, 0
+    while unused_accounts < account_gap_limit:
+        used_addresses = list(scan_account(
+            xkey, account, lookup, executor,
+            last_used=checkpoint.get(account, -1), gap_limit=gap_limit
+        ))
+        if used_addresses:
+            checkpoint[account] = used_addresses[-1][0]
+        if account in checkpoint:
+            unused_accounts = 0
+        else:
+            unused_accounts += 1
+        yield account, used_addresses
+        account += 1
+
+
+def tx_public_keys(tx):
+    """Public keys owning an input or an output of ``tx``."""
+    return ({owner for input_ in tx['inputs']
+             for owner in input_['owners_before']}
+            | {public_key for output in tx['outputs']
+               for public_key in output['public_keys']})
+
+
+def match_ledger_dump(lines, pubkeys):
+    """Transactions of the ndjson ``lines`` with an input or output owned by
+    one of the base58 ``pubkeys``, a set or dict.  Yields ``(tx, owners)``
+    with the matching public keys.
+    """
+    for line in lines:
+        timings.count('dump.lines')
+        if not any(candidate in pubkeys
+                   for candidate in _QUOTED_PUBKEY_RE.findall(line)):
+            continue
+        tx = json.loads(line)
+        owners = {owner for owner in tx_public_keys(tx) if owner in pubkeys}
+        if owners:
+            timings.count('dump.matches')
+            yield tx, owners
+
+
+def scan_ledger_dump(xkey: ExtendedKey, open_dump, store, *, checkpoint=None,
+                     gap_limit=GAP_LIMIT,
+                     account_gap_limit=ACCOUNT_GAP_LIMIT,
+                     accounts=DUMP_ACCOUNTS, indexes=DUMP_INDEXES,
+                     batch_size=DUMP_BATCH_SIZE):
+    """Find the wallet's transactions in a ledger dump and pass them to
+    ``store`` in lists of up to ``batch_size``.  ``open_dump`` returns a
+    context manager over ndjson lines, one transaction each.
+
+    Transactions are matched against the first ``accounts`` x ``indexes``
+    addresses.  The dump is read again with more addresses while a used one
+    is within ``gap_limit`` of the last derived index or a used account
+    within ``account_gap_limit`` of the last derived account.  Last used
+    indexes are merged into ``checkpoint``, which is returned.
+    """
+    checkpoint = {} if checkpoint is None else checkpoint
+    addresses = {}  # base58 pubkey -> (account, index)
+    derived_accounts = derived_indexes = 0
+    while True:
+        for account in range(accounts):
+            start = derived_indexes if account < derived_accounts else 0
+            window = range(start, indexes)
+            for index, (_, _, pubkey) in zip(
+                    window, ks.bdbw_derive_many(xkey, [account], window)):
+                addresses[b58encode(pubkey[1:]).decode()] = account, index
+        derived_accounts, derived_indexes = accounts, indexes
+
+        used = {}
+        batch = []
+        with open_dump() as lines:
+            for tx, owners in match_ledger_dump(lines, addresses):
+                for owner in owners:
+                    account, index = addresses[owner]
+                    used[account] = max(used.get(account, -1), index)
+                batch.append(tx)
+                if len(batch) >= batch_size:
+                    store(batch)
+                    batch = []
+        if batch:
+            store(batch)
+        for account, index in used.items():
+            checkpoint[account] = max(checkpoint.get(account, -1), index)
+
+        needed_accounts = max(used, default=-1) + account_gap_limit + 1
+        needed_indexes = max(used.values(), default=-1) + gap_limit + 1
+        if needed_accounts <= accounts and needed_indexes <= indexes:
+            return checkpoint
+        accounts = max(accounts, needed_accounts)
+        indexes = max(indexes * 2, needed_indexes)
@@ -6,18 +6,24 @@ in bigchaindb-wallet, it does not interface with the wallet keystore.
 import hashlib
 import hmac
 import struct
-from collections import namedtuple
+import threading
+from collections import OrderedDict, namedtuple
 
-from mnemonic import Mnemonic
-from mnemonic.mnemonic import PBKDF2_ROUNDS
 from nacl import secret, utils
-from nacl.pwhash import SCRYPT_SALTBYTES as SALTBYTES
-from nacl.pwhash import kdf_scryptsalsa208sha256 as kdf
+from nacl.pwhash import argon2id, scrypt
 from nacl.signing import SigningKey
 
+from bigchaindb_wallet import timings
+
 HARDENED_INDEX = 0x80000000
 
 ExtendedKey = namedtuple('ExtendedKey', ('privkey', 'chaincode'))
+CacheInfo = namedtuple('CacheInfo', ('hits', 'misses', 'maxsize', 'currsize'))
+KdfParams = namedtuple('KdfParams', ('algorithm', 'opslimit', 'memlimit'))
+
+_KDFS = {'scrypt': scrypt, 'argon2id': argon2id}
+KDF_ALGORITHMS = tuple(_KDFS)
+KDF_LEVELS = ('interactive', 'moderate', 'sensitive')
 
 
 SUPPORTED_LANGUAGES = [
@@ -36,6 +42,7 @@ def make_mnemonic_phrase(strength=256, language='english', with_entropy=None):
     if language not in SUPPORTED_LANGUAGES:
         raise ValueError('{} not found in supported languages: {}'
                          .format(language, SUPPORTED_LANGUAGES))
+    from mnemonic import Mnemonic
     mnemonic_obj = Mnemonic(language)
     if with_entropy:
         # TODO check that strength corresponds to entropy length
@@ -46,6 +53,7 @@ def make_mnemonic_phrase(strength=256, language='english', with_entropy=None):
 
 
 def mnemonic_to_seed(mnemonic_phrase: str) -> bytes:
+    from mnemonic import Mnemonic
     return Mnemonic.to_seed(mnemonic_phrase)
 
 
@@ -67,6 +75,29 @@ def derive_key(key: ExtendedKey, tree_index=()):
     return ExtendedKey(privkey, chaincode)
 
 
+def derive_many(key: ExtendedKey, tree_indexes):
+    """Lazily derive keys for an iterable of tree indexes.
+
+    Intermediate nodes shared with the previously derived tree index are
+    reused, so for sorted input each node of the tree is computed once.
+    Yields ``(tree_index, ExtendedKey, pubkey)`` tuples.
+    """
+    nodes = [key]  # nodes[n] is the key at depth n of the current branch
+    branch = ()
+    for tree_index in tree_indexes:
+        tree_index = tuple(tree_index)
+        common = 0
+        for left, right in zip(branch, tree_index):
+            if left != right:
+                break
+            common += 1
+        del nodes[common + 1:]
+        for idx in tree_index[common:]:
+            nodes.append(derive_key(nodes[-1], (idx,)))
+        branch = tree_index
+        yield tree_index, nodes[-1], privkey_to_pubkey(nodes[-1].privkey)
+
+
 def path_to_indexes(path):
     assert path.startswith('m')
     def index_to_int(i):
@@ -86,15 +117,135 @@ def privkey_to_pubkey(privkey):
             + SigningKey(privkey).verify_key.encode())
 
 
-def symkey_encrypt(msg, password):
-    salt = utils.random(SALTBYTES)
-    encrypted = secret.SecretBox(
-        kdf(secret.SecretBox.KEY_SIZE, password, salt)
-    ).encrypt(msg)
+def key_fingerprint(key: ExtendedKey) -> bytes:
+    return hashlib.blake2b(key.privkey + key.chaincode,
+                           digest_size=16).digest()
+
+
+class DerivationCache:
+    """Bounded LRU cache of derived extended keys and their signing keys.
+
+    Entries are keyed by ``(key_fingerprint(master), tree_index)``.  A lookup
+    that misses resumes derivation from the longest cached prefix of the
+    tree index and caches every node it computes on the way.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, entry_key):
+        entry = self._entries.get(entry_key)
+        if entry is not None:
+            self._entries.move_to_end(entry_key)
+        return entry
+
+    def _put(self, entry_key, xkey):
+        entry = self._entries[entry_key] = [xkey, None]
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def _entry(self, key, tree_index):
+        fingerprint = key_fingerprint(key)
+        tree_index = tuple(tree_index)
+        with self._lock:
+            entry = self._get((fingerprint, tree_index))
+            if entry is not None:
+                self.hits += 1
+                timings.count('derive.cache_hits')
+                return entry
+            self.misses += 1
+            timings.count('derive.cache_misses')
+            node, start = key, 0
+            for depth in range(len(tree_index) - 1, 0, -1):
+                prefix_entry = self._get((fingerprint, tree_index[:depth]))
+                if prefix_entry is not None:
+                    node, start = prefix_entry[0], depth
+                    break
+            if start == len(tree_index):  # the master key itself
+                return self._put((fingerprint, tree_index), node)
+            with timings.span('derive'):
+                for depth in range(start + 1, len(tree_index) + 1):
+                    node = derive_key(node, tree_index[depth - 1:depth])
+                    entry = self._put((fingerprint, tree_index[:depth]),
+                                      node)
+            return entry
+
+    def derive(self, key: ExtendedKey, tree_index=()) -> ExtendedKey:
+        return self._entry(key, tree_index)[0]
+
+    def signing_key(self, key: ExtendedKey, tree_index=()) -> SigningKey:
+        entry = self._entry(key, tree_index)
+        if entry[1] is None:
+            entry[1] = SigningKey(entry[0].privkey)
+        return entry[1]
+
+    def verify_key(self, key: ExtendedKey, tree_index=()):
+        return self.signing_key(key, tree_index).verify_key
+
+    def pubkey(self, key: ExtendedKey, tree_index=()) -> bytes:
+        """Same as ``privkey_to_pubkey`` of the derived private key."""
+        return struct.pack('x') + self.verify_key(key, tree_index).encode()
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize,
+                         len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+def kdf_params(algorithm='scrypt', level='sensitive', *, opslimit=None,
+               memlimit=None) -> KdfParams:
+    """Password hashing parameters of ``algorithm`` at a libsodium cost
+    ``level``.  ``opslimit`` and ``memlimit`` override the level's limits.
+    """
+    if algorithm not in _KDFS:
+        raise ValueError('{} not found in supported KDF algorithms: {}'
+                         .format(algorithm, KDF_ALGORITHMS))
+    if level not in KDF_LEVELS:
+        raise ValueError('{} not found in KDF levels: {}'
+                         .format(level, KDF_LEVELS))
+    module = _KDFS[algorithm]
+    params = KdfParams(
+        algorithm,
+        opslimit or getattr(module, 'OPSLIMIT_' + level.upper()),
+        memlimit or getattr(module, 'MEMLIMIT_' + level.upper()),
+    )
+    if not (module.OPSLIMIT_MIN <= params.opslimit <= module.OPSLIMIT_MAX
+            and module.MEMLIMIT_MIN <= params.memlimit
+            <= module.MEMLIMIT_MAX):
+        raise ValueError('{} limits must be within opslimit {}-{} and '
+                         'memlimit {}-{}'.format(
+                             algorithm, module.OPSLIMIT_MIN,
+                             module.OPSLIMIT_MAX, module.MEMLIMIT_MIN,
+                             module.MEMLIMIT_MAX))
+    return params
+
+
+# PyNaCl defaults used by keystores that do not record their parameters
+DEFAULT_KDF_PARAMS = kdf_params()
+
+
+def _symkey(password, salt, params):
+    with timings.span('kdf'):
+        return _KDFS[params.algorithm].kdf(
+            secret.SecretBox.KEY_SIZE, password, salt,
+            opslimit=params.opslimit, memlimit=params.memlimit)
+
+
+def symkey_encrypt(msg, password, params: KdfParams = DEFAULT_KDF_PARAMS):
+    salt = utils.random(_KDFS[params.algorithm].SALTBYTES)
+    encrypted = secret.SecretBox(_symkey(password, salt, params)).encrypt(msg)
     return encrypted, salt
 
 
-def symkey_decrypt(key, password, salt):
-    return secret.SecretBox(
-        kdf(secret.SecretBox.KEY_SIZE, password, salt)
-    ).decrypt(key)
+def symkey_decrypt(key, password, salt,
+                   params: KdfParams = DEFAULT_KDF_PARAMS):
+    return secret.SecretBox(_symkey(password, salt, params)).decrypt(key)
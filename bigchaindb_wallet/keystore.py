@@ -1,14 +1,17 @@
 import json
 import os
+import sqlite3
 
 from base58 import b58decode, b58encode
-from bigchaindb_driver.crypto import generate_keypair
-from mnemonic import Mnemonic
-from mnemonic.mnemonic import PBKDF2_ROUNDS
+from nacl.exceptions import CryptoError
 
-from bigchaindb_wallet.keymanagement import (ExtendedKey, derive_from_path,
-                                             privkey_to_pubkey, symkey_decrypt,
-                                             symkey_encrypt)
+from bigchaindb_wallet import timings
+from bigchaindb_wallet.keymanagement import (DEFAULT_KDF_PARAMS,
+                                             HARDENED_INDEX, DerivationCache,
+                                             ExtendedKey, KdfParams,
+                                             derive_key, derive_many,
+                                             kdf_params, privkey_to_pubkey,
+                                             symkey_decrypt, symkey_encrypt)
 
 BIGCHAINDB_COINTYPE = 822
 BDBW_TREE_INDEX_ROOT = (44, BIGCHAINDB_COINTYPE)
@@ -16,18 +19,57 @@ BDBW_PATH_TEMPLATE = (
     'm/44/{cointype}\'/{{account}}\'/0/{{address_index}}\''
     .format(cointype=BIGCHAINDB_COINTYPE)
 )
+DEFAULT_KEYSTORE_DB_FILENAME = '.bdbw_keystore.sqlite'
+# json keystore of older versions, migrated on first open, and the import
+# and export format
 DEFAULT_KEYSTORE_FILENAME = ".bigchaindb_wallet"
+# Seconds to wait for other processes writing the keystore
+LOCK_TIMEOUT = 30
+# Encrypted master key format by KDF algorithm
+KEYSTORE_FORMATS = {
+    'scrypt': 'cryptsalsa208sha256base58',
+    'argon2id': 'argon2id13base58',
+}
+# Shared by library users that derive from the same masters repeatedly
+DERIVATION_CACHE = DerivationCache(
+    int(os.environ.get('BDBW_DERIVATION_CACHE_SIZE', 1024))
+)
+
+
+_KEYSTORE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS wallets (
+    name TEXT PRIMARY KEY,
+    body TEXT NOT NULL
+);
+'''
 
 
 class WalletError(Exception):
     """Exceptions safe to show in output."""
 
 
+def bdbw_tree_index(account, index=0):
+    """Tree index equivalent of ``BDBW_PATH_TEMPLATE``."""
+    return (44, BIGCHAINDB_COINTYPE + HARDENED_INDEX, account + HARDENED_INDEX,
+            0, index + HARDENED_INDEX)
+
+
 def bdbw_derive_account(key: ExtendedKey, account, index=0):
-    return derive_from_path(
-        key,
-        BDBW_PATH_TEMPLATE.format(account=account, address_index=index)
-    )
+    return derive_key(key, bdbw_tree_index(account, index))
+
+
+def bdbw_derive_many(key: ExtendedKey, accounts, indexes):
+    """Lazily derive every ``(account, index)`` pair of ``accounts`` x
+    ``indexes``.  Yields ``(path, ExtendedKey, pubkey)`` tuples.
+    """
+    indexes = tuple(indexes)
+    tree_indexes = (bdbw_tree_index(account, index)
+                    for account in accounts for index in indexes)
+    for tree_index, xkey, pubkey in derive_many(key, tree_indexes):
+        yield (BDBW_PATH_TEMPLATE.format(
+            account=tree_index[2] - HARDENED_INDEX,
+            address_index=tree_index[4] - HARDENED_INDEX
+        ), xkey, pubkey)
 
 
 def wallet_dumps(wallet_dict):
@@ -35,9 +77,11 @@ def wallet_dumps(wallet_dict):
 
 
 def wallet_dump(wallet_dict, file_location):
-    # XXX check whether wallet already exist XXX
-    with open(file_location, 'w') as f:
+    """Write wallets to a json keystore file, replacing it atomically."""
+    tmp_location = '{}.tmp'.format(file_location)
+    with open(tmp_location, 'w') as f:
         f.write(wallet_dumps(wallet_dict))
+    os.replace(tmp_location, file_location)
 
 
 def _get_wallet_account(wallet_dict, wallet_name):
@@ -47,6 +91,26 @@ def _get_wallet_account(wallet_dict, wallet_name):
         raise WalletError('Account {} is not found'.format(wallet_name))
 
 
+def get_kdf_params(master_privkey) -> KdfParams:
+    """KDF parameters recorded with an encrypted master key.  Keys without
+    recorded parameters use PyNaCl's scrypt defaults.
+    """
+    algorithms = {value: key for key, value in KEYSTORE_FORMATS.items()}
+    try:
+        algorithm = algorithms[master_privkey['format']]
+    except KeyError:
+        raise WalletError('Unsupported keystore format {}'
+                          .format(master_privkey.get('format')))
+    recorded = master_privkey.get('kdf')
+    if recorded is None:
+        return kdf_params(algorithm)
+    try:
+        return kdf_params(algorithm, opslimit=int(recorded['opslimit']),
+                          memlimit=int(recorded['memlimit']))
+    except (KeyError, TypeError, ValueError):
+        raise WalletError('Keystore KDF parameters contain errors')
+
+
 def get_master_xprivkey(wallet_dict, wallet_name: str, password: str) -> str:
     wallet = _get_wallet_account(wallet_dict, wallet_name)
     try:
@@ -55,19 +119,24 @@ def get_master_xprivkey(wallet_dict, wallet_name: str, password: str) -> str:
         privkey = symkey_decrypt(
             bytes.fromhex(master_privkey['key']),
             password.encode(),
-            bytes.fromhex(master_privkey['salt'])
+            bytes.fromhex(master_privkey['salt']),
+            get_kdf_params(master_privkey)
         )
         return ExtendedKey(privkey, chaincode)
     except KeyError:
         raise WalletError('Account {} contains errors'.format(wallet_name))
+    except CryptoError:
+        raise WalletError('Wrong password for wallet {}'.format(wallet_name))
 
 
-def make_wallet_dict(master_xkey: ExtendedKey, password, name='default'):
+def make_wallet_dict(master_xkey: ExtendedKey, password, name='default',
+                     kdf: KdfParams = DEFAULT_KDF_PARAMS):
     def _value_encode(val):
         return val.hex()
     master_privkey_crypt, salt = symkey_encrypt(
         master_xkey.privkey,
         password.encode(),
+        kdf
     )
     return {
         name: {
@@ -76,13 +145,26 @@ def make_wallet_dict(master_xkey: ExtendedKey, password, name='default'):
                 privkey_to_pubkey(master_xkey.privkey)
             ),
             "master_privkey": {
-                'format': 'cryptsalsa208sha256base58',
+                'format': KEYSTORE_FORMATS[kdf.algorithm],
+                'kdf': {'opslimit': kdf.opslimit, 'memlimit': kdf.memlimit},
                 'salt': _value_encode(salt),
                 'key': _value_encode(master_privkey_crypt)
             }
         }
     }
 
+
+def rekey_wallet(wallet_dict, wallet_name, password, new_password=None,
+                 kdf: KdfParams = DEFAULT_KDF_PARAMS):
+    """Copy of ``wallet_dict`` with the master key of ``wallet_name``
+    encrypted again with ``kdf`` and ``new_password``, the current password
+    by default.
+    """
+    master_xkey = get_master_xprivkey(wallet_dict, wallet_name, password)
+    rekeyed = make_wallet_dict(master_xkey, new_password or password,
+                               name=wallet_name, kdf=kdf)
+    return dict(wallet_dict, **rekeyed)
+
 
 def get_home_path_and_warn():
     home_path = os.environ.get('HOME')
@@ -91,24 +173,162 @@ def get_home_path_and_warn():
     return home_path
 
 
-def get_wallet_content():
+class Keystore:
+    """Encrypted wallets by name in an SQLite database.  Wallets are read
+    and written one record at a time, every write is a transaction and
+    concurrent processes wait up to ``timeout`` seconds for the write lock.
+    """
+
+    def __init__(self, location, timeout=LOCK_TIMEOUT):
+        self.location = str(location)
+        self._conn = sqlite3.connect(self.location, timeout=timeout)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        # Encrypted keys are the only copy, sync every commit
+        self._conn.execute('PRAGMA synchronous=FULL')
+        self._conn.executescript(_KEYSTORE_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def get(self, name):
+        """Wallet ``name`` or ``None`` if there is none."""
+        row = self._conn.execute(
+            'SELECT body FROM wallets WHERE name = ?', (name,)
+        ).fetchone()
+        return row and json.loads(row[0])
+
+    def names(self):
+        return [row[0] for row in self._conn.execute(
+            'SELECT name FROM wallets ORDER BY name')]
+
+    def put(self, wallet_dict, *, replace=True):
+        """Store the wallets of ``wallet_dict`` in a single transaction.
+        Wallets of the same name are replaced, or kept with
+        ``replace=False``.  Returns the number of wallets written.
+        """
+        with self._conn:
+            return self._conn.executemany(
+                'INSERT OR {} INTO wallets VALUES (?, ?)'.format(
+                    'REPLACE' if replace else 'IGNORE'),
+                ((name, json.dumps(wallet, sort_keys=True))
+                 for name, wallet in wallet_dict.items())
+            ).rowcount
+
+    def export(self, names=None):
+        """Wallets by name, all of them by default, in the json keystore
+        format.
+        """
+        if names is None:
+            return {name: json.loads(body) for name, body in
+                    self._conn.execute('SELECT name, body FROM wallets')}
+        wallets = {}
+        for name in names:
+            wallet = self.get(name)
+            if wallet is None:
+                raise WalletError('Account {} is not found'.format(name))
+            wallets[name] = wallet
+        return wallets
+
+
+def get_keystore_location(location=None):
+    return '{}/{}'.format(location or get_home_path_and_warn(),
+                          DEFAULT_KEYSTORE_DB_FILENAME)
+
+
+def load_keystore_file(file_location):
+    """Wallets of a json keystore file."""
     try:
-        # TODO convert to Path object
-        location = ('{}/{}'.format(get_home_path_and_warn(),
-                                   DEFAULT_KEYSTORE_FILENAME))
-        with open(location) as f:
-            return json.loads(f.read())
-    except OSError:
+        with open(file_location) as f:
+            wallet_dict = json.load(f)
+    except ValueError:
+        raise WalletError('Keystore file {} contains errors'
+                          .format(file_location))
+    if not (isinstance(wallet_dict, dict)
+            and all(isinstance(wallet, dict)
+                    for wallet in wallet_dict.values())):
+        raise WalletError('Keystore file {} contains errors'
+                          .format(file_location))
+    return wallet_dict
+
+
+def migrate_legacy_keystore(keystore, legacy_location):
+    """Import the json keystore of older versions, keeping wallets already
+    stored, and rename it so it is imported once.
+    """
+    keystore.put(load_keystore_file(legacy_location), replace=False)
+    os.replace(legacy_location, '{}.migrated'.format(legacy_location))
+
+
+def keystore_exists(location=None):
+    location = location or get_home_path_and_warn()
+    return (os.path.isfile(get_keystore_location(location))
+            or os.path.isfile('{}/{}'.format(location,
+                                             DEFAULT_KEYSTORE_FILENAME)))
+
+
+def open_keystore(location=None):
+    """Open the keystore of directory ``location``, migrating a json
+    keystore found there.
+    """
+    location = location or get_home_path_and_warn()
+    keystore = Keystore(get_keystore_location(location))
+    legacy_location = '{}/{}'.format(location, DEFAULT_KEYSTORE_FILENAME)
+    if os.path.isfile(legacy_location):
+        try:
+            migrate_legacy_keystore(keystore, legacy_location)
+        except Exception:
+            keystore.close()
+            raise
+    return keystore
+
+
+def store_wallets(wallet_dict, location=None, *, replace=True):
+    """Add or replace the wallets of ``wallet_dict``, keeping the others."""
+    with open_keystore(location) as keystore:
+        return keystore.put(wallet_dict, replace=replace)
+
+
+def get_wallet_content(name=None):
+    """Wallets of the keystore by name.  With ``name`` only that wallet is
+    read, if it exists.
+    """
+    if not keystore_exists():
         raise WalletError('Wallet not found')
+    with timings.span('keystore.read'), open_keystore() as keystore:
+        if name is None:
+            return keystore.export()
+        wallet = keystore.get(name)
+        return {} if wallet is None else {name: wallet}
 
 
 def get_private_key_drv(name, address, index, password):
-    wallet_dict = get_wallet_content()
+    wallet_dict = get_wallet_content(name)
     privkey = get_master_xprivkey(wallet_dict, name, password)
-    return bdbw_derive_account(privkey, address, index)
+    return DERIVATION_CACHE.derive(privkey, bdbw_tree_index(address, index))
 
 
-def get_public_key_drv(name, address, index, password):
-    wallet_cont = get_wallet_content()
-    privkey = get_master_xprivkey(wallet_cont, name, password)
-    return bdbw_derive_account(privkey, address, index)
+def get_public_key_drv(name, address, index, password=None):
+    """Base58 public key of an address.  It is read from the watch-only
+    public key index, the wallet is unlocked only for addresses that are not
+    indexed yet and the index is extended with them.
+    """
+    # Imported here as pubindex builds on this module
+    from bigchaindb_wallet.pubindex import open_index
+    with open_index() as pubkey_index:
+        if pubkey_index.is_current(name):
+            pubkey = pubkey_index.get(name, address, index)
+            if pubkey is not None:
+                return pubkey
+        if password is None:
+            raise WalletError('Address is not indexed yet, '
+                              'password is required')
+        privkey = get_master_xprivkey(get_wallet_content(name), name,
+                                      password)
+        pubkey_index.extend(name, privkey, [address], [index])
+        return pubkey_index.get(name, address, index)
@@ -0,0 +1,238 @@
+"""This module provides helpers for talking to BigchainDB nodes concurrently:
+node pools with failover, retries with backoff and pipelined transaction
+submission.  The driver and its HTTP stack are imported on the first
+request.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import bigchaindb_wallet.keystore as ks
+from bigchaindb_wallet import timings
+
+SEND_MODES = ('async', 'sync', 'commit')
+DEFAULT_TIMEOUT = 20
+DEFAULT_WINDOW = 16
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_COOLDOWN = 30
+DEFAULT_CONFIG_FILENAME = '.bdbw_config'
+SLOW_FACTOR = 4
+EWMA_WEIGHT = 0.2
+
+
+def get_nodes(urls=()):
+    """Node urls from ``urls``, else from the comma or space separated
+    ``BDBW_NODES`` environment variable, else from the ``nodes`` list of the
+    ``~/.bdbw_config`` json file.
+    """
+    if urls:
+        return list(urls)
+    env_nodes = os.environ.get('BDBW_NODES', '').replace(',', ' ').split()
+    if env_nodes:
+        return env_nodes
+    location = '{}/{}'.format(ks.get_home_path_and_warn(),
+                              DEFAULT_CONFIG_FILENAME)
+    try:
+        with open(location) as f:
+            return list(json.load(f).get('nodes', []))
+    except OSError:
+        return []
+    except ValueError:
+        raise ks.WalletError('Config file {} contains errors'
+                             .format(location))
+
+
+class Node:
+    """A node url with its request statistics.  Every thread gets its own
+    driver, and thus its own keep-alive connection, to the node.
+    """
+
+    def __init__(self, url, timeout=DEFAULT_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+        self.in_flight = 0
+        self.latency = None  # Moving average in seconds
+        self.ejected_until = 0
+        self._local = threading.local()
+
+    @property
+    def driver(self):
+        if not hasattr(self._local, 'bdb'):
+            from bigchaindb_driver import BigchainDB
+            self._local.bdb = BigchainDB(self.url, timeout=self.timeout)
+        return self._local.bdb
+
+    def stats(self, now):
+        return {
+            'url': self.url,
+            'requests': self.requests,
+            'failures': self.failures,
+            'ejections': self.ejections,
+            'latency_ms': (None if self.latency is None
+                           else round(self.latency * 1000, 3)),
+            'ejected': self.ejected_until > now,
+        }
+
+
+class NodePool:
+    """Spreads requests over healthy nodes, preferring the least loaded and
+    fastest ones.  A node is ejected for ``cooldown`` seconds after a timeout
+    or server error, or when its average latency exceeds ``SLOW_FACTOR``
+    times the fastest healthy node.  If every node is ejected the one that
+    comes back first is used.
+    """
+
+    def __init__(self, urls, *, timeout=DEFAULT_TIMEOUT,
+                 cooldown=DEFAULT_COOLDOWN, clock=time.monotonic):
+        if not urls:
+            raise ks.WalletError('No BigchainDB node url given')
+        self.nodes = [Node(url, timeout) for url in urls]
+        self.cooldown = cooldown
+        self.clock = clock
+        self._lock = threading.Lock()
+
+    def _pick(self):
+        now = self.clock()
+        with self._lock:
+            healthy = ([node for node in self.nodes
+                        if node.ejected_until <= now]
+                       or [min(self.nodes, key=lambda n: n.ejected_until)])
+            node = min(healthy, key=lambda n: (
+                (n.in_flight + 1) * (n.latency or 0), n.requests))
+            node.in_flight += 1
+        return node
+
+    def _eject(self, node, now):
+        node.ejected_until = now + self.cooldown
+        node.ejections += 1
+
+    def _record(self, node, elapsed, failed):
+        now = self.clock()
+        with self._lock:
+            node.in_flight -= 1
+            node.requests += 1
+            if failed:
+                node.failures += 1
+                self._eject(node, now)
+                return
+            node.latency = (elapsed if node.latency is None else
+                            (1 - EWMA_WEIGHT) * node.latency
+                            + EWMA_WEIGHT * elapsed)
+            others = [n.latency for n in self.nodes
+                      if n is not node and n.latency is not None
+                      and n.ejected_until <= now]
+            if others and node.latency > SLOW_FACTOR * min(others):
+                self._eject(node, now)
+
+    def call(self, fn):
+        """Call ``fn`` with the driver of the picked node."""
+        node = self._pick()
+        start = self.clock()
+        timings.count('http.requests')
+        try:
+            with timings.span('http'):
+                result = fn(node.driver)
+        except Exception as error:
+            timings.count('http.failures')
+            self._record(node, self.clock() - start, is_retryable(error))
+            raise
+        self._record(node, self.clock() - start, False)
+        return result
+
+    def stats(self):
+        now = self.clock()
+        with self._lock:
+            return [node.stats(now) for node in self.nodes]
+
+
+@functools.lru_cache(maxsize=None)
+def _retryable_errors():
+    import requests
+    from bigchaindb_driver.exceptions import (GatewayTimeout,
+                                              ServiceUnavailable)
+    from bigchaindb_driver.exceptions import TimeoutError as DriverTimeoutError
+
+    # The driver raises builtin TimeoutError too when a node is backing off
+    return (TimeoutError, DriverTimeoutError, ServiceUnavailable,
+            GatewayTimeout, requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout)
+
+
+def is_retryable(error):
+    from bigchaindb_driver.exceptions import TransportError
+
+    if isinstance(error, _retryable_errors()):
+        return True
+    return (isinstance(error, TransportError)
+            and isinstance(error.status_code, int)
+            and error.status_code >= 500)
+
+
+def call_with_retries(fn, *, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    """Call ``fn`` retrying retryable errors up to ``retries`` times with
+    exponential backoff.  Returns ``(result, attempts)``.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return fn(), attempt
+        except Exception as error:
+            if attempt > retries or not is_retryable(error):
+                error.attempts = attempt
+                raise
+        time.sleep(backoff * 2 ** (attempt - 1))
+
+
+def send(bdb, tx, mode='commit'):
+    if mode not in SEND_MODES:
+        raise ValueError('mode should be one of {}'.format(SEND_MODES))
+    return getattr(bdb.transactions, 'send_{}'.format(mode))(tx)
+
+
+def submit_many(txs, pool, *, mode='commit', window=DEFAULT_WINDOW,
+                retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    """Submit ``txs`` through ``pool`` keeping at most ``window`` requests in
+    flight.  Yields ``(tx, record)`` pairs in input order, where ``record`` is
+    a dict with ``id``, ``status`` (``ok`` or ``error``), ``attempts`` and, on
+    failure, ``error`` keys.  Errors reading ``txs`` are raised once the
+    requests in flight are reported.
+    """
+    def submit(tx):
+        try:
+            _, attempts = call_with_retries(
+                lambda: pool.call(lambda bdb: send(bdb, tx, mode)),
+                retries=retries, backoff=backoff
+            )
+            return {'id': tx.get('id'), 'status': 'ok', 'attempts': attempts}
+        except Exception as error:
+            return {'id': tx.get('id'), 'status': 'error',
+                    'attempts': getattr(error, 'attempts', 1),
+                    'error': '{}: {}'.format(type(error).__name__, error)}
+
+    with ThreadPoolExecutor(max_workers=window) as executor:
+        pending = deque()
+        try:
+            for tx in txs:
+                pending.append((tx, executor.submit(submit, tx)))
+                if len(pending) >= window:
+                    tx, future = pending.popleft()
+                    yield tx, future.result()
+        except Exception:
+            # Requests in flight when reading ``txs`` failed are reported
+            while pending:
+                tx, future = pending.popleft()
+                yield tx, future.result()
+            raise
+        while pending:
+            tx, future = pending.popleft()
+            yield tx, future.result()
@@ -0,0 +1,143 @@
+"""This module provides the watch-only public key index.  Public keys of
+derived addresses are stored next to the keystore so that read-only
+operations can find them without the password and a KDF run.
+"""
+
+import sqlite3
+
+from base58 import b58encode
+
+import bigchaindb_wallet.keystore as ks
+from bigchaindb_wallet import timings
+from bigchaindb_wallet.keymanagement import ExtendedKey, privkey_to_pubkey
+
+DEFAULT_INDEX_FILENAME = '.bdbw_pubkeys.sqlite'
+# Addresses indexed when a wallet is created or imported
+DEFAULT_ACCOUNTS = 5
+DEFAULT_INDEXES = 20
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS wallets (
+    name TEXT PRIMARY KEY,
+    master_pubkey TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS addresses (
+    wallet TEXT NOT NULL,
+    account INTEGER NOT NULL,
+    address_index INTEGER NOT NULL,
+    pubkey TEXT NOT NULL,
+    PRIMARY KEY (wallet, account, address_index)
+);
+CREATE INDEX IF NOT EXISTS addresses_pubkey ON addresses (pubkey);
+'''
+
+
+def get_index_location(location=None):
+    return '{}/{}'.format(location or ks.get_home_path_and_warn(),
+                          DEFAULT_INDEX_FILENAME)
+
+
+class PubkeyIndex:
+    """Public keys of derived addresses per wallet, account and index."""
+
+    def __init__(self, location):
+        self.location = str(location)
+        self._conn = sqlite3.connect(self.location)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def _register(self, wallet, master_pubkey):
+        """Drop addresses indexed for another master key under this name."""
+        if self.master_pubkey(wallet) == master_pubkey:
+            return
+        self._conn.execute('DELETE FROM addresses WHERE wallet = ?',
+                           (wallet,))
+        self._conn.execute('INSERT OR REPLACE INTO wallets VALUES (?, ?)',
+                           (wallet, master_pubkey))
+
+    def extend(self, wallet, xkey: ExtendedKey, accounts, indexes):
+        """Derive and store every missing ``accounts`` x ``indexes``
+        address of ``wallet``.  Returns the number of new addresses.
+        """
+        indexes = tuple(indexes)
+        added = 0
+        with timings.span('pubindex.extend'), self._conn:
+            self._register(wallet, privkey_to_pubkey(xkey.privkey).hex())
+            for account in accounts:
+                known = {row[0] for row in self._conn.execute(
+                    'SELECT address_index FROM addresses '
+                    'WHERE wallet = ? AND account = ?', (wallet, account))}
+                missing = [i for i in indexes if i not in known]
+                rows = [
+                    (wallet, account, index, b58encode(pubkey[1:]).decode())
+                    for index, (_, _, pubkey) in zip(
+                        missing,
+                        ks.bdbw_derive_many(xkey, [account], missing))
+                ]
+                self._conn.executemany(
+                    'INSERT INTO addresses VALUES (?, ?, ?, ?)', rows)
+                added += len(rows)
+        return added
+
+    def master_pubkey(self, wallet):
+        row = self._conn.execute(
+            'SELECT master_pubkey FROM wallets WHERE name = ?', (wallet,)
+        ).fetchone()
+        return row and row[0]
+
+    def is_current(self, wallet):
+        """Whether indexed addresses of ``wallet`` belong to the wallet of
+        the same name in the keystore.  Needs no password.
+        """
+        try:
+            keystore_wallet = ks.get_wallet_content(wallet)[wallet]
+        except (ks.WalletError, KeyError):
+            return False
+        return self.master_pubkey(wallet) == keystore_wallet.get(
+            'master_pubkey')
+
+    def get(self, wallet, account, index):
+        """Base58 public key of an address or ``None`` if not indexed."""
+        row = self._conn.execute(
+            'SELECT pubkey FROM addresses '
+            'WHERE wallet = ? AND account = ? AND address_index = ?',
+            (wallet, account, index)
+        ).fetchone()
+        return row and row[0]
+
+    def locate(self, pubkey, wallet=None):
+        """Reverse lookup of a base58 public key.  Returns ``(wallet, account,
+        index)`` or ``None`` if the key is not indexed.
+        """
+        query = ('SELECT wallet, account, address_index FROM addresses '
+                 'WHERE pubkey = ?')
+        params = (pubkey,)
+        if wallet is not None:
+            query, params = query + ' AND wallet = ?', params + (wallet,)
+        return self._conn.execute(query + ' LIMIT 1', params).fetchone()
+
+    def addresses(self, wallet):
+        """``(account, index, pubkey)`` of every indexed address of
+        ``wallet``.
+        """
+        return self._conn.execute(
+            'SELECT account, address_index, pubkey FROM addresses '
+            'WHERE wallet = ? ORDER BY account, address_index', (wallet,)
+        ).fetchall()
+
+    def pubkeys(self, wallet):
+        return {row[2] for row in self.addresses(wallet)}
+
+
+def open_index(location=None):
+    """Open the index stored in the keystore directory ``location``."""
+    return PubkeyIndex(get_index_location(location))
@@ -0,0 +1,227 @@
+"""This module recovers mnemonic phrases with unknown or misspelled words.
+Candidate words of those positions are enumerated and filtered with the BIP39
+checksum first, so the 2048 PBKDF2 rounds of the seed, the master key and
+address derivations only run for checksum valid phrases, in a process pool.
+"""
+
+import hashlib
+import itertools
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from base58 import b58encode
+
+import bigchaindb_wallet.keymanagement as km
+import bigchaindb_wallet.keystore as ks
+
+UNKNOWN_WORD = '?'
+PHRASE_LENGTHS = (12, 15, 18, 21, 24)
+# A misspelled word is replaced by the words at most this many edits away
+MAX_EDIT_DISTANCE = 2
+# Candidate phrases checked per job
+CHUNK_SIZE = 4096
+# Seconds between progress reports
+PROGRESS_INTERVAL = 1.0
+
+_WORD_BITS = 11
+
+
+def edit_distance(left, right):
+    """Levenshtein distance of two words."""
+    previous = list(range(len(right) + 1))
+    for i, left_char in enumerate(left, 1):
+        current = [i]
+        for j, right_char in enumerate(right, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (left_char != right_char)))
+        previous = current
+    return previous[-1]
+
+
+def word_candidates(word, wordlist):
+    """Wordlist indexes ``word`` may stand for.  An unknown word may be any
+    word, a misspelled one the words closest to it.
+    """
+    if word == UNKNOWN_WORD:
+        return list(range(len(wordlist)))
+    try:
+        return [wordlist.index(word)]
+    except ValueError:
+        pass
+    distances = sorted((edit_distance(word, candidate), index)
+                       for index, candidate in enumerate(wordlist))
+    close = [index for distance, index in distances
+             if distance <= MAX_EDIT_DISTANCE]
+    return close or [index for _, index in distances]
+
+
+class PhraseSearch:
+    """Phrases made of the ``choices`` wordlist indexes of every position,
+    searched for the one whose master key has the hex ``master_pubkey`` or
+    whose addresses ``accounts`` x ``indexes`` include one of the base58
+    ``pubkeys``.  Phrases are numbered in mixed radix order.
+    """
+
+    def __init__(self, choices, wordlist, *, delimiter=' ',
+                 master_pubkey=None, pubkeys=(), accounts=(0,),
+                 indexes=range(20)):
+        if len(choices) not in PHRASE_LENGTHS:
+            raise ks.WalletError('A phrase has one of {} words'
+                                 .format(', '.join(map(str, PHRASE_LENGTHS))))
+        if not master_pubkey and not pubkeys:
+            raise ks.WalletError('A master public key or an address public '
+                                 'key to match is required')
+        self.length = len(choices)
+        self.wordlist = list(wordlist)
+        self.delimiter = delimiter
+        self.master_pubkey = master_pubkey and master_pubkey.lower()
+        self.pubkeys = frozenset(pubkeys)
+        self.accounts = tuple(accounts)
+        self.indexes = tuple(indexes)
+        self.checksum_bits = len(choices) * _WORD_BITS // 33
+        self.entropy_bytes = len(choices) * 4 // 3
+        self.known = 0
+        # (shift, choices) of unknown positions, the last position first
+        self.unknown = []
+        for position, words in enumerate(reversed(choices)):
+            if len(words) == 1:
+                self.known |= words[0] << (position * _WORD_BITS)
+            else:
+                self.unknown.append((position * _WORD_BITS, tuple(words)))
+        self.size = 1
+        for _, words in self.unknown:
+            self.size *= len(words)
+
+    def __len__(self):
+        return self.size
+
+    def checksum_valid(self, start, stop):
+        """Phrases ``start`` to ``stop`` with a valid checksum, as integers
+        of their concatenated word indexes.
+        """
+        checksum_mask = (1 << self.checksum_bits) - 1
+        checksum_shift = 8 - self.checksum_bits
+        for number in range(start, stop):
+            value = self.known
+            for shift, words in self.unknown:
+                number, digit = divmod(number, len(words))
+                value |= words[digit] << shift
+            entropy = (value >> self.checksum_bits).to_bytes(
+                self.entropy_bytes, 'big')
+            if (hashlib.sha256(entropy).digest()[0] >> checksum_shift
+                    == value & checksum_mask):
+                yield value
+
+    def phrase(self, value):
+        words = []
+        for _ in range(self.length):
+            words.append(self.wordlist[value & 0x7ff])
+            value >>= _WORD_BITS
+        return self.delimiter.join(reversed(words))
+
+    def matches(self, phrase):
+        xkey = km.seed_to_extended_key(km.mnemonic_to_seed(phrase))
+        if (self.master_pubkey is not None
+                and km.privkey_to_pubkey(xkey.privkey).hex()
+                == self.master_pubkey):
+            return True
+        if not self.pubkeys:
+            return False
+        return any(b58encode(pubkey[1:]).decode() in self.pubkeys
+                   for _, _, pubkey in ks.bdbw_derive_many(
+                       xkey, self.accounts, self.indexes))
+
+    def search(self, start, stop):
+        """Returns ``(checksum valid phrases, matching phrase or None)`` of
+        phrases ``start`` to ``stop``.
+        """
+        valid = 0
+        for value in self.checksum_valid(start, stop):
+            valid += 1
+            phrase = self.phrase(value)
+            if self.matches(phrase):
+                return valid, phrase
+        return valid, None
+
+
+_search = None
+
+
+def _init_search(search):
+    global _search
+    _search = search
+
+
+def _search_chunk(chunk):
+    start, stop = chunk
+    return (stop - start,) + _search.search(start, stop)
+
+
+def phrase_search(words, *, language='english', **kwargs):
+    """``PhraseSearch`` of a phrase given as a list of words, where unknown
+    ones are ``UNKNOWN_WORD``.
+    """
+    from mnemonic import Mnemonic
+
+    if language not in km.SUPPORTED_LANGUAGES:
+        raise ks.WalletError('{} not found in supported languages: {}'
+                             .format(language, km.SUPPORTED_LANGUAGES))
+    mnemonic_obj = Mnemonic(language)
+    choices = [word_candidates(Mnemonic.normalize_string(word),
+                               mnemonic_obj.wordlist)
+               for word in words]
+    return PhraseSearch(choices, mnemonic_obj.wordlist,
+                        delimiter=mnemonic_obj.delimiter, **kwargs)
+
+
+def recover(search: PhraseSearch, *, workers=None, progress=None):
+    """Search phrases of ``search`` in ``workers`` processes, all cpus by
+    default, and return the first matching phrase or ``None``.  ``progress``
+    is called with the numbers of checked and checksum valid phrases at most
+    every ``PROGRESS_INTERVAL`` seconds and once at the end.
+    """
+    workers = workers or os.cpu_count() or 1
+    total = len(search)
+    # Small searches are still spread over all workers
+    chunk_size = max(1, min(CHUNK_SIZE, -(-total // (workers * 4))))
+    chunks = ((start, min(start + chunk_size, total))
+              for start in range(0, total, chunk_size))
+    checked = valid = 0
+    reported = time.monotonic()
+
+    def tally(result):
+        nonlocal checked, valid, reported
+        checked += result[0]
+        valid += result[1]
+        if progress and time.monotonic() - reported >= PROGRESS_INTERVAL:
+            reported = time.monotonic()
+            progress(checked, valid)
+        return result[2]
+
+    found = None
+    if workers <= 1:
+        _init_search(search)
+        for chunk in chunks:
+            found = tally(_search_chunk(chunk))
+            if found:
+                break
+    else:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_search,
+                                 initargs=(search,)) as executor:
+            pending = set()
+            while found is None:
+                for chunk in itertools.islice(chunks,
+                                              workers * 2 - len(pending)):
+                    pending.add(executor.submit(_search_chunk, chunk))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    found = tally(future.result()) or found
+            for future in pending:
+                future.cancel()
+    if progress:
+        progress(checked, valid)
+    return found
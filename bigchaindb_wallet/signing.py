@@ -0,0 +1,138 @@
+"""This module provides transaction signing.  Every input of a transaction is
+signed in a single pass with the keys of its owners, and the inputs of large
+transactions are signed concurrently.
+
+Ed25519 inputs are signed natively: the transaction is serialized and hashed
+once for all inputs, every signing key is expanded once and fulfillment URIs
+are encoded directly.  The result is byte for byte the one of
+``bigchaindb_driver.offchain.fulfill_transaction``.  Other fulfillment types
+are signed through the driver, imported only then.
+"""
+
+import hashlib
+import os
+from base64 import urlsafe_b64encode
+from concurrent.futures import ThreadPoolExecutor
+
+from base58 import b58decode, b58encode
+from nacl.signing import SigningKey
+
+import bigchaindb_wallet.keystore as ks
+from bigchaindb_wallet import timings
+from bigchaindb_wallet.transactions import (ED25519_TYPE, OPERATIONS, VERSION,
+                                            normalize_output, serialize)
+
+# Transactions with fewer inputs are signed in the calling thread
+PARALLEL_INPUTS = 32
+# DER header of an Ed25519Sha256 fulfillment and of its signature field
+_ED25519_FULFILLMENT_HEADER = b'\xa4\x64\x80\x20'
+_ED25519_SIGNATURE_HEADER = b'\x81\x40'
+
+
+def ed25519_fulfillment_uri(public_key, signature):
+    """Crypto-conditions URI of an Ed25519Sha256 fulfillment from the raw
+    32 byte ``public_key`` and 64 byte ``signature``.
+    """
+    der = (_ED25519_FULFILLMENT_HEADER + public_key
+           + _ED25519_SIGNATURE_HEADER + signature)
+    return urlsafe_b64encode(der).rstrip(b'=').decode()
+
+
+def _signing_keys(private_keys):
+    """Map base58 public keys to ``(SigningKey, base58 private key)``."""
+    keys = {}
+    for private_key in private_keys:
+        signing_key = SigningKey(b58decode(private_key))
+        public_key = b58encode(signing_key.verify_key.encode()).decode()
+        keys[public_key] = (signing_key, private_key)
+    return keys
+
+
+def _fulfills(input_):
+    fulfills = input_['fulfills']
+    if fulfills is None:
+        return None
+    return {'transaction_id': fulfills['transaction_id'],
+            'output_index': fulfills['output_index']}
+
+
+def fulfill(transaction, private_keys, *, workers=None):
+    """Sign every input of ``transaction``, a dict, with the base58
+    ``private_keys`` of its owners and return the fulfilled transaction.
+    Inputs are signed by ``workers`` threads, all cpus by default, once there
+    are ``PARALLEL_INPUTS`` of them.
+    """
+    if transaction['operation'] not in OPERATIONS:
+        raise ks.WalletError('Unknown transaction operation {}'
+                             .format(transaction['operation']))
+    keys = _signing_keys(private_keys)
+    inputs = [{'owners_before': input_['owners_before'],
+               'fulfills': _fulfills(input_),
+               'fulfillment': None}
+              for input_ in transaction['inputs']]
+    tx = {
+        'inputs': inputs,
+        'outputs': [normalize_output(output)
+                    for output in transaction['outputs']],
+        'operation': transaction['operation'],
+        'metadata': transaction['metadata'],
+        'asset': transaction['asset'],
+        'version': (transaction['version'] if transaction['version']
+                    is not None else VERSION),
+        'id': transaction['id'],
+    }
+    with timings.span('sign.serialize'):
+        message = serialize(tx)
+        message_hash = hashlib.sha3_256(message.encode())
+
+    def sign(position):
+        input_ = transaction['inputs'][position]
+        details = input_['fulfillment']
+        if not (isinstance(details, dict)
+                and details.get('type') == ED25519_TYPE):
+            return _driver_sign(input_, message, keys)
+        public_key = input_['owners_before'][0]
+        try:
+            signing_key, _ = keys[public_key]
+        except KeyError:
+            raise ks.WalletError('Public key {} is not a pair to any of the '
+                                 'private keys'.format(public_key))
+        digest = message_hash.copy()
+        fulfills = inputs[position]['fulfills']
+        if fulfills:
+            digest.update('{}{}'.format(fulfills['transaction_id'],
+                                        fulfills['output_index']).encode())
+        signature = signing_key.sign(digest.digest()).signature
+        return ed25519_fulfillment_uri(signing_key.verify_key.encode(),
+                                       signature)
+
+    positions = range(len(inputs))
+    workers = workers or os.cpu_count() or 1
+    timings.count('sign.inputs', len(inputs))
+    with timings.span('sign'):
+        if workers <= 1 or len(inputs) < PARALLEL_INPUTS:
+            fulfillments = [sign(position) for position in positions]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                fulfillments = list(executor.map(sign, positions))
+    for input_, fulfillment in zip(inputs, fulfillments):
+        input_['fulfillment'] = fulfillment
+    with timings.span('sign.serialize'):
+        tx['id'] = hashlib.sha3_256(serialize(tx).encode()).hexdigest()
+    return tx
+
+
+def _driver_sign(input_, message, keys):
+    """Fulfillment URI of a threshold or already signed input."""
+    from bigchaindb_driver.common.crypto import PrivateKey
+    from bigchaindb_driver.common.exceptions import KeypairMismatchException
+    from bigchaindb_driver.common.transaction import Input, Transaction
+
+    key_pairs = {public_key: PrivateKey(private_key)
+                 for public_key, (_, private_key) in keys.items()}
+    try:
+        signed = Transaction._sign_input(Input.from_dict(input_), message,
+                                         key_pairs)
+    except KeypairMismatchException as error:
+        raise ks.WalletError(str(error))
+    return signed.to_dict()['fulfillment']
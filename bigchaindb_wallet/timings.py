@@ -0,0 +1,170 @@
+"""This module provides lightweight timing instrumentation.  Phases are
+marked with ``span`` and events counted with ``count``.  Both are no-ops
+until ``enable`` is called, and ``report`` writes a per-phase breakdown or a
+json trace to stderr.
+
+Spans of batch worker processes are not collected.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+FORMATS = ('text', 'json')
+# Trace events kept for the json report, totals are always complete
+MAX_TRACE_EVENTS = 10000
+
+_lock = threading.Lock()
+_format = None
+_origin = time.perf_counter()
+_spans = {}  # name -> [count, total seconds]
+_counters = {}
+_trace = []
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.start, self.start)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def enable(format_='text'):
+    """Start collecting timings.  The time since the process started,
+    interpreter start up and imports, is recorded as the ``startup`` phase
+    where the platform tells it.
+    """
+    global _format
+    if format_ not in FORMATS:
+        raise ValueError('format should be one of {}'.format(FORMATS))
+    _format = format_
+    uptime = process_uptime()
+    if uptime is not None:
+        record('startup', uptime, time.perf_counter() - uptime)
+
+
+def process_uptime():
+    """Seconds since the process started, ``None`` where unknown.  Linux
+    only, with clock tick resolution.
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the parenthesized command name, start time is 22nd
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        return (time.clock_gettime(time.CLOCK_BOOTTIME)
+                - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def disable():
+    global _format
+    _format = None
+
+
+def is_enabled():
+    return _format is not None
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _trace.clear()
+
+
+def span(name):
+    """Context manager timing the ``name`` phase."""
+    if _format is None:
+        return _NO_SPAN
+    return _Span(name)
+
+
+def record(name, seconds, start=None):
+    """Add ``seconds`` spent in the ``name`` phase, which started at
+    ``time.perf_counter()`` value ``start``.
+    """
+    if _format is None:
+        return
+    with _lock:
+        totals = _spans.setdefault(name, [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+        if len(_trace) < MAX_TRACE_EVENTS:
+            _trace.append((name, (start or _origin) - _origin, seconds))
+
+
+def count(name, n=1):
+    if _format is None:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def snapshot():
+    """Totals and trace collected so far in milliseconds.  Wall time counts
+    from the process start where known, trace start times from the import of
+    this module.
+    """
+    uptime = process_uptime()
+    if uptime is None:
+        uptime = time.perf_counter() - _origin
+    with _lock:
+        return {
+            'wall_ms': _ms(uptime),
+            'spans': {name: {'count': calls, 'total_ms': _ms(seconds)}
+                      for name, (calls, seconds) in _spans.items()},
+            'counters': dict(_counters),
+            'trace': [{'name': name, 'start_ms': _ms(start),
+                       'duration_ms': _ms(seconds)}
+                      for name, start, seconds in _trace],
+        }
+
+
+def report(file=None):
+    """Write collected timings to ``file``, stderr by default, in the
+    enabled format.
+    """
+    if _format is None:
+        return
+    file = file or sys.stderr
+    data = snapshot()
+    if _format == 'json':
+        print(json.dumps(data), file=file)
+        return
+    print('{:<24} {:>8} {:>12}'.format('phase', 'count', 'total ms'),
+          file=file)
+    for name, totals in sorted(data['spans'].items(),
+                               key=lambda item: -item[1]['total_ms']):
+        print('{:<24} {:>8} {:>12.3f}'.format(
+            name, totals['count'], totals['total_ms']), file=file)
+    for name, value in sorted(data['counters'].items()):
+        print('{:<24} {:>8}'.format(name, value), file=file)
+    print('{:<24} {:>8} {:>12.3f}'.format('wall', '', data['wall_ms']),
+          file=file)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
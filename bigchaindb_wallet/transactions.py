@@ -0,0 +1,182 @@
+"""This module builds transaction payloads without the driver.  Importing
+``bigchaindb_driver`` loads its HTTP stack, so offline commands prepare
+single signer ``CREATE`` transactions, ``TRANSFER`` transactions between
+single key Ed25519 outputs and normalize Ed25519 outputs here, byte for byte
+as ``bigchaindb_driver.offchain`` does.  Everything else is handed to the
+driver, imported on first use.
+"""
+
+import hashlib
+from base64 import urlsafe_b64encode
+
+import rapidjson
+from base58 import b58decode
+
+VERSION = '2.0'
+OPERATIONS = ('CREATE', 'TRANSFER')
+ED25519_TYPE = 'ed25519-sha-256'
+ED25519_COST = 131072
+# Largest output amount the driver accepts
+MAX_AMOUNT = 9 * 10 ** 18
+# DER header of the Ed25519Sha256 fingerprint contents
+_ED25519_FINGERPRINT_HEADER = b'\x30\x22\x80\x20'
+
+
+def serialize(data):
+    """Canonical json of ``data``, as ``bigchaindb_driver.common.utils``
+    serializes it for hashing.
+    """
+    return rapidjson.dumps(data, skipkeys=False, ensure_ascii=False,
+                           sort_keys=True)
+
+
+def _ed25519_public_key(public_key):
+    """Raw bytes of a base58 Ed25519 ``public_key``, ``None`` if it is not
+    one.
+    """
+    if not isinstance(public_key, str):
+        return None
+    try:
+        raw = b58decode(public_key)
+    except ValueError:
+        return None
+    return raw if len(raw) == 32 else None
+
+
+def ed25519_condition_uri(public_key):
+    """Crypto-conditions URI of an Ed25519Sha256 condition from the raw 32
+    byte ``public_key``.
+    """
+    fingerprint = hashlib.sha256(_ED25519_FINGERPRINT_HEADER + public_key)
+    return 'ni:///sha-256;{}?fpt={}&cost={}'.format(
+        urlsafe_b64encode(fingerprint.digest()).rstrip(b'=').decode(),
+        ED25519_TYPE, ED25519_COST)
+
+
+def ed25519_output(public_key, amount=1):
+    """Output paying ``amount`` to the base58 ``public_key``."""
+    return {
+        'public_keys': [public_key],
+        'condition': {
+            'details': {'type': ED25519_TYPE, 'public_key': public_key},
+            'uri': ed25519_condition_uri(b58decode(public_key)),
+        },
+        'amount': str(amount),
+    }
+
+
+def ed25519_input(public_key, fulfills=None):
+    """Unsigned input of the base58 ``public_key``, spending the
+    ``{'transaction_id', 'output_index'}`` output ``fulfills``.
+    """
+    return {
+        'owners_before': [public_key],
+        'fulfills': fulfills,
+        'fulfillment': {'type': ED25519_TYPE, 'public_key': public_key},
+    }
+
+
+def normalize_output(output):
+    """``output`` as the driver serializes it, with the condition URI
+    recomputed from its details.
+    """
+    details = output['condition'].get('details')
+    public_keys = output['public_keys']
+    try:
+        amount = int(output['amount'])
+    except (TypeError, ValueError):
+        amount = None
+    if (isinstance(details, dict) and details.get('type') == ED25519_TYPE
+            and isinstance(public_keys, list) and amount
+            and 0 < amount <= MAX_AMOUNT):
+        raw = _ed25519_public_key(details.get('public_key'))
+        if raw is not None:
+            return {
+                'public_keys': public_keys,
+                'condition': {
+                    'details': {'type': ED25519_TYPE,
+                                'public_key': details['public_key']},
+                    'uri': ed25519_condition_uri(raw),
+                },
+                'amount': str(amount),
+            }
+    from bigchaindb_driver.common.transaction import Output
+    return Output.from_dict(output).to_dict()
+
+
+def _is_simple_create(operation, signers, asset, metadata):
+    return (operation == 'CREATE'
+            and _ed25519_public_key(signers) is not None
+            and (not asset or isinstance(asset, dict) and 'data' in asset
+                 and isinstance(asset['data'], (dict, type(None))))
+            and isinstance(metadata, (dict, type(None))))
+
+
+def _is_simple_transfer(operation, inputs, recipients, asset, metadata):
+    def is_simple_input(input_):
+        fulfillment = input_.get('fulfillment')
+        fulfills = input_.get('fulfills')
+        if not isinstance(fulfillment, dict) or not isinstance(fulfills, dict):
+            return False
+        public_key = fulfillment.get('public_key')
+        return (fulfillment.get('type') == ED25519_TYPE
+                and _ed25519_public_key(public_key) is not None
+                and input_.get('owners_before') == [public_key]
+                and isinstance(fulfills.get('transaction_id'), str)
+                and type(fulfills.get('output_index')) is int)
+
+    def is_simple_recipient(recipient):
+        return (isinstance(recipient, tuple) and len(recipient) == 2
+                and isinstance(recipient[0], list) and len(recipient[0]) == 1
+                and _ed25519_public_key(recipient[0][0]) is not None
+                and type(recipient[1]) is int
+                and 0 < recipient[1] <= MAX_AMOUNT)
+
+    return (operation == 'TRANSFER'
+            and isinstance(inputs, list) and inputs
+            and all(isinstance(input_, dict) and is_simple_input(input_)
+                    for input_ in inputs)
+            and isinstance(recipients, list) and recipients
+            and all(map(is_simple_recipient, recipients))
+            and isinstance(asset, dict) and isinstance(asset.get('id'), str)
+            and isinstance(metadata, (dict, type(None))))
+
+
+def _output_link(fulfills):
+    return {'transaction_id': fulfills['transaction_id'],
+            'output_index': fulfills['output_index']}
+
+
+def prepare(*, operation, signers=None, recipients=None, asset=None,
+            metadata=None, inputs=None):
+    """Prepared transaction of ``signers``, with the arguments of
+    ``bigchaindb_driver.offchain.prepare_transaction``.
+    """
+    if recipients is None and _is_simple_create(operation, signers, asset,
+                                                 metadata):
+        return {
+            'inputs': [ed25519_input(signers)],
+            'outputs': [ed25519_output(signers)],
+            'operation': operation,
+            'metadata': metadata,
+            'asset': {'data': asset['data'] if asset else None},
+            'version': VERSION,
+            'id': None,
+        }
+    if _is_simple_transfer(operation, inputs, recipients, asset, metadata):
+        return {
+            'inputs': [ed25519_input(input_['owners_before'][0],
+                                     _output_link(input_['fulfills']))
+                       for input_ in inputs],
+            'outputs': [ed25519_output(public_keys[0], amount)
+                        for public_keys, amount in recipients],
+            'operation': operation,
+            'metadata': metadata,
+            'asset': {'id': asset['id']},
+            'version': VERSION,
+            'id': None,
+        }
+    from bigchaindb_driver.offchain import prepare_transaction
+    return prepare_transaction(operation=operation, signers=signers,
+                               recipients=recipients, asset=asset,
+                               metadata=metadata, inputs=inputs)
@@ -0,0 +1,429 @@
+"""This module provides the local transaction cache.  Transactions are stored
+in an SQLite database in WAL mode and indexed by transaction id, asset id,
+output public key and spent status.  Unspent outputs are indexed by asset id
+and amount for coin selection.  Inserts are append only.
+
+Balances by owners and asset and per owners history are aggregated as
+transactions are inserted, so queries do not depend on history length.
+Aggregates are kept by the set of public keys owning an output, so outputs
+shared by several keys of a wallet are counted once.
+"""
+
+import heapq
+import json
+import os
+import sqlite3
+
+import bigchaindb_wallet.keystore as ks
+from bigchaindb_wallet import timings
+
+DEFAULT_CACHE_FILENAME = '.bdbw_cache.sqlite'
+# pickledb JSON file used by older versions, migrated on first open
+LEGACY_CACHE_FILENAME = '.bdbw_cache'
+HISTORY_PAGE_SIZE = 20
+# Schema version of the aggregates, caches of an older version are
+# aggregated again on open
+_AGGREGATES_VERSION = 1
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT PRIMARY KEY,
+    asset_id TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_asset_id
+    ON transactions (asset_id);
+CREATE TABLE IF NOT EXISTS outputs (
+    transaction_id TEXT NOT NULL,
+    output_index INTEGER NOT NULL,
+    public_key TEXT NOT NULL,
+    asset_id TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    spent_by TEXT,
+    PRIMARY KEY (transaction_id, output_index, public_key)
+);
+CREATE INDEX IF NOT EXISTS outputs_public_key
+    ON outputs (public_key, spent_by);
+CREATE INDEX IF NOT EXISTS outputs_spent_by
+    ON outputs (spent_by);
+CREATE INDEX IF NOT EXISTS outputs_unspent
+    ON outputs (asset_id, amount) WHERE spent_by IS NULL;
+CREATE TABLE IF NOT EXISTS spends (
+    transaction_id TEXT NOT NULL,
+    output_index INTEGER NOT NULL,
+    spent_by TEXT NOT NULL,
+    PRIMARY KEY (transaction_id, output_index)
+);
+CREATE TABLE IF NOT EXISTS owners (
+    public_key TEXT NOT NULL,
+    owners TEXT NOT NULL,
+    PRIMARY KEY (public_key, owners)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS balances (
+    owners TEXT NOT NULL,
+    asset_id TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    outputs INTEGER NOT NULL,
+    PRIMARY KEY (owners, asset_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS history (
+    owners TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    transaction_id TEXT NOT NULL,
+    asset_id TEXT NOT NULL,
+    received INTEGER NOT NULL,
+    sent INTEGER NOT NULL,
+    PRIMARY KEY (owners, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS history_asset_id
+    ON history (owners, asset_id, seq);
+'''
+# Owners are json lists of sorted public keys, registered by public key in
+# the owners table
+_ADD_BALANCE = '''
+INSERT INTO balances VALUES (?, ?, ?, ?)
+ON CONFLICT (owners, asset_id) DO UPDATE SET
+    amount = amount + excluded.amount, outputs = outputs + excluded.outputs
+'''
+_ADD_SENT = '''
+INSERT INTO history VALUES (?, ?, ?, ?, 0, ?)
+ON CONFLICT (owners, seq) DO UPDATE SET sent = sent + excluded.sent
+'''
+_HISTORY_KEYS = ('seq', 'transaction_id', 'asset_id', 'received', 'sent')
+# Unspent outputs of an asset owned by one of a json list of public keys
+# alone
+_UNSPENT_QUERY = '''
+SELECT transaction_id, output_index, public_key, amount FROM outputs AS o
+WHERE asset_id = ? AND spent_by IS NULL AND amount BETWEEN ? AND ?
+    AND public_key IN (SELECT value FROM json_each(?))
+    AND NOT EXISTS (
+        SELECT 1 FROM outputs
+        WHERE transaction_id = o.transaction_id
+            AND output_index = o.output_index
+            AND public_key != o.public_key)
+ORDER BY amount {order}
+'''
+_UNSPENT_KEYS = ('transaction_id', 'output_index', 'public_key', 'amount')
+# SQLite integer range
+_MAX_INTEGER = 2 ** 63 - 1
+
+
+def get_cache_location():
+    return '{}/{}'.format(ks.get_home_path_and_warn(), DEFAULT_CACHE_FILENAME)
+
+
+def tx_asset_id(tx):
+    if tx['operation'] == 'CREATE':
+        return tx['id']
+    return tx['asset']['id']
+
+
+class TxCache:
+    """Indexed transaction cache.  Use as a context manager or ``close``
+    explicitly.
+    """
+
+    def __init__(self, location):
+        self.location = str(location)
+        self._conn = sqlite3.connect(self.location)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+        if version < _AGGREGATES_VERSION:
+            self._aggregate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def _insert(self, tx):
+        txid, asset_id = tx['id'], tx_asset_id(tx)
+        cursor = self._conn.execute(
+            'INSERT OR IGNORE INTO transactions VALUES (?, ?, ?, ?)',
+            (txid, asset_id, tx['operation'],
+             json.dumps(tx, separators=(',', ':')))
+        )
+        if not cursor.rowcount:
+            return False
+        seq = cursor.lastrowid
+        self._add_history(_history_rows(tx, seq, asset_id))
+        for input_ in tx['inputs']:
+            fulfills = input_.get('fulfills')
+            if not fulfills:
+                continue
+            spent = (fulfills['transaction_id'], fulfills['output_index'])
+            if not self._conn.execute(
+                    'INSERT OR IGNORE INTO spends VALUES (?, ?, ?)',
+                    spent + (txid,)).rowcount:
+                continue
+            rows = self._conn.execute(
+                'SELECT public_key, asset_id, amount FROM outputs '
+                'WHERE transaction_id = ? AND output_index = ?',
+                spent).fetchall()
+            if rows:
+                _, spent_asset_id, amount = rows[0]
+                self._spend(_owners(row[0] for row in rows), spent_asset_id,
+                            amount, seq, txid)
+            self._conn.execute(
+                'UPDATE outputs SET spent_by = ? '
+                'WHERE transaction_id = ? AND output_index = ?',
+                (txid,) + spent)
+        # Outputs spent by transactions cached before this one
+        spenders = {
+            idx: (spent_by, spender_seq)
+            for idx, spent_by, spender_seq in self._conn.execute(
+                'SELECT output_index, spent_by, transactions.rowid '
+                'FROM spends '
+                'LEFT JOIN transactions ON transactions.id = spent_by '
+                'WHERE transaction_id = ?', (txid,))
+        }
+        for idx, output in enumerate(tx['outputs']):
+            amount = int(output['amount'])
+            row = spenders.get(idx)
+            if not self._conn.executemany(
+                    'INSERT OR IGNORE INTO outputs VALUES (?, ?, ?, ?, ?, ?)',
+                    [(txid, idx, public_key, asset_id, amount, row and row[0])
+                     for public_key in output['public_keys']]).rowcount:
+                continue
+            self._add_output(_owners(output['public_keys']), asset_id,
+                             amount, row)
+        return True
+
+    def _add_history(self, rows):
+        self._conn.executemany(
+            'INSERT INTO history VALUES (?, ?, ?, ?, ?, 0)', rows)
+        self._conn.executemany(
+            'INSERT OR IGNORE INTO owners VALUES (?, ?)',
+            [(public_key, row[0]) for row in rows
+             for public_key in json.loads(row[0])])
+
+    def _add_output(self, owners, asset_id, amount, spender):
+        """Aggregate an output, unspent or spent by the cached ``spender``
+        ``(transaction id, seq)``."""
+        if spender is None:
+            self._conn.execute(_ADD_BALANCE, (owners, asset_id, amount, 1))
+        else:
+            self._add_sent(owners, spender[1], spender[0], asset_id, amount)
+
+    def _spend(self, owners, asset_id, amount, seq, txid):
+        self._conn.execute(_ADD_BALANCE, (owners, asset_id, -amount, -1))
+        self._add_sent(owners, seq, txid, asset_id, amount)
+
+    def _add_sent(self, owners, seq, txid, asset_id, amount):
+        if self._conn.execute(_ADD_SENT, (owners, seq, txid, asset_id,
+                                          amount)).rowcount:
+            # Spender inputs register the owners too, unless they name
+            # other keys than the output
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO owners VALUES (?, ?)',
+                [(public_key, owners) for public_key in json.loads(owners)])
+
+    def _aggregate(self):
+        """Build balances and history of cached transactions."""
+        with self._conn:
+            for table in ('owners', 'balances', 'history'):
+                self._conn.execute('DELETE FROM {}'.format(table))
+            spenders = {
+                (txid, idx): (spent_by, spender_seq)
+                for txid, idx, spent_by, spender_seq in self._conn.execute(
+                    'SELECT o.transaction_id, o.output_index, t.id, t.rowid '
+                    'FROM outputs AS o JOIN transactions AS t '
+                    'ON t.id = o.spent_by')
+            }
+            txs = [(seq, asset_id, json.loads(body))
+                   for seq, asset_id, body in self._conn.execute(
+                       'SELECT rowid, asset_id, body FROM transactions '
+                       'ORDER BY rowid')]
+            # History rows of every transaction first, spent outputs add
+            # to the rows of their spenders
+            for seq, asset_id, tx in txs:
+                self._add_history(_history_rows(tx, seq, asset_id))
+            for _, asset_id, tx in txs:
+                for idx, output in enumerate(tx['outputs']):
+                    self._add_output(_owners(output['public_keys']),
+                                     asset_id, int(output['amount']),
+                                     spenders.get((tx['id'], idx)))
+            self._conn.execute(
+                'PRAGMA user_version = {}'.format(_AGGREGATES_VERSION))
+
+    def add(self, tx):
+        """Cache a transaction.  Returns ``False`` if it is already cached."""
+        with timings.span('cache.write'), self._conn:
+            return self._insert(tx)
+
+    def add_many(self, txs):
+        """Cache transactions in a single database transaction.  Returns the
+        number of new transactions.
+        """
+        with timings.span('cache.write'), self._conn:
+            return sum(self._insert(tx) for tx in txs)
+
+    def get(self, txid):
+        row = self._conn.execute(
+            'SELECT body FROM transactions WHERE id = ?', (txid,)
+        ).fetchone()
+        return row and json.loads(row[0])
+
+    def __contains__(self, txid):
+        return self._conn.execute(
+            'SELECT 1 FROM transactions WHERE id = ?', (txid,)
+        ).fetchone() is not None
+
+    def __len__(self):
+        return self._conn.execute(
+            'SELECT COUNT(*) FROM transactions').fetchone()[0]
+
+    def transactions(self, asset_id=None):
+        query, params = 'SELECT body FROM transactions', ()
+        if asset_id is not None:
+            query, params = query + ' WHERE asset_id = ?', (asset_id,)
+        for row in self._conn.execute(query, params):
+            yield json.loads(row[0])
+
+    def outputs(self, public_key, spent=None):
+        """Outputs owned by ``public_key`` as dicts with ``transaction_id``,
+        ``output_index``, ``asset_id``, ``amount`` and ``spent_by`` keys.
+        """
+        query = ('SELECT transaction_id, output_index, asset_id, amount, '
+                 'spent_by FROM outputs WHERE public_key = ?')
+        if spent is True:
+            query += ' AND spent_by IS NOT NULL'
+        elif spent is False:
+            query += ' AND spent_by IS NULL'
+        keys = ('transaction_id', 'output_index', 'asset_id', 'amount',
+                'spent_by')
+        for row in self._conn.execute(query, (public_key,)):
+            yield dict(zip(keys, row))
+
+    def unspent(self, asset_id, public_keys, *, min_amount=0,
+                max_amount=_MAX_INTEGER, descending=False):
+        """Unspent outputs of ``asset_id`` owned by one of ``public_keys``
+        alone, in amount order, as dicts with ``transaction_id``,
+        ``output_index``, ``public_key`` and ``amount`` keys.  Outputs shared
+        by several keys are left out.  Rows are read as they are consumed.
+        """
+        query = _UNSPENT_QUERY.format(
+            order='DESC' if descending else 'ASC')
+        params = (asset_id, min_amount, max_amount,
+                  json.dumps(list(public_keys)))
+        for row in self._conn.execute(query, params):
+            yield dict(zip(_UNSPENT_KEYS, row))
+
+    def _owner_sets(self, public_keys):
+        """Owners of outputs and inputs with one of ``public_keys``."""
+        return {owners for public_key in set(public_keys)
+                for owners, in self._conn.execute(
+                    'SELECT owners FROM owners WHERE public_key = ?',
+                    (public_key,))}
+
+    def balance(self, public_keys, asset_id=None):
+        """Unspent amounts of outputs owned by ``public_keys`` by asset id,
+        read from per owners aggregates.  Outputs shared with other keys
+        count in full, outputs shared by several of ``public_keys`` once.
+        """
+        query = ('SELECT asset_id, amount FROM balances '
+                 'WHERE owners = ? AND outputs > 0')
+        if asset_id is not None:
+            query += ' AND asset_id = ?'
+        totals = {}
+        for owners in self._owner_sets(public_keys):
+            params = (owners,) if asset_id is None else (owners, asset_id)
+            for asset, amount in self._conn.execute(query, params):
+                totals[asset] = totals.get(asset, 0) + amount
+        return totals
+
+    def history(self, public_keys, *, asset_id=None, before=None,
+                limit=HISTORY_PAGE_SIZE):
+        """Up to ``limit`` transactions touching ``public_keys``, latest
+        cached first, as dicts with ``seq``, ``transaction_id``,
+        ``asset_id``, ``received`` and ``sent`` keys.  Amounts are summed over
+        the outputs of the keys, counting shared ones once as :meth:`balance`.
+        The next page starts ``before`` the ``seq`` of the last entry.
+        """
+        query = ('SELECT seq, transaction_id, asset_id, received, sent '
+                 'FROM history WHERE owners = ? AND seq < ?')
+        if asset_id is not None:
+            query += ' AND asset_id = ?'
+        query += ' ORDER BY seq DESC'
+        before = _MAX_INTEGER if before is None else before
+        cursors = [
+            self._conn.execute(query, (owners, before) + (
+                () if asset_id is None else (asset_id,)))
+            for owners in self._owner_sets(public_keys)
+        ]
+        entries = []
+        with timings.span('cache.history'):
+            # Newest entries of every owners merged, one seek each
+            for row in heapq.merge(*cursors, key=lambda row: -row[0]):
+                if entries and entries[-1]['seq'] == row[0]:
+                    entries[-1]['received'] += row[3]
+                    entries[-1]['sent'] += row[4]
+                    continue
+                if len(entries) >= limit:
+                    break
+                entries.append(dict(zip(_HISTORY_KEYS, row)))
+        for cursor in cursors:
+            cursor.close()
+        return entries
+
+    def smallest_unspent(self, asset_id, public_keys, min_amount, *,
+                         max_amount=_MAX_INTEGER, exclude=()):
+        """Smallest :meth:`unspent` output worth ``min_amount`` to
+        ``max_amount``, other than the ``exclude`` ones, or ``None``.
+        """
+        excluded = {(output['transaction_id'], output['output_index'])
+                    for output in exclude}
+        for output in self.unspent(asset_id, public_keys,
+                                   min_amount=min_amount,
+                                   max_amount=max_amount):
+            if (output['transaction_id'],
+                    output['output_index']) not in excluded:
+                return output
+        return None
+
+
+def _owners(public_keys):
+    return json.dumps(sorted(set(public_keys)), separators=(',', ':'))
+
+
+def _history_rows(tx, seq, asset_id):
+    """History rows of the owners of an input or output of ``tx``, with
+    the amounts they received.  Sent amounts are added as spent outputs are
+    known.
+    """
+    received = {}
+    for output in tx['outputs']:
+        owners = _owners(output['public_keys'])
+        received[owners] = received.get(owners, 0) + int(output['amount'])
+    for input_ in tx['inputs']:
+        received.setdefault(_owners(input_['owners_before']), 0)
+    return [(owners, seq, tx['id'], asset_id, amount)
+            for owners, amount in sorted(received.items())]
+
+
+def migrate_legacy_cache(cache, legacy_location):
+    """Import a pickledb cache file and rename it so it is imported once."""
+    with open(legacy_location) as f:
+        legacy = json.load(f)
+    cache.add_many(legacy.values())
+    os.replace(legacy_location, '{}.migrated'.format(legacy_location))
+
+
+def open_cache(location=None):
+    """Open the transaction cache, migrating a legacy pickledb cache found
+    in the same directory.
+    """
+    location = str(location or get_cache_location())
+    cache = TxCache(location)
+    legacy_location = os.path.join(os.path.dirname(location),
+                                   LEGACY_CACHE_FILENAME)
+    if os.path.isfile(legacy_location):
+        migrate_legacy_cache(cache, legacy_location)
+    return cache
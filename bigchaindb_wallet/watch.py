@@ -0,0 +1,146 @@
+"""This module keeps the transaction cache current from a node's valid
+transaction event stream.  Events only carry the transaction id, asset id and
+block height, so the block of every new height is fetched once and its
+transactions are matched against a set of the wallet's public keys.  Blocks
+missed while disconnected are fetched as soon as an event shows the gap, and
+blocks the node cannot return yet are fetched again on the next event.
+
+The stream client needs the optional ``websockets`` package.
+"""
+
+import json
+import time
+
+import bigchaindb_wallet.keystore as ks
+from bigchaindb_wallet import timings
+from bigchaindb_wallet.discovery import (ACCOUNT_GAP_LIMIT, GAP_LIMIT,
+                                         tx_public_keys)
+
+# Seconds before the first reconnect, doubled up to the maximum after each
+# failed attempt
+RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 60.0
+
+
+class Watcher:
+    """Matches blocks against the wallet's addresses and passes matching
+    transactions to ``store``.
+
+    ``addresses`` maps base58 public keys to ``(account, index)``.
+    ``fetch_blocks`` maps a range of heights to their blocks, ``None`` for
+    missing ones, in order.  ``derive``, if given, maps an account and a
+    list of indexes to ``(index, pubkey)`` pairs, it extends the addresses
+    so that ``gap_limit`` addresses and ``account_gap_limit`` accounts past
+    every used one are watched.  ``height`` is the last processed height.
+    Without one, ``scan``, if given, maps a list of public keys to their
+    transactions and is run for the addresses before the first event, so
+    that transactions made before watching started are not missed.
+    """
+
+    def __init__(self, addresses, fetch_blocks, store, *, height=None,
+                 scan=None, derive=None, gap_limit=GAP_LIMIT,
+                 account_gap_limit=ACCOUNT_GAP_LIMIT):
+        self.addresses = dict(addresses)
+        self.fetch_blocks = fetch_blocks
+        self.store = store
+        self.height = height
+        self.scan = scan
+        self.derive = derive
+        self.gap_limit = gap_limit
+        self.account_gap_limit = account_gap_limit
+        self.paths = set(self.addresses.values())
+
+    def handle(self, event):
+        """Process a stream event.  The block of its height and the ones
+        missed since the last processed height are fetched, unless that
+        height is processed already.  Processing stops before a block the
+        node does not return.  Returns the matching transactions.
+        """
+        timings.count('watch.events')
+        height = int(event['height'])
+        if self.height is not None and height <= self.height:
+            return []
+        matched = []
+        if self.height is None:
+            if self.scan is not None:
+                matched.extend(self._scan())
+            self.height = height - 1
+        heights = range(self.height + 1, height + 1)
+        for block_height, block in zip(heights, self.fetch_blocks(heights)):
+            if block is None:
+                timings.count('watch.missing_blocks')
+                break
+            timings.count('watch.blocks')
+            matched.extend(self._match(block.get('transactions', ())))
+            self.height = block_height
+        if matched:
+            timings.count('watch.matches', len(matched))
+            self.store(matched)
+        return matched
+
+    def _scan(self):
+        matched, pending = [], list(self.addresses)
+        while pending:
+            known = set(self.addresses)
+            matched.extend(self._match(self.scan(pending)))
+            # Addresses derived past newly used ones
+            pending = [pubkey for pubkey in self.addresses
+                       if pubkey not in known]
+        return matched
+
+    def _match(self, txs):
+        matched = []
+        for tx in txs:
+            owners = tx_public_keys(tx) & self.addresses.keys()
+            if owners:
+                matched.append(tx)
+                self._extend([self.addresses[owner] for owner in owners])
+        return matched
+
+    def _extend(self, used):
+        if self.derive is None:
+            return
+        for account, index in used:
+            self._derive(account, index + 1 + self.gap_limit)
+            for next_account in range(account + 1,
+                                      account + 1 + self.account_gap_limit):
+                self._derive(next_account, self.gap_limit)
+
+    def _derive(self, account, stop):
+        missing = [index for index in range(stop)
+                   if (account, index) not in self.paths]
+        if not missing:
+            return
+        for index, pubkey in self.derive(account, missing):
+            self.addresses[pubkey] = account, index
+            self.paths.add((account, index))
+
+
+def _websockets():
+    try:
+        from websockets.exceptions import WebSocketException
+        from websockets.sync.client import connect
+    except ImportError:
+        raise ks.WalletError('Watching needs the websockets package, '
+                             'install bigchaindb-wallet[watch]')
+    return connect, WebSocketException
+
+
+def stream_events(url, *, reconnect_delay=RECONNECT_DELAY,
+                  max_reconnect_delay=MAX_RECONNECT_DELAY, sleep=time.sleep):
+    """Yields the json events of the WebSocket stream at ``url`` forever.
+    Closed or failed connections are reopened with exponential backoff.
+    """
+    connect, WebSocketException = _websockets()
+    delay = reconnect_delay
+    while True:
+        try:
+            with connect(url) as websocket:
+                delay = reconnect_delay
+                for message in websocket:
+                    yield json.loads(message)
+        except (OSError, WebSocketException):
+            pass
+        timings.count('watch.reconnects')
+        sleep(delay)
+        delay = min(delay * 2, max_reconnect_delay)
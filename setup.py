@@ -13,15 +13,29 @@ setup(
     py_modules=[
         "bigchaindb_wallet.keystore",
         "bigchaindb_wallet.keymanagement",
+        "bigchaindb_wallet.agent",
+        "bigchaindb_wallet.coinselect",
+        "bigchaindb_wallet.discovery",
+        "bigchaindb_wallet.network",
+        "bigchaindb_wallet.pubindex",
+        "bigchaindb_wallet.recovery",
+        "bigchaindb_wallet.signing",
+        "bigchaindb_wallet.timings",
+        "bigchaindb_wallet.transactions",
+        "bigchaindb_wallet.txcache",
+        "bigchaindb_wallet.watch",
         "bigchaindb_wallet._cli"
     ],
     install_requires=[
         "Click",
-        "pickledb",
         "PyNaCl",
         "bigchaindb_driver",
         "mnemonic",
+        "python-rapidjson",
     ],
+    extras_require={
+        "watch": ["websockets>=11"],
+    },
     entry_points='''
         [console_scripts]
         bdbw=bigchaindb_wallet._cli:cli
@@ -31,6 +45,7 @@ setup(
         "pytest",
         "pytest-httpserver",
         "schema",
+        "websockets>=11",
     ],
     zip_safe=False,
     python_requires=">=3.5",
@@ -3,10 +3,10 @@ import json
 import os
 import random
 import string
+import threading
 from collections import namedtuple
 from types import SimpleNamespace
 
-import pickledb
 import pytest
 from base58 import b58encode
 from bigchaindb_driver import BigchainDB
@@ -15,6 +15,7 @@ from click.testing import CliRunner
 from schema import Schema, Use
 
 from bigchaindb_wallet.keystore import BDBW_PATH_TEMPLATE
+from bigchaindb_wallet.txcache import DEFAULT_CACHE_FILENAME, TxCache
 
 
 @pytest.fixture
@@ -108,14 +109,30 @@ def session_wallet(tmp_home_session, default_wallet):
 
 @pytest.fixture
 def bdbw_tx_cache_location(tmp_home_session):
-    return tmp_home_session / '.bdbw_cache'
+    return tmp_home_session / DEFAULT_CACHE_FILENAME
 
 
 @pytest.fixture
 def session_tx_cache_obj(bdbw_tx_cache_location):
-    db = pickledb.load(bdbw_tx_cache_location, False)
-    db.dump()
-    return db
+    with TxCache(bdbw_tx_cache_location) as cache:
+        yield cache
+
+
+@pytest.fixture
+def websocket_server():
+    """Starts local WebSocket servers running ``handler`` for every
+    connection and returns their urls."""
+    sync_server = pytest.importorskip('websockets.sync.server')
+    servers = []
+
+    def start(handler):
+        server = sync_server.serve(handler, '127.0.0.1', 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return 'ws://127.0.0.1:{}'.format(server.socket.getsockname()[1])
+    yield start
+    for server in servers:
+        server.shutdown()
 
 
 @pytest.fixture
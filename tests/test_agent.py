@@ -0,0 +1,55 @@
+"""Key agent tests"""
+import json
+import threading
+
+import pytest
+
+from bigchaindb_wallet import _cli as cli
+from bigchaindb_wallet import agent
+from bigchaindb_wallet.keymanagement import ExtendedKey
+
+
+@pytest.fixture
+def running_agent(tmp_home, keymanagement_test_vectors):
+    xkey = ExtendedKey(keymanagement_test_vectors.privkey,
+                       keymanagement_test_vectors.chaincode)
+    socket_path = agent.get_agent_socket_path()
+    server = agent.KeyAgentServer(xkey, 'default', socket_path, max_uses=2)
+    thread = threading.Thread(target=server.serve_until_expired)
+    thread.start()
+    yield server
+    agent.call({'op': 'stop'}, socket_path)
+    thread.join()
+
+
+def test_agent_fulfill_without_keystore(
+        running_agent,
+        click_runner,
+        prepared_hello_world_tx,
+        fulfilled_hello_world_tx
+):
+    args = ["--address", "3", "--index", "3"]
+    result = click_runner.invoke(
+        cli.prepare,
+        args + ["--operation", "CREATE",
+                "--asset", '{"data":{"hello":"world"}}',
+                "--metadata", '{"meta":"someta"}']
+    )
+    assert json.loads(result.output) == prepared_hello_world_tx
+    result = click_runner.invoke(
+        cli.fulfill,
+        args + ["--transaction", json.dumps(prepared_hello_world_tx)]
+    )
+    assert json.loads(result.output) == fulfilled_hello_world_tx
+    assert running_agent.expired
+    # Exhausted agent falls back to keystore, which does not exist here
+    result = click_runner.invoke(
+        cli.fulfill,
+        args + ["--transaction", json.dumps(prepared_hello_world_tx)]
+    )
+    assert result.output == 'Wallet not found\n'
+
+
+def test_agent_other_wallet_is_unavailable(running_agent):
+    assert agent.is_running()
+    assert agent.get_pubkey('other', 0, 0) is None
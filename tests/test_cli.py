@@ -1,21 +1,34 @@
 """CLI Tests"""
+import gzip
 import json
 import os
 import random
+import subprocess
+import sys
 
 import hypothesis.strategies as st
 import pytest
+from base58 import b58encode
 from bigchaindb_driver import BigchainDB
+from bigchaindb_driver.common.transaction import Output, Transaction
+from bigchaindb_driver.crypto import generate_keypair
 from hypothesis import example, given, settings
 from schema import Schema
 from werkzeug.wrappers import Response
 
 from bigchaindb_wallet import _cli as cli
+from bigchaindb_wallet.discovery import (DEFAULT_CHECKPOINT_FILENAME,
+                                         load_height)
 from bigchaindb_wallet.keymanagement import (ExtendedKey, privkey_to_pubkey,
                                              seed_to_extended_key)
 from bigchaindb_wallet.keystore import (BDBW_PATH_TEMPLATE,
-                                        bdbw_derive_account,
-                                        get_private_key_drv)
+                                        bdbw_derive_account, bdbw_derive_many,
+                                        get_private_key_drv, open_keystore)
+from bigchaindb_wallet.network import NodePool
+from bigchaindb_wallet.pubindex import open_index
+from bigchaindb_wallet.signing import fulfill
+from bigchaindb_wallet.transactions import prepare
+from bigchaindb_wallet.txcache import DEFAULT_CACHE_FILENAME, TxCache
 
 
 @pytest.mark.parametrize(
@@ -41,26 +54,67 @@ def test_cli_init_default(tmp_home, click_runner):
     would be to create keystore file according to default keystore config.
     """
     result = click_runner.invoke(cli.init, ["--password", "1234"])
-    conf_location = (tmp_home / '.bigchaindb_wallet')
-    assert conf_location.exists()
-    with open(conf_location) as conf_file:
-        conf_dict = json.load(conf_file)
+    keystore_location = tmp_home / '.bdbw_keystore.sqlite'
+    assert keystore_location.exists()
+    with open_keystore() as keystore:
         assert Schema({
             'default': {  # the default account
                 'chain_code': str,
                 'master_pubkey': str,
                 'master_privkey': {
                     'format': 'cryptsalsa208sha256base58',
+                    'kdf': {'opslimit': int, 'memlimit': int},
                     'salt': str,
                     'key': str   # encrypted base58 encoded extended private key
                 },
             }
-        }).validate(conf_dict)
+        }).validate(keystore.export())
     assert result.exit_code == 0
     assert result.output.startswith(
         'Keystore initialized in:\n{}\n'
         'Your mnemonic phrase is:\n'
-        .format(conf_location))
+        .format(keystore_location))
+
+
+def test_cli_init_keeps_other_wallets(session_wallet, click_runner,
+                                      default_wallet):
+    click_runner.invoke(cli.init, ["--password", "1234", "--quiet",
+                                   "--wallet", "other", "--kdf-level",
+                                   "interactive"])
+    with open_keystore() as keystore:
+        assert keystore.names() == ['default', 'other']
+        assert keystore.get('default') == default_wallet['default']
+    assert (session_wallet / '.bigchaindb_wallet.migrated').exists()
+    result = click_runner.invoke(cli.init, ["--password", "1234", "--quiet",
+                                            "--wallet", "other", "--kdf-level",
+                                            "interactive"],
+                                 input='n\n')
+    assert result.output.endswith('Operation aborted!\n')
+
+
+def test_cli_export_import_keystore(session_wallet, tmp_path, click_runner,
+                                    default_wallet):
+    exported = tmp_path / 'exported.json'
+    result = click_runner.invoke(cli.export_keystore,
+                                 ["--output", str(exported)])
+    assert result.output == ''
+    with open(exported) as f:
+        assert json.load(f) == default_wallet
+    result = click_runner.invoke(cli.export_keystore, ["--wallet", "other"])
+    assert result.output == 'Account other is not found\n'
+
+    location = tmp_path / 'imported'
+    location.mkdir()
+    args = [str(exported), "--location", str(location)]
+    result = click_runner.invoke(cli.import_keystore, args)
+    assert result.output == '1 of 1 wallets imported into:\n{}\n'.format(
+        location / '.bdbw_keystore.sqlite')
+    result = click_runner.invoke(cli.import_keystore, args)
+    assert result.output.startswith('0 of 1 wallets imported')
+    result = click_runner.invoke(cli.import_keystore, args + ["--force"])
+    assert result.output.startswith('1 of 1 wallets imported')
+    with open_keystore(str(location)) as keystore:
+        assert keystore.export() == default_wallet
 
 
 def test_cli_prepare(
@@ -84,6 +138,122 @@ def test_cli_prepare(
     assert json.loads(result.output) == prepared_hello_world_tx
 
 
+def test_cli_prepare_batch(
+        click_runner,
+        session_wallet,
+        default_password,
+        prepared_hello_world_tx,
+):
+    record = {'asset': {'data': {'hello': 'world'}},
+              'metadata': {'meta': 'someta'},
+              'operation': 'CREATE', 'account': 3, 'index': 3}
+    result = click_runner.invoke(
+        cli.prepare,
+        ["--password", default_password, "--batch",
+         "--address", "3", "--index", "3", "--metadata", '{"meta":"someta"}'],
+        input='\n'.join([
+            json.dumps(record),
+            json.dumps({'asset': {'data': {'hello': 'world'}},
+                        'operation': 'CREATE'}),
+            json.dumps(dict(record, account=4)),
+        ])
+    )
+    lines = [json.loads(i) for i in result.output.splitlines()]
+    assert lines[:2] == [prepared_hello_world_tx] * 2
+    assert lines[2]['inputs'][0]['owners_before'] != (
+        prepared_hello_world_tx['inputs'][0]['owners_before'])
+
+
+def test_cli_prepare_transfer(
+        click_runner,
+        session_wallet,
+        default_password,
+        keymanagement_test_vectors,
+):
+    xkey = ExtendedKey(keymanagement_test_vectors.privkey,
+                       keymanagement_test_vectors.chaincode)
+    with open_index() as index:
+        index.extend('default', xkey, [0], range(3))
+        change, owner = index.get('default', 0, 0), index.get('default', 0, 1)
+    owner_privkey = b58encode(bdbw_derive_account(xkey, 0, 1).privkey).decode()
+    bdb = BigchainDB()
+    create_tx = bdb.transactions.fulfill(
+        bdb.transactions.prepare(operation='CREATE', signers=owner,
+                                 recipients=[([owner], 5)],
+                                 asset={'data': {'coin': 'wallet'}}),
+        private_keys=owner_privkey)
+    with TxCache(session_wallet / DEFAULT_CACHE_FILENAME) as cache:
+        cache.add(create_tx)
+    bob = generate_keypair().public_key
+    result = click_runner.invoke(
+        cli.prepare,
+        ["--operation", "TRANSFER", "--asset",
+         json.dumps({'id': create_tx['id']}), "--recipient", bob + ":3"])
+    prepared_tx = json.loads(result.output)
+    assert prepared_tx['inputs'][0]['fulfills'] == {
+        'transaction_id': create_tx['id'], 'output_index': 0}
+    assert [(i['public_keys'], i['amount'])
+            for i in prepared_tx['outputs']] == [([bob], '3'), ([change], '2')]
+
+    result = click_runner.invoke(
+        cli.fulfill, ["--password", default_password,
+                      "--transaction", result.output])
+    assert Transaction.from_dict(json.loads(result.output)).inputs_valid(
+        [Output.from_dict(create_tx['outputs'][0])])
+
+    result = click_runner.invoke(
+        cli.prepare,
+        ["--operation", "TRANSFER", "--asset",
+         json.dumps({'id': create_tx['id']}), "--recipient", bob + ":6"])
+    assert result.output == 'Insufficient funds: 5 available, 6 needed\n'
+
+
+def test_cli_balance_and_history(
+        click_runner,
+        session_wallet,
+        keymanagement_test_vectors,
+):
+    xkey = ExtendedKey(keymanagement_test_vectors.privkey,
+                       keymanagement_test_vectors.chaincode)
+    with open_index() as index:
+        index.extend('default', xkey, [0, 1], range(2))
+        first, second = index.get('default', 0, 0), index.get('default', 1, 1)
+    bdb = BigchainDB()
+    create_txs = [
+        bdb.transactions.fulfill(
+            bdb.transactions.prepare(operation='CREATE', signers=owner,
+                                     recipients=[([owner], amount)],
+                                     asset={'data': {'coin': amount}}),
+            private_keys=b58encode(
+                bdbw_derive_account(xkey, account, index).privkey).decode())
+        for owner, amount, account, index in ((first, 5, 0, 0),
+                                              (second, 7, 1, 1))
+    ]
+    with TxCache(session_wallet / DEFAULT_CACHE_FILENAME) as cache:
+        cache.add_many(create_txs)
+    asset_ids = [tx['id'] for tx in create_txs]
+
+    result = click_runner.invoke(cli.balance, [])
+    assert json.loads(result.output) == {asset_ids[0]: 5, asset_ids[1]: 7}
+    result = click_runner.invoke(cli.balance, ['--accounts', '1'])
+    assert json.loads(result.output) == {asset_ids[1]: 7}
+    result = click_runner.invoke(cli.balance,
+                                 ['--asset-id', asset_ids[0]])
+    assert json.loads(result.output) == {asset_ids[0]: 5}
+
+    result = click_runner.invoke(cli.history, ['--limit', '1'])
+    [latest] = [json.loads(line) for line in result.output.splitlines()]
+    assert (latest['transaction_id'], latest['received'],
+            latest['sent']) == (asset_ids[1], 7, 0)
+    result = click_runner.invoke(
+        cli.history, ['--before', str(latest['seq'])])
+    assert [json.loads(line)['transaction_id']
+            for line in result.output.splitlines()] == [asset_ids[0]]
+
+    result = click_runner.invoke(cli.balance, ['--wallet', 'missing'])
+    assert result.output == 'Public key index of wallet missing is missing\n'
+
+
 def test_cli_fulfill(
         click_runner,
         session_wallet,
@@ -104,6 +274,117 @@ def test_cli_fulfill(
     assert json.loads(result.output) == fulfilled_hello_world_tx
 
 
+def test_cli_fulfill_without_index(
+        click_runner,
+        tmp_home,
+        default_wallet,
+        default_password,
+        keymanagement_test_vectors,
+):
+    with open(tmp_home / '.bigchaindb_wallet', 'w') as f:
+        json.dump(default_wallet, f)
+    xkey = ExtendedKey(keymanagement_test_vectors.privkey,
+                       keymanagement_test_vectors.chaincode)
+    dxk = bdbw_derive_account(xkey, 0, 0)
+    bdb = BigchainDB()
+    prepared_tx = bdb.transactions.prepare(
+        operation='CREATE',
+        signers=b58encode(privkey_to_pubkey(dxk.privkey)[1:]).decode())
+    # The legacy keystore has no public key index, the first address signs
+    result = click_runner.invoke(
+        cli.fulfill, ["--password", default_password,
+                      "--transaction", json.dumps(prepared_tx)])
+    assert json.loads(result.output) == bdb.transactions.fulfill(
+        prepared_tx, private_keys=b58encode(dxk.privkey).decode())
+
+
+def test_cli_fulfill_batch(
+        click_runner,
+        session_wallet,
+        default_password,
+        prepared_hello_world_tx,
+        fulfilled_hello_world_tx
+):
+    result = click_runner.invoke(
+        cli.fulfill,
+        [
+            "--address", "3",
+            "--index", "3",
+            "--password", default_password,
+            "--batch",
+            "--workers", "2"
+        ],
+        input='\n'.join([json.dumps(prepared_hello_world_tx)] * 9 + [''])
+    )
+    lines = result.output.splitlines()
+    assert len(lines) == 9
+    assert all(json.loads(i) == fulfilled_hello_world_tx for i in lines)
+
+
+def test_cli_rekey(tmp_home, click_runner):
+    result = click_runner.invoke(
+        cli.init, ["--password", "old", "--quiet", "--kdf-level",
+                   "interactive"])
+    with open_keystore() as keystore:
+        master_privkey = keystore.get('default')['master_privkey']
+    assert master_privkey['kdf'] == {'opslimit': 524288,
+                                     'memlimit': 16777216}
+    derive_args = ["--range", "0", "--workers", "1"]
+    address = click_runner.invoke(
+        cli.derive, ["--password", "old"] + derive_args).output
+    result = click_runner.invoke(
+        cli.rekey, ["--password", "old", "--new-password", "new",
+                    "--kdf", "argon2id", "--kdf-level", "interactive",
+                    "--memlimit", str(2 ** 23)])
+    assert result.output == ('Wallet default encrypted with argon2id '
+                             'opslimit 2 memlimit 8388608\n')
+    result = click_runner.invoke(
+        cli.derive, ["--password", "new"] + derive_args)
+    assert result.output == address
+    result = click_runner.invoke(
+        cli.derive, ["--password", "old"] + derive_args)
+    assert result.output == 'Wrong password for wallet default\n'
+    # A password change keeps the parameters, options override them
+    result = click_runner.invoke(
+        cli.rekey, ["--password", "new", "--new-password", "newer"])
+    assert result.output == ('Wallet default encrypted with argon2id '
+                             'opslimit 2 memlimit 8388608\n')
+    result = click_runner.invoke(
+        cli.rekey, ["--password", "newer", "--opslimit", "3"])
+    assert result.output == ('Wallet default encrypted with argon2id '
+                             'opslimit 3 memlimit 8388608\n')
+
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_cli_derive(
+        click_runner,
+        session_wallet,
+        default_password,
+        keymanagement_test_vectors,
+        workers
+):
+    xkey = ExtendedKey(keymanagement_test_vectors.privkey,
+                       keymanagement_test_vectors.chaincode)
+    expected = [
+        (BDBW_PATH_TEMPLATE.format(account=account, address_index=index),
+         b58encode(privkey_to_pubkey(dxk.privkey)[1:]).decode(),
+         b58encode(dxk.privkey).decode())
+        for account in (2, 3) for index in range(5, 12)
+        for dxk in [bdbw_derive_account(xkey, account, index)]
+    ]
+    args = ["--password", default_password, "--accounts", "2-3",
+            "--range", "5-11", "--workers", workers, "--chunk-size", "3"]
+    result = click_runner.invoke(cli.derive, args)
+    assert [json.loads(i) for i in result.output.splitlines()] == [
+        {'path': path, 'pubkey': pubkey} for path, pubkey, _ in expected]
+    result = click_runner.invoke(
+        cli.derive, args + ["--format", "csv", "--private"])
+    assert result.output.splitlines() == (
+        ['path,pubkey,privkey'] + [','.join(i) for i in expected])
+    result = click_runner.invoke(cli.derive, args[:4] + ["--range", "3-1"])
+    assert 'expected 0 <= N <= M' in result.output
+
+
 def test_cli_commit(
         random_fulfilled_tx_gen,
         click_runner,
@@ -130,10 +411,73 @@ def test_cli_commit(
     tx_condition_details = [i['condition']['details'] for i in ftx['outputs']]
     assert len(tx_condition_details) == 1
     assert all(i['type'] == 'ed25519-sha-256' for i in tx_condition_details)
-    session_tx_cache_obj._loaddb()  # Reload file
     assert session_tx_cache_obj.get(ftx['id']) == ftx
 
 
+def test_cli_commit_batch(
+        random_fulfilled_tx_gen,
+        click_runner,
+        httpserver,
+        session_tx_cache_obj
+):
+    txs = [random_fulfilled_tx_gen() for _ in range(5)]
+    flaky, invalid = txs[1]['id'], txs[3]['id']
+    attempts = {}
+
+    def handler(request):
+        tx = json.loads(request.data.decode())
+        assert request.args['mode'] == 'async'
+        attempts[tx['id']] = attempts.get(tx['id'], 0) + 1
+        if tx['id'] == flaky and attempts[tx['id']] == 1:
+            return Response('unavailable', status=503)
+        if tx['id'] == invalid:
+            return Response('invalid', status=400)
+        return Response(json.dumps(tx))
+
+    httpserver.expect_request(
+        '/api/v1/transactions/',
+        method="POST",
+    ).respond_with_handler(handler)
+
+    result = click_runner.invoke(
+        cli.commit, ["--batch", "--mode", "async", "--window", "3",
+                     "--url", "http://localhost:5000"],
+        input='\n'.join(json.dumps(i) for i in txs)
+    )
+    records = [json.loads(i) for i in result.output.splitlines()]
+    assert [i['id'] for i in records] == [i['id'] for i in txs]
+    assert [i['status'] for i in records] == ['ok'] * 3 + ['error', 'ok']
+    assert [i['attempts'] for i in records] == [1, 2, 1, 1, 1]
+    assert records[3]['error'].startswith('BadRequest')
+    for tx in txs:
+        assert session_tx_cache_obj.get(tx['id']) == (
+            None if tx['id'] == invalid else tx)
+
+
+def test_cli_commit_batch_malformed_line(
+        random_fulfilled_tx_gen,
+        click_runner,
+        httpserver,
+        session_tx_cache_obj
+):
+    txs = [random_fulfilled_tx_gen() for _ in range(2)]
+    httpserver.expect_request(
+        '/api/v1/transactions/',
+        method="POST",
+    ).respond_with_handler(lambda request: Response(request.data))
+
+    result = click_runner.invoke(
+        cli.commit, ["--batch", "--window", "3",
+                     "--url", "http://localhost:5000"],
+        input='\n'.join([json.dumps(i) for i in txs] + ['{"id":'])
+    )
+    assert result.output.splitlines()[-1] == (
+        'Operation aborted: unrecoverable error')
+    # Transactions committed before the malformed line are cached
+    for tx in txs:
+        assert session_tx_cache_obj.get(tx['id']) == tx
+
+
 def test_cli_import(
         random_fulfilled_tx_gen,
         click_runner,
@@ -168,6 +512,281 @@ def test_cli_import(
                       "--force"]
     )
 
-    session_tx_cache_obj._loaddb()  # Reload file
     for id_, tx in transactions.items():
         assert session_tx_cache_obj.get(id_) == tx
+
+
+def test_populate_tx_cache(httpserver, tmp_home):
+    xkey = seed_to_extended_key(os.urandom(64))
+
+    def address(account, index):
+        return b58encode(privkey_to_pubkey(
+            bdbw_derive_account(xkey, account, index).privkey)[1:]).decode()
+
+    used = {address(0, 0): ['a0'], address(0, 5): ['a5', 'a0'],
+            address(2, 0): ['c0'],
+            # Past the gap of 5 unused addresses after (0, 5)
+            address(0, 12): ['skipped']}
+    requested = []
+
+    def outputs_handler(request):
+        if request.args.get('spent', '').lower() == 'true':
+            return Response('[]')
+        requested.append(request.args['public_key'])
+        txids = used.get(request.args['public_key'], [])
+        return Response(json.dumps(
+            [{'transaction_id': i, 'output_index': 0} for i in txids]))
+
+    httpserver.expect_request('/api/v1/outputs/').respond_with_handler(
+        outputs_handler)
+
+    def tx(txid):
+        return {'id': txid, 'operation': 'CREATE', 'asset': {'data': None},
+                'inputs': [], 'outputs': []}
+
+    for txid in ['a0', 'a5', 'a6', 'c0']:
+        httpserver.expect_request(
+            '/api/v1/transactions/{}'.format(txid)
+        ).respond_with_json(tx(txid))
+
+    cache_location = tmp_home / DEFAULT_CACHE_FILENAME
+
+    def populate():
+        cli.populate_tx_cache(xkey=xkey, location=str(cache_location),
+                              pool=NodePool([httpserver.url_for('')]),
+                              workers=4, gap_limit=5, account_gap_limit=2)
+        with TxCache(cache_location) as cache:
+            return {i['id']: i for i in cache.transactions()}
+
+    assert populate() == {i: tx(i) for i in ['a0', 'a5', 'c0']}
+    # Accounts 0..4 were probed, 1, 3 and 4 are unused
+    assert len(requested) == 11 + 5 + 6 + 5 + 5
+    assert address(0, 0) in requested
+
+    # Rescan only probes the frontier after last used addresses
+    requested.clear()
+    used[address(0, 6)] = ['a6']
+    assert populate() == {i: tx(i) for i in ['a0', 'a5', 'a6', 'c0']}
+    assert address(0, 0) not in requested
+    assert address(2, 0) not in requested
+    assert len(requested) == 6 + 5 + 5 + 5 + 5
+
+
+def serve_external_spend(httpserver, owner):
+    """Serve a node where ``owner`` received ``a0`` and ``b0``, and spent
+    ``a0`` to a third party in ``spend``."""
+    other = generate_keypair().public_key
+
+    def create(txid, amount):
+        return {'id': txid, 'operation': 'CREATE', 'asset': {'data': None},
+                'inputs': [{'owners_before': [owner], 'fulfills': None}],
+                'outputs': [{'public_keys': [owner], 'amount': amount}]}
+
+    def transfer(txid, fulfills):
+        return {'id': txid, 'operation': 'TRANSFER', 'asset': {'id': 'a0'},
+                'inputs': [{'owners_before': [owner], 'fulfills': fulfills}],
+                'outputs': [{'public_keys': [other], 'amount': '5'}]}
+
+    txs = [create('a0', '5'), create('b0', '3'),
+           transfer('spend', {'transaction_id': 'a0', 'output_index': 0}),
+           transfer('unrelated', {'transaction_id': 'x', 'output_index': 0})]
+
+    def outputs_handler(request):
+        if request.args['public_key'] != owner:
+            return Response('[]')
+        spent = request.args.get('spent', '').lower() == 'true'
+        return Response(json.dumps(
+            [{'transaction_id': txid, 'output_index': 0}
+             for txid in (['a0'] if spent else ['a0', 'b0'])]))
+
+    httpserver.expect_request('/api/v1/outputs/').respond_with_handler(
+        outputs_handler)
+    for tx in txs[:2]:
+        httpserver.expect_request(
+            '/api/v1/transactions/{}'.format(tx['id'])
+        ).respond_with_json(tx)
+    httpserver.expect_request(
+        '/api/v1/transactions/',
+        query_string={'asset_id': 'a0', 'operation': 'TRANSFER'}
+    ).respond_with_json(txs[2:])
+    return txs
+
+
+def test_populate_tx_cache_external_spend(httpserver, tmp_home):
+    xkey = seed_to_extended_key(os.urandom(64))
+    owner = b58encode(privkey_to_pubkey(
+        bdbw_derive_account(xkey, 0, 0).privkey)[1:]).decode()
+    txs = serve_external_spend(httpserver, owner)
+    cache_location = tmp_home / DEFAULT_CACHE_FILENAME
+    cli.populate_tx_cache(xkey=xkey, location=str(cache_location),
+                          pool=NodePool([httpserver.url_for('')]),
+                          gap_limit=2, account_gap_limit=1)
+    with TxCache(cache_location) as cache:
+        assert sorted(tx['id'] for tx in cache.transactions()) == [
+            'a0', 'b0', 'spend']
+        assert cache.get('spend') == txs[2]
+        assert list(cache.unspent('a0', [owner])) == []
+        assert [output['transaction_id']
+                for output in cache.outputs(owner, spent=False)] == ['b0']
+
+
+def test_cli_balance_and_history_external_spend(click_runner, httpserver,
+                                                 tmp_home):
+    xkey = seed_to_extended_key(os.urandom(64))
+    owner = b58encode(privkey_to_pubkey(
+        bdbw_derive_account(xkey, 0, 0).privkey)[1:]).decode()
+    serve_external_spend(httpserver, owner)
+    result = click_runner.invoke(
+        cli.import_, ["key", xkey.privkey.hex(), xkey.chaincode.hex(),
+                      "--password", "1234", "--kdf-level", "interactive",
+                      "--url", httpserver.url_for(''), "--gap-limit", "2",
+                      "--account-gap-limit", "1"])
+    assert result.output.startswith('Keystore initialized in:')
+
+    result = click_runner.invoke(cli.balance, [])
+    assert json.loads(result.output) == {'b0': 3}
+    result = click_runner.invoke(cli.history, [])
+    entries = [json.loads(line) for line in result.output.splitlines()]
+    assert [(i['transaction_id'], i['received'], i['sent'])
+            for i in entries[:1]] == [('spend', 0, 5)]
+    assert sorted((i['transaction_id'], i['received'], i['sent'])
+                  for i in entries[1:]) == [('a0', 5, 0), ('b0', 3, 0)]
+
+
+def test_cli_recover(session_wallet, click_runner,
+                     keymanagement_test_vectors):
+    words = keymanagement_test_vectors.phrase.split()
+    words[5] = '?'
+    result = click_runner.invoke(cli.recover, words + ["--workers", "2"])
+    assert result.stdout == keymanagement_test_vectors.phrase + '\n'
+    assert result.stderr.startswith('Checked ')
+    result = click_runner.invoke(
+        cli.recover, words + ["--workers", "2", "--master-pubkey", "00"])
+    assert result.stdout == 'No matching phrase found\n'
+
+
+def test_cli_import_ledger_dump(click_runner, tmp_home, tmp_path):
+    xkey = seed_to_extended_key(os.urandom(64))
+    keys = [(dxk.privkey, pubkey) for _, dxk, pubkey in
+            bdbw_derive_many(xkey, [0], [0, 30])]
+    txs = [fulfill(prepare(operation='CREATE',
+                           signers=b58encode(pubkey[1:]).decode(),
+                           asset={'data': {'n': i}}),
+                   [b58encode(privkey).decode()])
+           for i, (privkey, pubkey) in enumerate(keys)]
+    other_keypair = generate_keypair()
+    other = fulfill(prepare(operation='CREATE',
+                            signers=other_keypair.public_key),
+                    [other_keypair.private_key])
+    dump = tmp_path / 'ledger.ndjson.gz'
+    with gzip.open(dump, 'wt') as f:
+        for tx in [txs[0], other, txs[1]]:
+            f.write(json.dumps(tx) + '\n')
+    result = click_runner.invoke(
+        cli.import_, ["key", xkey.privkey.hex(), xkey.chaincode.hex(),
+                      "--password", "1234", "--kdf-level", "interactive",
+                      "--ledger-dump", str(dump), "--gap-limit", "10"])
+    assert result.output.startswith('Keystore initialized in:')
+    with TxCache(tmp_home / DEFAULT_CACHE_FILENAME) as cache:
+        # All addresses derived for the dump are matched, gaps or not
+        assert sorted(cache.transactions(), key=lambda tx: tx['id']) == (
+            sorted(txs, key=lambda tx: tx['id']))
+    with open_index() as index:
+        assert index.get('default', 0, 40) is not None
+        assert index.get('default', 0, 41) is None
+
+
+def test_cli_watch(click_runner, session_wallet, default_password,
+                   keymanagement_test_vectors, random_fulfilled_tx_gen,
+                   httpserver, websocket_server):
+    xkey = ExtendedKey(keymanagement_test_vectors.privkey,
+                       keymanagement_test_vectors.chaincode)
+    with open_index() as index:
+        index.extend('default', xkey, [0], range(3))
+    ours = [random_fulfilled_tx_gen(use_canonical_key=(dxk.privkey, pubkey))
+            for _, dxk, pubkey in bdbw_derive_many(xkey, [0], [0, 1, 2])]
+    blocks = {1: [ours[1]], 2: [ours[2]], 3: [random_fulfilled_tx_gen()]}
+    for height, txs in blocks.items():
+        httpserver.expect_request(
+            '/api/v1/blocks/{}'.format(height)
+        ).respond_with_json({'height': height, 'transactions': txs})
+    # Made between import and the first watch, found by address
+    earlier = ours[0]
+    owner = earlier['outputs'][0]['public_keys'][0]
+
+    def outputs_handler(request):
+        unspent = request.args.get('spent', '').lower() != 'true'
+        return Response(json.dumps(
+            [{'transaction_id': earlier['id'], 'output_index': 0}]
+            if request.args['public_key'] == owner and unspent else []))
+
+    httpserver.expect_request('/api/v1/outputs/').respond_with_handler(
+        outputs_handler)
+    httpserver.expect_request(
+        '/api/v1/transactions/{}'.format(earlier['id'])
+    ).respond_with_json(earlier)
+
+    def handler(websocket):
+        # Block 2 was missed
+        for height in (1, 3):
+            websocket.send(json.dumps({'height': height,
+                                       'transaction_id': 'x',
+                                       'asset_id': 'x'}))
+
+    httpserver.expect_request('/api/v1').respond_with_json(
+        {'streams': websocket_server(handler)})
+    result = click_runner.invoke(
+        cli.watch_, ["--url", httpserver.url_for(''),
+                     "--password", default_password, "--max-events", "2"])
+    assert [json.loads(line)['id'] for line in result.output.splitlines()] == (
+        [tx['id'] for tx in ours])
+    with TxCache(session_wallet / DEFAULT_CACHE_FILENAME) as cache:
+        assert sorted(tx['id'] for tx in cache.transactions()) == (
+            sorted(tx['id'] for tx in ours))
+    assert load_height(session_wallet / DEFAULT_CHECKPOINT_FILENAME,
+                       keymanagement_test_vectors.pubkey.hex()) == 3
+    with open_index() as index:
+        assert index.get('default', 0, 22) is not None
+        assert index.get('default', 0, 23) is None
+        assert index.get('default', 1, 19) is not None
+
+
+# Loaded modules of a bdbw run, written to stderr after the command
+_MODULES_SCRIPT = """
+import json, sys
+from bigchaindb_wallet._cli import cli
+try:
+    cli.main(sys.argv[1:], prog_name='bdbw', standalone_mode=False)
+finally:
+    sys.stderr.write(json.dumps(sorted(sys.modules)))
+"""
+HTTP_STACK = ('requests', 'urllib3', 'bigchaindb_driver', 'cryptoconditions')
+
+
+@pytest.mark.parametrize('command', ['help', 'prepare', 'fulfill'])
+def test_cli_offline_commands_skip_http_stack(
+        session_wallet,
+        default_password,
+        prepared_hello_world_tx,
+        fulfilled_hello_world_tx,
+        command,
+):
+    args = {
+        'help': ['--help'],
+        'prepare': ['prepare', '-a', '3', '-i', '3', '-o', 'CREATE',
+                    '-p', default_password,
+                    '-A', '{"data":{"hello":"world"}}',
+                    '-M', '{"meta":"someta"}'],
+        'fulfill': ['fulfill', '-a', '3', '-i', '3', '-p', default_password,
+                    '-t', json.dumps(prepared_hello_world_tx)],
+    }[command]
+    result = subprocess.run([sys.executable, '-c', _MODULES_SCRIPT] + args,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            check=True)
+    loaded = json.loads(result.stderr)
+    assert [m for m in loaded if m.split('.')[0] in HTTP_STACK] == []
+    if command != 'help':
+        assert json.loads(result.stdout) == {
+            'prepare': prepared_hello_world_tx,
+            'fulfill': fulfilled_hello_world_tx,
+        }[command]
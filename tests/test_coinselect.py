@@ -0,0 +1,84 @@
+"""Coin selection tests"""
+import hypothesis.strategies as st
+import pytest
+from bigchaindb_driver.crypto import generate_keypair
+from hypothesis import given, settings
+
+from bigchaindb_wallet import coinselect
+from bigchaindb_wallet.keystore import WalletError
+from bigchaindb_wallet.txcache import TxCache
+
+OWNER = generate_keypair().public_key
+
+
+def funded_cache(*amounts, owner=OWNER):
+    cache = TxCache(':memory:')
+    cache.add_many(
+        {'id': 'tx{}'.format(i), 'operation': 'TRANSFER',
+         'asset': {'id': 'asset'}, 'inputs': [],
+         'outputs': [{'public_keys': [owner], 'amount': str(amount)}]}
+        for i, amount in enumerate(amounts))
+    return cache
+
+
+@pytest.mark.parametrize('amounts,amount,selected,change', [
+    # Exact match
+    ((1, 5, 3, 8), 3, [3], 0),
+    # Smallest covering output
+    ((1, 5, 9, 8), 6, [8], 2),
+    # Largest first, then the smallest covering the remainder
+    ((1, 2, 5, 9), 11, [9, 2], 0),
+    ((1, 3, 5, 9), 16, [9, 5, 3], 1),
+    ((4, 4, 4), 12, [4, 4, 4], 0),
+])
+def test_select_outputs(amounts, amount, selected, change):
+    with funded_cache(*amounts) as cache:
+        picked, picked_change = coinselect.select_outputs(
+            cache, 'asset', [OWNER], amount)
+    assert [output['amount'] for output in picked] == selected
+    assert picked_change == change
+
+
+@pytest.mark.parametrize('amounts,amount,message', [
+    ((1, 2), 4, 'Insufficient funds: 3 available, 4 needed'),
+    ((), 1, 'Insufficient funds: 0 available, 1 needed'),
+    ((3,), 0, 'Amount should be positive'),
+])
+def test_select_outputs_raises(amounts, amount, message):
+    with funded_cache(*amounts) as cache, \
+            pytest.raises(WalletError, match=message):
+        coinselect.select_outputs(cache, 'asset', [OWNER], amount)
+
+
+@settings(max_examples=50, deadline=None)
+@given(st.lists(st.integers(min_value=1, max_value=10 ** 6), max_size=30),
+       st.integers(min_value=1, max_value=10 ** 7))
+def test_select_outputs_covers_amount(amounts, amount):
+    with funded_cache(*amounts) as cache:
+        try:
+            picked, change = coinselect.select_outputs(
+                cache, 'asset', [OWNER], amount)
+        except WalletError:
+            assert sum(amounts) < amount
+            return
+    ids = [output['transaction_id'] for output in picked]
+    assert len(set(ids)) == len(ids)
+    assert sum(output['amount'] for output in picked) == amount + change
+    assert change >= 0
+
+
+def test_fund_transfer():
+    bob = generate_keypair().public_key
+    with funded_cache(2, 6) as cache:
+        inputs, recipients = coinselect.fund_transfer(
+            cache, 'asset', [OWNER], [(bob, 4)], OWNER)
+        assert inputs == [{
+            'owners_before': [OWNER],
+            'fulfills': {'transaction_id': 'tx1', 'output_index': 0},
+            'fulfillment': {'type': 'ed25519-sha-256', 'public_key': OWNER},
+        }]
+        assert recipients == [([bob], 4), ([OWNER], 2)]
+        assert coinselect.fund_transfer(
+            cache, 'asset', [OWNER], [(bob, 6)], OWNER)[1] == [([bob], 6)]
+        with pytest.raises(WalletError):
+            coinselect.fund_transfer(cache, 'asset', [OWNER], [], OWNER)
@@ -0,0 +1,79 @@
+"""Address discovery tests"""
+import io
+import json
+import os
+from contextlib import contextmanager
+
+from base58 import b58encode
+
+from bigchaindb_wallet import discovery
+from bigchaindb_wallet.keymanagement import (privkey_to_pubkey,
+                                             seed_to_extended_key)
+from bigchaindb_wallet.keystore import bdbw_derive_account
+
+
+def address(xkey, account, index):
+    return b58encode(privkey_to_pubkey(
+        bdbw_derive_account(xkey, account, index).privkey)[1:]).decode()
+
+
+def dump_tx(txid, owners_before, public_keys):
+    return {
+        'id': txid,
+        'operation': 'TRANSFER',
+        'asset': {'id': 'asset'},
+        'inputs': [{'owners_before': owners_before,
+                    'fulfills': {'transaction_id': 'prev', 'output_index': 0},
+                    'fulfillment': 'pGSA'}],
+        'outputs': [{'public_keys': public_keys, 'amount': '1',
+                     'condition': {'uri': 'ni:///sha-256;x'}}],
+        'metadata': {'note': 'AwcdEqTUBqspCkkw4GQW85VRZXw378Yw1UszS2cdSHxs'},
+        'version': '2.0',
+    }
+
+
+def test_match_ledger_dump():
+    owner, other = (b58encode(os.urandom(32)).decode() for _ in range(2))
+    lines = [json.dumps(dump_tx('spent', [owner], [other])),
+             json.dumps(dump_tx('unrelated', [other], [other]))]
+    for pubkeys in ({owner}, {owner: (0, 0)}):
+        assert [(tx['id'], owners) for tx, owners in
+                discovery.match_ledger_dump(lines, pubkeys)] == [
+            ('spent', {owner})]
+
+
+def test_scan_ledger_dump():
+    xkey = seed_to_extended_key(os.urandom(64))
+    other = b58encode(os.urandom(32)).decode()
+    txs = [
+        dump_tx('a0', [other], [address(xkey, 0, 0)]),
+        dump_tx('unrelated', [other], [other]),
+        # Within the gap of the first 10 addresses, 15 is found after that
+        dump_tx('a8', [other], [address(xkey, 0, 8)]),
+        dump_tx('a15', [other], [address(xkey, 0, 15)]),
+        # Spent to another wallet
+        dump_tx('a15-spent', [address(xkey, 0, 15)], [other]),
+        dump_tx('past-gap', [other], [address(xkey, 0, 40)]),
+        # Accounts are extended one used account at a time
+        dump_tx('b1', [other], [address(xkey, 1, 1)]),
+        dump_tx('c2', [other], [address(xkey, 2, 2)]),
+        dump_tx('e0', [other], [address(xkey, 4, 0)]),
+    ]
+    dump = '\n'.join(json.dumps(tx) for tx in txs) + '\n'
+    reads = []
+
+    @contextmanager
+    def open_dump():
+        reads.append(1)
+        yield io.StringIO(dump)
+
+    batches = []
+    checkpoint = discovery.scan_ledger_dump(
+        xkey, open_dump, batches.append, checkpoint={0: 20, 3: 1},
+        gap_limit=3, account_gap_limit=1, accounts=2, indexes=10,
+        batch_size=2)
+    assert checkpoint == {0: 20, 1: 1, 2: 2, 3: 1}
+    assert len(reads) == 3
+    assert all(len(batch) <= 2 for batch in batches)
+    assert {tx['id'] for batch in batches for tx in batch} == {
+        'a0', 'a8', 'a15', 'a15-spent', 'b1', 'c2'}
@@ -3,7 +3,9 @@ from functools import reduce
 import hypothesis.strategies as st
 from hypothesis import example, given, settings
 
-from bigchaindb_wallet.keymanagement import (derive_key, path_to_indexes,
+from bigchaindb_wallet.keymanagement import (DerivationCache, derive_key,
+                                             derive_many,
+                                             path_to_indexes,
                                              privkey_to_pubkey,
                                              seed_to_extended_key)
 
@@ -44,3 +46,34 @@ def test_test_derive_extended_key(ed25519_vectors):
             assert drvprivkey.hex() == privkey
             assert drvchaincode.hex() == chaincode
             assert privkey_to_pubkey(drvprivkey).hex() == pubkey
+
+
+def test_derive_many(ed25519_vectors):
+    xkey = seed_to_extended_key(bytes.fromhex(ed25519_vectors[0]['seed']))
+    tree_indexes = [(0, 1, 2), (0, 1, 3), (0, 4), (5,), (5, 6, 7), ()]
+    derived = list(derive_many(xkey, tree_indexes))
+    assert [i[0] for i in derived] == tree_indexes
+    for tree_index, drvkey, pubkey in derived:
+        assert drvkey == derive_key(xkey, tree_index)
+        assert pubkey == privkey_to_pubkey(drvkey.privkey)
+
+
+def test_derivation_cache(ed25519_vectors):
+    xkey = seed_to_extended_key(bytes.fromhex(ed25519_vectors[0]['seed']))
+    cache = DerivationCache(maxsize=4)
+    assert cache.derive(xkey, (0, 1, 2)) == derive_key(xkey, (0, 1, 2))
+    assert cache.cache_info() == (0, 1, 4, 3)
+    assert cache.pubkey(xkey, (0, 1, 2)) == privkey_to_pubkey(
+        derive_key(xkey, (0, 1, 2)).privkey)
+    assert (cache.signing_key(xkey, (0, 1, 2))
+            is cache.signing_key(xkey, (0, 1, 2)))
+    assert cache.cache_info() == (3, 1, 4, 3)
+    # Sibling reuses the cached (0, 1) node
+    assert cache.derive(xkey, (0, 1, 3)) == derive_key(xkey, (0, 1, 3))
+    assert cache.cache_info() == (3, 2, 4, 4)
+    # Least recently used entries are evicted
+    assert cache.derive(xkey, (5, 6)) == derive_key(xkey, (5, 6))
+    assert cache.cache_info().currsize == 4
+    assert cache.derive(xkey) == xkey
+    cache.clear()
+    assert cache.cache_info() == (0, 0, 4, 0)
@@ -0,0 +1,82 @@
+"""Node pool tests"""
+import json
+
+import pytest
+from bigchaindb_driver.exceptions import BadRequest, TimeoutError
+
+from bigchaindb_wallet import _cli as cli
+from bigchaindb_wallet.network import (DEFAULT_CONFIG_FILENAME, NodePool,
+                                       call_with_retries, get_nodes)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_nodes(tmp_home, monkeypatch):
+    monkeypatch.delenv('BDBW_NODES', raising=False)
+    assert get_nodes() == []
+    with open(tmp_home / DEFAULT_CONFIG_FILENAME, 'w') as f:
+        json.dump({'nodes': ['http://a:9984']}, f)
+    assert get_nodes() == ['http://a:9984']
+    monkeypatch.setenv('BDBW_NODES', 'http://b:9984, http://c:9984')
+    assert get_nodes() == ['http://b:9984', 'http://c:9984']
+    assert get_nodes(('http://d:9984',)) == ['http://d:9984']
+
+
+def test_node_pool_failover_and_ejection():
+    clock = FakeClock()
+    pool = NodePool(['http://a:9984', 'http://b:9984', 'http://c:9984'],
+                    cooldown=10, clock=clock)
+    latencies = {'http://a:9984': 1, 'http://b:9984': 1, 'http://c:9984': 5}
+    calls = []
+
+    def request(bdb):
+        url = bdb.nodes[0]['endpoint']
+        calls.append(url)
+        clock.now += latencies[url]
+        if url == 'http://a:9984':
+            raise TimeoutError()
+        if url == 'http://b:9984' and len(calls) == 5:
+            raise BadRequest(400, 'invalid', None, url)
+        return url
+
+    # a times out and is ejected, the request is retried on b
+    assert call_with_retries(lambda: pool.call(request), backoff=0) == (
+        'http://b:9984', 2)
+    # c is more than SLOW_FACTOR times slower than b and gets ejected
+    assert pool.call(request) == 'http://c:9984'
+    assert pool.call(request) == 'http://b:9984'
+    # Client errors are not the node's fault
+    with pytest.raises(BadRequest):
+        call_with_retries(lambda: pool.call(request), backoff=0)
+    stats = {i['url']: i for i in pool.stats()}
+    assert stats['http://a:9984']['failures'] == 1
+    assert stats['http://a:9984']['ejected']
+    assert stats['http://b:9984'] == {'url': 'http://b:9984', 'requests': 3,
+                                      'failures': 0, 'ejections': 0,
+                                      'latency_ms': 1000.0, 'ejected': False}
+    assert stats['http://c:9984']['ejections'] == 1
+    # Ejected nodes return after the cooldown
+    clock.now += 10
+    assert not any(i['ejected'] for i in pool.stats())
+
+
+def test_cli_commit_failover(random_fulfilled_tx_gen, click_runner,
+                             httpserver, tmp_home):
+    ftx = random_fulfilled_tx_gen()
+    httpserver.expect_request(
+        '/api/v1/transactions/', method="POST").respond_with_json(ftx)
+    result = click_runner.invoke(
+        cli.commit, ["--transaction", json.dumps(ftx), "--timeout", "1",
+                     "--url", "http://localhost:1",
+                     "--url", "http://localhost:5000", "--stats"]
+    )
+    output, stats = result.output.splitlines()
+    assert json.loads(output) == ftx
+    assert [(i['requests'], i['failures']) for i in json.loads(stats)] == [
+        (1, 1), (1, 0)]
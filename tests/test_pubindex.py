@@ -0,0 +1,86 @@
+"""Watch-only public key index tests"""
+import json
+import os
+
+import pytest
+from base58 import b58encode
+
+from bigchaindb_wallet import _cli as cli
+from bigchaindb_wallet.keymanagement import (ExtendedKey, privkey_to_pubkey,
+                                             seed_to_extended_key)
+from bigchaindb_wallet.keystore import (WalletError, bdbw_derive_account,
+                                        get_public_key_drv, open_keystore)
+from bigchaindb_wallet.pubindex import open_index
+
+
+def b58_pubkey(xkey, account, index):
+    return b58encode(privkey_to_pubkey(
+        bdbw_derive_account(xkey, account, index).privkey)[1:]).decode()
+
+
+def test_extend(tmp_home):
+    xkey = seed_to_extended_key(os.urandom(64))
+    with open_index() as index:
+        assert index.extend('default', xkey, range(2), range(3)) == 6
+        assert index.extend('default', xkey, [1, 2], range(4)) == 5
+        assert len(index.addresses('default')) == 11
+        assert index.get('default', 2, 3) == b58_pubkey(xkey, 2, 3)
+        assert index.get('default', 2, 4) is None
+        assert index.locate(b58_pubkey(xkey, 1, 2)) == ('default', 1, 2)
+        assert index.locate(b58_pubkey(xkey, 1, 2), 'other') is None
+        assert index.locate(b58_pubkey(xkey, 2, 4)) is None
+        assert index.pubkeys('default') == {
+            b58_pubkey(xkey, *i[:2]) for i in index.addresses('default')}
+        # Same name for another master key starts over
+        other_xkey = seed_to_extended_key(os.urandom(64))
+        assert index.extend('default', other_xkey, [0], [0]) == 1
+        assert index.addresses('default') == [
+            (0, 0, b58_pubkey(other_xkey, 0, 0))]
+
+
+def test_get_public_key_drv(session_wallet, default_password,
+                            keymanagement_test_vectors):
+    xkey = ExtendedKey(keymanagement_test_vectors.privkey,
+                       keymanagement_test_vectors.chaincode)
+    with pytest.raises(WalletError):
+        get_public_key_drv('default', 1, 2)
+    assert get_public_key_drv('default', 1, 2, default_password) == (
+        b58_pubkey(xkey, 1, 2))
+    # Indexed now, no password needed
+    assert get_public_key_drv('default', 1, 2) == b58_pubkey(xkey, 1, 2)
+
+
+def test_cli_prepare_from_index(tmp_home, click_runner):
+    click_runner.invoke(cli.init, ["--password", "1234", "--quiet"])
+    with open_keystore() as keystore:
+        master_pubkey = keystore.get('default')['master_pubkey']
+    with open_index() as index:
+        assert index.master_pubkey('default') == master_pubkey
+        pubkey = index.get('default', 4, 19)
+    result = click_runner.invoke(
+        cli.prepare, ["--address", "4", "--index", "19", "--operation",
+                      "CREATE", "--asset", '{"data":{"hello":"world"}}'])
+    assert json.loads(result.output)['inputs'][0]['owners_before'] == [
+        pubkey]
+
+
+def test_cli_fulfill_finds_signing_keys(
+        click_runner,
+        session_wallet,
+        default_password,
+        keymanagement_test_vectors,
+        prepared_hello_world_tx,
+        fulfilled_hello_world_tx
+):
+    xkey = ExtendedKey(keymanagement_test_vectors.privkey,
+                       keymanagement_test_vectors.chaincode)
+    args = ["--password", default_password,
+            "--transaction", json.dumps(prepared_hello_world_tx)]
+    with open_index() as index:
+        index.extend('default', xkey, range(3), range(3))
+        result = click_runner.invoke(cli.fulfill, args)
+        assert result.output == ('No address of wallet default owns the '
+                                 'transaction inputs\n')
+        index.extend('default', xkey, [3], [3])
+    result = click_runner.invoke(cli.fulfill, args)
+    assert json.loads(result.output) == fulfilled_hello_world_tx
@@ -0,0 +1,83 @@
+"""Mnemonic recovery tests"""
+import pytest
+from base58 import b58encode
+from mnemonic import Mnemonic
+
+from bigchaindb_wallet import recovery
+from bigchaindb_wallet.keymanagement import ExtendedKey, privkey_to_pubkey
+from bigchaindb_wallet.keystore import WalletError, bdbw_derive_account
+
+
+@pytest.fixture
+def test_xkey(keymanagement_test_vectors):
+    return ExtendedKey(keymanagement_test_vectors.privkey,
+                       keymanagement_test_vectors.chaincode)
+
+
+def damaged(phrase, **replacements):
+    words = phrase.split()
+    for position, word in replacements.items():
+        words[int(position[1:])] = word
+    return words
+
+
+def test_word_candidates():
+    wordlist = Mnemonic('english').wordlist
+    assert recovery.word_candidates('fresh', wordlist) == [
+        wordlist.index('fresh')]
+    assert wordlist.index('fresh') in recovery.word_candidates('frseh',
+                                                               wordlist)
+    assert len(recovery.word_candidates('?', wordlist)) == 2048
+
+
+def test_checksum_filter():
+    mnemonic = Mnemonic('english')
+    phrase = mnemonic.to_mnemonic(b'\x01' * 16)
+    search = recovery.phrase_search(damaged(phrase, w11='?'),
+                                    master_pubkey='00')
+    valid = {search.phrase(value)
+             for value in search.checksum_valid(0, len(search))}
+    assert phrase in valid
+    assert valid == {' '.join(phrase.split()[:11] + [word])
+                     for word in mnemonic.wordlist
+                     if mnemonic.check(' '.join(phrase.split()[:11]
+                                                + [word]))}
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_recover_master_pubkey(keymanagement_test_vectors, workers):
+    phrase = keymanagement_test_vectors.phrase
+    search = recovery.phrase_search(
+        damaged(phrase, w3='?', w10='frseh'),
+        master_pubkey=keymanagement_test_vectors.pubkey.hex())
+    progress = []
+    assert recovery.recover(search, workers=workers,
+                            progress=lambda *args: progress.append(args)
+                            ) == phrase
+    checked, valid = progress[-1]
+    assert 0 < valid < checked <= len(search)
+
+
+def test_recover_address_pubkey(keymanagement_test_vectors, test_xkey):
+    pubkey = b58encode(privkey_to_pubkey(
+        bdbw_derive_account(test_xkey, 1, 7).privkey)[1:]).decode()
+    phrase = keymanagement_test_vectors.phrase
+    search = recovery.phrase_search(damaged(phrase, w23='?'),
+                                    pubkeys=[pubkey], accounts=range(2),
+                                    indexes=range(10))
+    assert recovery.recover(search, workers=2) == phrase
+
+
+def test_recover_not_found(keymanagement_test_vectors):
+    search = recovery.phrase_search(
+        damaged(keymanagement_test_vectors.phrase, w0='?'),
+        master_pubkey='00' * 33)
+    assert recovery.recover(search, workers=2) is None
+
+
+def test_phrase_search_errors(keymanagement_test_vectors):
+    words = keymanagement_test_vectors.phrase.split()
+    with pytest.raises(WalletError):
+        recovery.phrase_search(words[:-1], master_pubkey='00')
+    with pytest.raises(WalletError):
+        recovery.phrase_search(words)
@@ -0,0 +1,128 @@
+"""Transaction signing tests.  Results are compared byte for byte with
+the driver's fulfillment."""
+import json
+
+import pytest
+from base58 import b58encode
+from bigchaindb_driver.offchain import (fulfill_transaction,
+                                        prepare_transaction)
+
+from bigchaindb_wallet import _cli as cli
+from bigchaindb_wallet import signing
+from bigchaindb_wallet.keymanagement import ExtendedKey, privkey_to_pubkey
+from bigchaindb_wallet.keystore import WalletError, bdbw_derive_account
+from bigchaindb_wallet.pubindex import open_index
+
+
+@pytest.fixture
+def test_xkey(keymanagement_test_vectors):
+    return ExtendedKey(keymanagement_test_vectors.privkey,
+                       keymanagement_test_vectors.chaincode)
+
+
+def keypair(xkey, account, index):
+    privkey = bdbw_derive_account(xkey, account, index).privkey
+    return (b58encode(privkey).decode(),
+            b58encode(privkey_to_pubkey(privkey)[1:]).decode())
+
+
+def prepare_sweep(keypairs):
+    """CREATE one output per key pair, then TRANSFER all of them back to the
+    first key.  Returns the prepared transfer.
+    """
+    owner = keypairs[0][1]
+    create = fulfill_transaction(
+        prepare_transaction(
+            operation='CREATE', signers=owner,
+            recipients=[([pubkey], 1) for _, pubkey in keypairs],
+            asset={'data': {'sweep': len(keypairs)}}),
+        private_keys=keypairs[0][0])
+    inputs = [{
+        'fulfillment': output['condition']['details'],
+        'fulfills': {'output_index': i, 'transaction_id': create['id']},
+        'owners_before': output['public_keys'],
+    } for i, output in enumerate(create['outputs'])]
+    return prepare_transaction(
+        operation='TRANSFER', inputs=inputs,
+        recipients=[([owner], len(keypairs))],
+        asset={'id': create['id']})
+
+
+def assert_same_as_driver(transaction, private_keys, **kwargs):
+    expected = json.dumps(
+        fulfill_transaction(transaction, private_keys=private_keys))
+    assert json.dumps(signing.fulfill(transaction, private_keys,
+                                      **kwargs)) == expected
+
+
+@pytest.mark.parametrize('addresses', [3, signing.PARALLEL_INPUTS + 8])
+def test_fulfill_multi_input(test_xkey, addresses):
+    keypairs = [keypair(test_xkey, i % 4, i) for i in range(addresses)]
+    transfer = prepare_sweep(keypairs)
+    private_keys = [privkey for privkey, _ in keypairs]
+    assert_same_as_driver(transfer, private_keys)
+    assert_same_as_driver(transfer, private_keys, workers=1)
+    with pytest.raises(WalletError):
+        signing.fulfill(transfer, private_keys[1:])
+
+
+def test_fulfill_hello_world(prepared_hello_world_tx,
+                             fulfilled_hello_world_tx, test_xkey):
+    private_key = keypair(test_xkey, 3, 3)[0]
+    assert signing.fulfill(prepared_hello_world_tx,
+                           [private_key]) == fulfilled_hello_world_tx
+    assert_same_as_driver(prepared_hello_world_tx, [private_key])
+
+
+@pytest.mark.parametrize('prepare_kwargs', [
+    # Unicode and nested payloads
+    {'asset': {'data': {'név': ['ünnep', {'日本': 1.5, 'x': None}]}},
+     'metadata': {'emoji': '\U0001F6B2', 'empty': {}}},
+    # Divisible asset to several recipients
+    {'asset': {'data': {'coin': True}}, 'recipients': 'split'},
+    # Shared output
+    {'asset': None, 'recipients': 'shared'},
+])
+def test_fulfill_create_payloads(test_xkey, prepare_kwargs):
+    (privkey, pubkey), (_, other) = (keypair(test_xkey, 0, 0),
+                                     keypair(test_xkey, 0, 1))
+    recipients = {'split': [([pubkey], 7), ([other], 3)],
+                  'shared': [([pubkey, other], 1)]}
+    prepare_kwargs = dict(prepare_kwargs)
+    if 'recipients' in prepare_kwargs:
+        prepare_kwargs['recipients'] = recipients[
+            prepare_kwargs['recipients']]
+    prepared = prepare_transaction(operation='CREATE', signers=pubkey,
+                                   **prepare_kwargs)
+    assert_same_as_driver(prepared, [privkey])
+
+
+def test_fulfill_threshold_input(test_xkey):
+    keypairs = [keypair(test_xkey, 1, i) for i in range(3)]
+    prepared = prepare_transaction(
+        operation='CREATE', signers=[pubkey for _, pubkey in keypairs],
+        asset={'data': {'threshold': 3}})
+    assert_same_as_driver(prepared, [privkey for privkey, _ in keypairs])
+    with pytest.raises(WalletError):
+        signing.fulfill(prepared, [keypairs[0][0]])
+
+
+def test_fulfill_signed_again(test_xkey):
+    keypairs = [keypair(test_xkey, 2, i) for i in range(4)]
+    private_keys = [privkey for privkey, _ in keypairs]
+    signed = signing.fulfill(prepare_sweep(keypairs), private_keys)
+    assert_same_as_driver(signed, private_keys)
+
+
+def test_cli_fulfill_multi_input(
+        click_runner, session_wallet, default_password, test_xkey):
+    keypairs = [keypair(test_xkey, account, index)
+                for account, index in [(0, 0), (0, 5), (1, 2), (2, 0)]]
+    transfer = prepare_sweep(keypairs)
+    with open_index() as index:
+        index.extend('default', test_xkey, range(3), range(6))
+    result = click_runner.invoke(
+        cli.fulfill, ["--password", default_password,
+                      "--transaction", json.dumps(transfer)])
+    assert json.loads(result.output) == fulfill_transaction(
+        transfer, private_keys=[privkey for privkey, _ in keypairs])
@@ -0,0 +1,70 @@
+"""Timing instrumentation tests"""
+import json
+
+import pytest
+
+from bigchaindb_wallet import _cli as cli
+from bigchaindb_wallet import timings
+from bigchaindb_wallet.keystore import DERIVATION_CACHE
+
+
+@pytest.fixture
+def enabled_timings():
+    timings.reset()
+    timings.enable('json')
+    yield
+    timings.disable()
+    timings.reset()
+
+
+def test_disabled_timings_collect_nothing():
+    timings.reset()
+    with timings.span('phase'):
+        timings.count('event')
+    data = timings.snapshot()
+    assert data['spans'] == {} and data['counters'] == {}
+
+
+def test_spans_and_counters(enabled_timings):
+    for _ in range(3):
+        with timings.span('phase'):
+            timings.count('event', 2)
+    data = timings.snapshot()
+    assert data['spans']['phase']['count'] == 3
+    assert data['counters']['event'] == 6
+    assert [event['name'] for event in data['trace']
+            if event['name'] == 'phase'] == ['phase'] * 3
+
+
+def test_cli_fulfill_timings(
+        click_runner,
+        session_wallet,
+        default_password,
+        prepared_hello_world_tx,
+        fulfilled_hello_world_tx
+):
+    DERIVATION_CACHE.clear()
+    result = click_runner.invoke(
+        cli.fulfill,
+        ["--address", "3", "--index", "3", "--password", default_password,
+         "--transaction", json.dumps(prepared_hello_world_tx),
+         "--timings", "json"]
+    )
+    assert json.loads(result.stdout) == fulfilled_hello_world_tx
+    trace = json.loads(result.stderr)
+    assert {'keystore.read', 'kdf', 'derive', 'sign', 'json.decode',
+            'json.encode'} <= set(trace['spans'])
+    assert trace['counters']['sign.inputs'] == 1
+    assert trace['counters']['derive.cache_misses'] == 1
+    assert not timings.is_enabled()
+
+
+def test_cli_timings_from_env(click_runner, tmp_home, monkeypatch):
+    monkeypatch.setenv('BDBW_TIMINGS', '1')
+    result = click_runner.invoke(
+        cli.init, ["--password", "1234", "--quiet"])
+    assert len(result.stdout.split()) == 24
+    lines = result.stderr.splitlines()
+    assert lines[0].split() == ['phase', 'count', 'total', 'ms']
+    assert {'kdf', 'pubindex.extend'} <= {line.split()[0] for line in lines}
+    assert lines[-1].startswith('wall')
@@ -0,0 +1,105 @@
+"""Driver-free transaction building tests.  Results are compared byte for
+byte with the driver's."""
+import json
+
+import pytest
+from bigchaindb_driver.common.exceptions import AmountError
+from bigchaindb_driver.common.transaction import Output
+from bigchaindb_driver.crypto import generate_keypair
+from bigchaindb_driver.offchain import prepare_transaction
+
+from bigchaindb_wallet import transactions
+
+
+def assert_same_as_driver(**kwargs):
+    assert json.dumps(transactions.prepare(**kwargs)) == json.dumps(
+        prepare_transaction(**kwargs))
+
+
+@pytest.mark.parametrize('asset,metadata', [
+    (None, None),
+    ({}, {}),
+    ({'data': None}, None),
+    ({'data': {'hello': 'world'}}, {'meta': 'someta'}),
+])
+def test_prepare_create(asset, metadata):
+    assert_same_as_driver(operation='CREATE',
+                          signers=generate_keypair().public_key,
+                          asset=asset, metadata=metadata)
+
+
+def test_prepare_hello_world(prepared_hello_world_tx):
+    assert transactions.prepare(
+        operation='CREATE',
+        signers=prepared_hello_world_tx['inputs'][0]['owners_before'][0],
+        asset={'data': {'hello': 'world'}},
+        metadata={'meta': 'someta'}) == prepared_hello_world_tx
+
+
+def test_prepare_multiple_signers_through_driver():
+    assert_same_as_driver(operation='CREATE',
+                          signers=[generate_keypair().public_key,
+                                   generate_keypair().public_key],
+                          asset={'data': {'shared': True}})
+
+
+@pytest.mark.parametrize('asset', [{'hello': 'world'}, {'data': 'string'}])
+def test_prepare_invalid_asset_raises_as_driver(asset):
+    signer = generate_keypair().public_key
+    with pytest.raises(Exception) as expected:
+        prepare_transaction(operation='CREATE', signers=signer, asset=asset)
+    with pytest.raises(expected.type):
+        transactions.prepare(operation='CREATE', signers=signer, asset=asset)
+
+
+def test_normalize_output():
+    keys = [generate_keypair().public_key for _ in range(2)]
+    ed25519 = Output.generate([keys[0]], 3).to_dict()
+    threshold = Output.generate(keys, 1).to_dict()
+    for output in (ed25519, threshold,
+                   dict(ed25519, amount=5),
+                   dict(ed25519, condition=dict(ed25519['condition'],
+                                                uri='ni:///sha-256;stale'))):
+        assert json.dumps(transactions.normalize_output(output)) == (
+            json.dumps(Output.from_dict(output).to_dict()))
+    # Amounts the driver rejects are left to it
+    with pytest.raises(AmountError):
+        transactions.normalize_output(
+            dict(ed25519, amount=str(transactions.MAX_AMOUNT + 1)))
+
+
+def transfer_input(public_key, output_index=0):
+    return {'owners_before': [public_key],
+            'fulfills': {'transaction_id': 'ab' * 32,
+                         'output_index': output_index},
+            'fulfillment': {'type': 'ed25519-sha-256',
+                            'public_key': public_key}}
+
+
+@pytest.mark.parametrize('metadata', [None, {'note': 'change'}])
+def test_prepare_transfer(metadata):
+    keys = [generate_keypair().public_key for _ in range(3)]
+    assert_same_as_driver(operation='TRANSFER',
+                          inputs=[transfer_input(keys[0]),
+                                  transfer_input(keys[1], 2)],
+                          recipients=[([keys[2]], 3), ([keys[0]], 1)],
+                          asset={'id': 'cd' * 32}, metadata=metadata)
+
+
+def test_prepare_transfer_to_shared_output_through_driver():
+    keys = [generate_keypair().public_key for _ in range(3)]
+    assert_same_as_driver(operation='TRANSFER',
+                          inputs=[transfer_input(keys[0])],
+                          recipients=[(keys[1:], 1)],
+                          asset={'id': 'cd' * 32})
+
+
+@pytest.mark.parametrize('amount', [0, 9 * 10 ** 18 + 1])
+def test_prepare_transfer_invalid_amount_raises_as_driver(amount):
+    keys = [generate_keypair().public_key for _ in range(2)]
+    kwargs = dict(operation='TRANSFER', inputs=[transfer_input(keys[0])],
+                  recipients=[([keys[1]], amount)], asset={'id': 'cd' * 32})
+    with pytest.raises(Exception) as expected:
+        prepare_transaction(**kwargs)
+    with pytest.raises(expected.type):
+        transactions.prepare(**kwargs)
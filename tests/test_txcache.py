@@ -0,0 +1,214 @@
+"""Transaction cache tests"""
+import json
+import sqlite3
+
+import pytest
+from bigchaindb_driver import BigchainDB
+from bigchaindb_driver.crypto import generate_keypair
+
+from bigchaindb_wallet.txcache import (DEFAULT_CACHE_FILENAME,
+                                       LEGACY_CACHE_FILENAME, TxCache,
+                                       open_cache)
+
+
+def test_outputs_spent_status(tmp_home):
+    bdb = BigchainDB()
+    alice, bob = generate_keypair(), generate_keypair()
+    create_tx = bdb.transactions.fulfill(
+        bdb.transactions.prepare(operation='CREATE',
+                                 signers=alice.public_key,
+                                 recipients=[([alice.public_key], 10)],
+                                 asset={'data': {'hello': 'world'}}),
+        private_keys=alice.private_key
+    )
+    transfer_tx = bdb.transactions.fulfill(
+        bdb.transactions.prepare(
+            operation='TRANSFER',
+            inputs={'fulfillment': create_tx['outputs'][0]['condition']
+                    ['details'],
+                    'fulfills': {'output_index': 0,
+                                 'transaction_id': create_tx['id']},
+                    'owners_before': [alice.public_key]},
+            recipients=[([bob.public_key], 4), ([alice.public_key], 6)],
+            asset={'id': create_tx['id']}),
+        private_keys=alice.private_key
+    )
+
+    with open_cache() as cache:
+        # Spending transaction may be cached before the spent one
+        assert cache.add_many([transfer_tx, create_tx]) == 2
+        assert not cache.add(create_tx)
+        assert len(cache) == 2
+        assert cache.get(transfer_tx['id']) == transfer_tx
+        assert create_tx['id'] in cache
+        assert [i['id'] for i in cache.transactions(create_tx['id'])] == [
+            transfer_tx['id'], create_tx['id']]
+        assert list(cache.outputs(alice.public_key, spent=True)) == [{
+            'transaction_id': create_tx['id'], 'output_index': 0,
+            'asset_id': create_tx['id'], 'amount': 10,
+            'spent_by': transfer_tx['id']}]
+        assert list(cache.outputs(alice.public_key, spent=False)) == [{
+            'transaction_id': transfer_tx['id'], 'output_index': 1,
+            'asset_id': create_tx['id'], 'amount': 6, 'spent_by': None}]
+        assert [i['amount'] for i in cache.outputs(bob.public_key)] == [4]
+
+
+def test_unspent(tmp_home):
+    alice, bob, carol = (generate_keypair() for _ in range(3))
+
+    def tx(txid, outputs, asset_id=None, spends=()):
+        return {'id': txid, 'operation': 'TRANSFER' if asset_id else 'CREATE',
+                'asset': {'id': asset_id} if asset_id else {'data': None},
+                'inputs': [{'owners_before': [], 'fulfills': {
+                    'transaction_id': spent, 'output_index': index}}
+                    for spent, index in spends],
+                'outputs': [{'public_keys': keys, 'amount': str(amount)}
+                            for keys, amount in outputs]}
+
+    with open_cache() as cache:
+        cache.add_many([
+            tx('a', [([alice.public_key], 5), ([bob.public_key], 3),
+                     ([alice.public_key, bob.public_key], 7)]),
+            tx('b', [([alice.public_key], 2)]),
+            tx('c', [([bob.public_key], 4), ([carol.public_key], 1)],
+               asset_id='a', spends=[('a', 1)]),
+        ])
+        owners = [alice.public_key, bob.public_key]
+        # Shared and spent outputs and other assets are left out
+        assert list(cache.unspent('a', owners)) == [
+            {'transaction_id': 'c', 'output_index': 0,
+             'public_key': bob.public_key, 'amount': 4},
+            {'transaction_id': 'a', 'output_index': 0,
+             'public_key': alice.public_key, 'amount': 5}]
+        assert [o['amount'] for o in cache.unspent(
+            'a', owners, descending=True)] == [5, 4]
+        assert cache.smallest_unspent('a', owners, 5)['transaction_id'] == (
+            'a')
+        assert cache.smallest_unspent('a', owners, 4, exclude=[
+            {'transaction_id': 'c', 'output_index': 0}])['amount'] == 5
+        assert cache.smallest_unspent('a', owners, 4, max_amount=4)[
+            'transaction_id'] == 'c'
+        assert cache.smallest_unspent('a', owners, 6) is None
+        cache.add(tx('d', [([carol.public_key], 5)], asset_id='a',
+                     spends=[('a', 0)]))
+        assert [o['transaction_id']
+                for o in cache.unspent('a', owners)] == ['c']
+        assert list(cache.unspent('a', [])) == []
+
+
+@pytest.mark.parametrize('spent_first', [False, True])
+def test_balance_and_history(tmp_home, spent_first):
+    bdb = BigchainDB()
+    alice, bob = generate_keypair(), generate_keypair()
+    create_tx = bdb.transactions.fulfill(
+        bdb.transactions.prepare(operation='CREATE',
+                                 signers=alice.public_key,
+                                 recipients=[([alice.public_key], 10)],
+                                 asset={'data': {'hello': 'world'}}),
+        private_keys=alice.private_key
+    )
+    transfer_tx = bdb.transactions.fulfill(
+        bdb.transactions.prepare(
+            operation='TRANSFER',
+            inputs={'fulfillment': create_tx['outputs'][0]['condition']
+                    ['details'],
+                    'fulfills': {'output_index': 0,
+                                 'transaction_id': create_tx['id']},
+                    'owners_before': [alice.public_key]},
+            recipients=[([bob.public_key], 4), ([alice.public_key], 6)],
+            asset={'id': create_tx['id']}),
+        private_keys=alice.private_key
+    )
+    txs = [create_tx, transfer_tx]
+    if spent_first:
+        txs.reverse()
+    asset_id = create_tx['id']
+    location = tmp_home / DEFAULT_CACHE_FILENAME
+
+    def check(cache):
+        assert cache.balance([alice.public_key]) == {asset_id: 6}
+        assert cache.balance([bob.public_key], asset_id) == {asset_id: 4}
+        assert cache.balance([alice.public_key, bob.public_key]) == {
+            asset_id: 10}
+        assert cache.balance([bob.public_key], 'other') == {}
+        # Latest cached first, with amounts received and sent by alice
+        alice_amounts = {create_tx['id']: (10, 0), transfer_tx['id']: (6, 10)}
+        assert [(i['transaction_id'], i['received'], i['sent'])
+                for i in cache.history([alice.public_key])] == [
+            (tx['id'],) + alice_amounts[tx['id']] for tx in reversed(txs)]
+        assert [(i['received'], i['sent']) for i in cache.history(
+            [alice.public_key, bob.public_key])
+            if i['transaction_id'] == transfer_tx['id']] == [(10, 10)]
+        first_page = cache.history([alice.public_key, bob.public_key],
+                                   limit=1)
+        second_page = cache.history([alice.public_key, bob.public_key],
+                                    limit=1, before=first_page[-1]['seq'])
+        assert [i['transaction_id'] for i in first_page + second_page] == [
+            tx['id'] for tx in reversed(txs)]
+        assert cache.history([alice.public_key],
+                             before=second_page[-1]['seq']) == []
+        assert [i['transaction_id'] for i in cache.history(
+            [bob.public_key], asset_id=asset_id)] == [transfer_tx['id']]
+        assert cache.history([bob.public_key], asset_id='other') == []
+
+    with open_cache(location) as cache:
+        cache.add_many(txs)
+        cache.add(txs[0])
+        check(cache)
+    # Caches without aggregates get them on open
+    clear_aggregates(location)
+    with TxCache(location) as cache:
+        check(cache)
+
+
+def clear_aggregates(location):
+    with sqlite3.connect(str(location)) as conn:
+        for table in ('owners', 'balances', 'history'):
+            conn.execute('DELETE FROM {}'.format(table))
+        conn.execute('PRAGMA user_version = 0')
+
+
+def test_balance_and_history_co_owners(tmp_home):
+    alice, bob, carol = (generate_keypair().public_key for _ in range(3))
+    location = tmp_home / DEFAULT_CACHE_FILENAME
+    create_tx = {'id': 't1', 'operation': 'CREATE', 'asset': {'data': None},
+                 'inputs': [{'owners_before': [alice], 'fulfills': None}],
+                 'outputs': [{'public_keys': [alice, bob], 'amount': '10'}]}
+    transfer_tx = {'id': 't2', 'operation': 'TRANSFER',
+                   'asset': {'id': 't1'},
+                   'inputs': [{'owners_before': [bob, alice], 'fulfills': {
+                       'transaction_id': 't1', 'output_index': 0}}],
+                   'outputs': [{'public_keys': [carol], 'amount': '10'}]}
+
+    def amounts(cache, public_keys):
+        return [(i['transaction_id'], i['received'], i['sent'])
+                for i in cache.history(public_keys)]
+
+    def check(cache):
+        assert cache.balance([alice, bob]) == {}
+        assert amounts(cache, [alice, bob]) == [('t2', 0, 10),
+                                                ('t1', 10, 0)]
+        assert cache.balance([carol]) == {'t1': 10}
+
+    with open_cache(location) as cache:
+        cache.add(create_tx)
+        # The shared output counts once for the wallet of both owners
+        for public_keys in ([alice, bob], [alice], [bob]):
+            assert cache.balance(public_keys) == {'t1': 10}
+            assert amounts(cache, public_keys) == [('t1', 10, 0)]
+        cache.add(transfer_tx)
+        check(cache)
+    clear_aggregates(location)
+    with TxCache(location) as cache:
+        check(cache)
+
+
+def test_legacy_cache_migration(tmp_home, random_fulfilled_tx_gen):
+    txs = {tx['id']: tx for tx in
+           [random_fulfilled_tx_gen() for _ in range(3)]}
+    with open(tmp_home / LEGACY_CACHE_FILENAME, 'w') as f:
+        json.dump(txs, f)
+    with open_cache(tmp_home / DEFAULT_CACHE_FILENAME) as cache:
+        assert {i['id']: i for i in cache.transactions()} == txs
+    assert not (tmp_home / LEGACY_CACHE_FILENAME).exists()
+    assert (tmp_home / (LEGACY_CACHE_FILENAME + '.migrated')).exists()
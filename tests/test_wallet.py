@@ -1,8 +1,19 @@
 """Test wallet"""
+import json
+from concurrent.futures import ProcessPoolExecutor
+
 import pytest
 
-from bigchaindb_wallet.keymanagement import symkey_decrypt, symkey_encrypt
-from bigchaindb_wallet.keystore import get_master_xprivkey
+from bigchaindb_wallet.keymanagement import (ExtendedKey, derive_from_path,
+                                             kdf_params, privkey_to_pubkey,
+                                             symkey_decrypt, symkey_encrypt)
+from bigchaindb_wallet.keystore import (BDBW_PATH_TEMPLATE, Keystore,
+                                        WalletError, bdbw_derive_account,
+                                        bdbw_derive_many, get_kdf_params,
+                                        get_master_xprivkey,
+                                        get_wallet_content, make_wallet_dict,
+                                        open_keystore, rekey_wallet,
+                                        store_wallets)
 
 
 @pytest.mark.parametrize(
@@ -18,9 +29,110 @@ def test_can_decrypt(msg, password):
     assert decr == msg
 
 
+@pytest.mark.parametrize('algorithm', ['scrypt', 'argon2id'])
+def test_can_decrypt_with_kdf_params(algorithm):
+    params = kdf_params(algorithm, 'interactive')
+    crypt, salt = symkey_encrypt(b'msg', b'password', params)
+    assert symkey_decrypt(crypt, b'password', salt, params) == b'msg'
+
+
+def test_kdf_params_bounds():
+    assert kdf_params('argon2id', 'moderate', memlimit=2 ** 20) == (
+        'argon2id', 3, 2 ** 20)
+    with pytest.raises(ValueError):
+        kdf_params('argon2id', memlimit=1)
+    with pytest.raises(ValueError):
+        kdf_params('bcrypt')
+
+
+def test_rekey_wallet(default_wallet, default_password,
+                      keymanagement_test_vectors):
+    # Legacy keystores record no parameters and use scrypt defaults
+    assert get_kdf_params(default_wallet['default']['master_privkey']) == (
+        kdf_params('scrypt', 'sensitive'))
+    xkey = ExtendedKey(keymanagement_test_vectors.privkey,
+                       keymanagement_test_vectors.chaincode)
+    keystore = dict(default_wallet, **make_wallet_dict(
+        xkey, 'other password', name='other',
+        kdf=kdf_params('scrypt', 'interactive')))
+    params = kdf_params('argon2id', 'interactive')
+    rekeyed = rekey_wallet(keystore, 'other', 'other password', 'new',
+                           params)
+    assert rekeyed['default'] == default_wallet['default']
+    assert rekeyed['other']['master_privkey']['format'] == 'argon2id13base58'
+    assert get_kdf_params(rekeyed['other']['master_privkey']) == params
+    assert get_master_xprivkey(rekeyed, 'other', 'new') == xkey
+    with pytest.raises(WalletError):
+        get_master_xprivkey(rekeyed, 'other', 'other password')
+
+
 def test_get_master_privkey(default_wallet, default_password, keymanagement_test_vectors):
     xprivkey = get_master_xprivkey(
         default_wallet, 'default', default_password
     )
     assert keymanagement_test_vectors.privkey == xprivkey.privkey
     assert keymanagement_test_vectors.chaincode == xprivkey.chaincode
+
+
+def test_bdbw_derive_many(keymanagement_test_vectors):
+    xkey = ExtendedKey(keymanagement_test_vectors.privkey,
+                       keymanagement_test_vectors.chaincode)
+    derived = list(bdbw_derive_many(xkey, range(3), [0, 1, 0x7fffffff]))
+    assert len(derived) == 9
+    for account, index, (path, drvkey, pubkey) in zip(
+            [0] * 3 + [1] * 3 + [2] * 3, [0, 1, 0x7fffffff] * 3, derived):
+        assert path == BDBW_PATH_TEMPLATE.format(account=account,
+                                                 address_index=index)
+        assert drvkey == derive_from_path(xkey, path)
+        assert drvkey == bdbw_derive_account(xkey, account, index)
+        assert pubkey == privkey_to_pubkey(drvkey.privkey)
+
+
+def _wallet(i):
+    return {'master_pubkey': '{:064x}'.format(i)}
+
+
+def test_keystore_records(tmp_path):
+    with Keystore(tmp_path / 'keystore.sqlite') as keystore:
+        assert keystore.put({str(i): _wallet(i) for i in range(2000)}) == 2000
+        assert keystore.get('1999') == _wallet(1999)
+        assert keystore.get('2000') is None
+        # Single record updates keep the other wallets
+        assert keystore.put({'7': _wallet(-7)}) == 1
+        assert keystore.put({'8': _wallet(-8)}, replace=False) == 0
+        assert keystore.get('7') == _wallet(-7)
+        assert keystore.get('8') == _wallet(8)
+        assert len(keystore.names()) == 2000
+        assert keystore.export(['7', '8']) == {'7': _wallet(-7),
+                                               '8': _wallet(8)}
+        with pytest.raises(WalletError):
+            keystore.export(['2000'])
+
+
+def test_keystore_migrates_json(tmp_home, default_wallet):
+    with pytest.raises(WalletError, match='Wallet not found'):
+        get_wallet_content('default')
+    store_wallets({'other': _wallet(1)})
+    with open(tmp_home / '.bigchaindb_wallet', 'w') as f:
+        json.dump(dict(default_wallet, other=_wallet(2)), f)
+    assert get_wallet_content('default') == default_wallet
+    assert get_wallet_content('missing') == {}
+    # Stored wallets win over the json file, which is renamed
+    assert get_wallet_content() == dict(default_wallet, other=_wallet(1))
+    assert not (tmp_home / '.bigchaindb_wallet').exists()
+    assert (tmp_home / '.bigchaindb_wallet.migrated').exists()
+
+
+def _store_range(job):
+    location, start = job
+    for i in range(start, start + 50):
+        store_wallets({str(i): _wallet(i)}, location)
+
+
+def test_keystore_concurrent_writers(tmp_path):
+    location = str(tmp_path)
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(_store_range,
+                          [(location, start) for start in range(0, 200, 50)]))
+    with open_keystore(location) as keystore:
+        assert keystore.export() == {str(i): _wallet(i) for i in range(200)}
@@ -0,0 +1,142 @@
+"""Event stream watcher tests"""
+import itertools
+import json
+import socket
+
+import pytest
+from bigchaindb_driver.crypto import generate_keypair
+
+from bigchaindb_wallet import watch
+
+
+def stream_tx(txid, owner):
+    return {
+        'id': txid,
+        'operation': 'CREATE',
+        'inputs': [{'owners_before': [owner]}],
+        'outputs': [{'public_keys': [owner]}],
+    }
+
+
+def test_watcher_catches_up_and_extends_addresses():
+    owner, stranger = (generate_keypair().public_key for _ in range(2))
+    derived = {(0, 0): owner}
+    fetched, stored, derivations = [], [], []
+    missing = {7}
+
+    def fetch_blocks(heights):
+        fetched.append(list(heights))
+        blocks = {
+            3: {'transactions': [stream_tx('a', owner)]},
+            5: {'transactions': [stream_tx('b', stranger),
+                                 stream_tx('c', derived.get((0, 2)))]},
+            6: {'transactions': [stream_tx('d', derived.get((1, 1)))]},
+        }
+        return [None if height in missing
+                else blocks.get(height, {'transactions': []})
+                for height in heights]
+
+    def derive(account, indexes):
+        derivations.append((account, indexes))
+        for index in indexes:
+            derived[account, index] = generate_keypair().public_key
+        return [(index, derived[account, index]) for index in indexes]
+
+    watcher = watch.Watcher({owner: (0, 0)}, fetch_blocks, stored.extend,
+                            derive=derive, gap_limit=2, account_gap_limit=1)
+    assert [tx['id'] for tx in watcher.handle({'height': 3})] == ['a']
+    assert watcher.handle({'height': 3}) == []
+    assert watcher.handle({'height': '2'}) == []
+    # Missed blocks 4 and 5 are fetched with the block of the event
+    assert [tx['id'] for tx in watcher.handle({'height': 6})] == ['c', 'd']
+    assert fetched == [[3], [4, 5, 6]]
+    assert [tx['id'] for tx in stored] == ['a', 'c', 'd']
+    assert watcher.height == 6
+    assert derivations == [(0, [1, 2]), (1, [0, 1]),
+                           (0, [3, 4]),
+                           (1, [2, 3]), (2, [0, 1])]
+    assert watcher.addresses == {pubkey: path
+                                 for path, pubkey in derived.items()}
+    # A block the node does not return yet is fetched again
+    assert watcher.handle({'height': 8}) == []
+    assert watcher.height == 6
+    missing.clear()
+    assert watcher.handle({'height': 8}) == []
+    assert fetched[-2:] == [[7, 8], [7, 8]]
+    assert watcher.height == 8
+
+
+def test_watcher_scans_before_first_event():
+    derived = {(0, 0): generate_keypair().public_key}
+    used = {(0, 0), (0, 2)}
+    scanned, stored = [], []
+
+    def scan(pubkeys):
+        paths = sorted(path for path, pubkey in derived.items()
+                       if pubkey in pubkeys)
+        scanned.append(paths)
+        return [stream_tx('{}-{}'.format(*path), derived[path])
+                for path in paths if path in used]
+
+    def derive(account, indexes):
+        for index in indexes:
+            derived[account, index] = generate_keypair().public_key
+        return [(index, derived[account, index]) for index in indexes]
+
+    watcher = watch.Watcher(
+        {derived[0, 0]: (0, 0)},
+        lambda heights: [{'transactions': []} for _ in heights],
+        stored.extend, scan=scan, derive=derive, gap_limit=2,
+        account_gap_limit=0)
+    # Addresses derived past used ones are scanned too
+    assert [tx['id'] for tx in watcher.handle({'height': 5})] == [
+        '0-0', '0-2']
+    assert scanned == [[(0, 0)], [(0, 1), (0, 2)], [(0, 3), (0, 4)]]
+    assert watcher.height == 5
+    assert [tx['id'] for tx in stored] == ['0-0', '0-2']
+    # Scanning only runs without a processed height
+    watcher.handle({'height': 6})
+    assert len(scanned) == 3
+
+
+def test_watcher_without_derive_keeps_addresses():
+    owner = generate_keypair().public_key
+    watcher = watch.Watcher(
+        {owner: (0, 19)},
+        lambda heights: [{'transactions': [stream_tx('a', owner)]}],
+        lambda txs: None, height=1)
+    assert [tx['id'] for tx in watcher.handle({'height': 2})] == ['a']
+    assert watcher.addresses == {owner: (0, 19)}
+
+
+def test_stream_events_reconnects(websocket_server):
+    connections = itertools.count()
+
+    def handler(websocket):
+        # Every connection delivers one event and closes
+        websocket.send(json.dumps({'height': next(connections)}))
+
+    delays = []
+    events = watch.stream_events(websocket_server(handler),
+                                 sleep=delays.append)
+    assert [event['height'] for event in itertools.islice(events, 3)] == (
+        [0, 1, 2])
+    events.close()
+    assert delays == [watch.RECONNECT_DELAY] * 2
+
+
+def test_stream_events_backs_off():
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        url = 'ws://127.0.0.1:{}'.format(listener.getsockname()[1])
+    delays = []
+
+    def sleep(delay):
+        delays.append(delay)
+        if len(delays) == 4:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        next(watch.stream_events(url, reconnect_delay=1,
+                                 max_reconnect_delay=5, sleep=sleep))
+    assert delays == [1, 2, 4, 5]